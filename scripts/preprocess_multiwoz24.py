@@ -2,40 +2,312 @@
 Script tiền xử lý MultiWOZ 2.4 dataset
 """
 
+import argparse
+import hashlib
 import json
 import os
+import sys
+from itertools import islice
+from multiprocessing import Pool
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import deque
 from tqdm import tqdm
 
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.statistics import SplitStatistics
+from src.vocab import Vocab
+from src.belief_state import REMOVED_KEY, RESTORED_KEY, to_delta_only
+
+
+# Tăng khi logic process_dialogue thay đổi để cache cũ tự động bị bỏ qua
+PREPROCESS_VERSION = 1
+
+
+def iter_json_object(filepath, chunk_size=1 << 20):
+    """
+    Đọc lần lượt từng cặp (key, value) của JSON object top-level
+    mà không cần load toàn bộ file vào memory
+    
+    Args:
+        filepath: Path tới file JSON (top-level là object)
+        chunk_size: Số ký tự đọc mỗi lần
+        
+    Yields:
+        Tuple (key, value) theo đúng thứ tự trong file
+    """
+    decoder = json.JSONDecoder()
+    whitespace = ' \t\r\n'
+    number_chars = '0123456789.eE+-'
+    
+    with open(filepath, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+        
+        def read_more(size=chunk_size):
+            nonlocal buffer, pos, eof
+            chunk = f.read(size)
+            if not chunk:
+                eof = True
+            # Bỏ phần đã xử lý để buffer không phình ra
+            buffer = buffer[pos:] + chunk
+            pos = 0
+        
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in whitespace:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                read_more()
+        
+        def next_char():
+            nonlocal pos
+            skip_whitespace()
+            char = buffer[pos:pos + 1]
+            pos += 1
+            return char
+        
+        def decode_value():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Giá trị bị cắt ngang giữa 2 chunk: đọc thêm ít nhất bằng
+                    # phần đang dở để tổng chi phí parse lại vẫn tuyến tính
+                    if eof:
+                        raise
+                    read_more(max(chunk_size, len(buffer) - pos))
+                    continue
+                
+                # Số ở cuối buffer có thể chưa đọc hết chữ số (vd. "1." của "1.5")
+                if not eof and (end == len(buffer) or buffer[end] in number_chars):
+                    read_more()
+                    continue
+                
+                pos = end
+                return value
+        
+        if next_char() != '{':
+            raise ValueError(f"{filepath}: top-level JSON phải là object")
+        
+        skip_whitespace()
+        if buffer[pos:pos + 1] == '}':
+            return
+        
+        while True:
+            skip_whitespace()
+            key = decode_value()
+            if not isinstance(key, str):
+                raise ValueError(f"{filepath}: key không hợp lệ: {key!r}")
+            
+            if next_char() != ':':
+                raise ValueError(f"{filepath}: thiếu ':' sau key {key!r}")
+            
+            skip_whitespace()
+            value = decode_value()
+            yield key, value
+            
+            char = next_char()
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"{filepath}: JSON không hợp lệ sau key {key!r}")
+
+
+class JsonArrayWriter:
+    """Ghi JSON array từng phần tử một, cùng format với json.dump(..., indent=2)"""
+    
+    def __init__(self, filepath):
+        self.filepath = Path(filepath)
+        self.count = 0
+        self.file = open(self.filepath, 'w', encoding='utf-8')
+    
+    def write(self, item):
+        """Ghi một phần tử"""
+        text = json.dumps(item, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+        self.file.write(('[\n  ' if self.count == 0 else ',\n  ') + text)
+        self.count += 1
+    
+    def close(self):
+        """Đóng array và file"""
+        self.file.write('\n]' if self.count else '[]')
+        self.file.close()
+
+
+class DeltaOnlyWriter:
+    """Bọc một writer: bỏ belief_state đầy đủ, chỉ lưu delta (+ removed/restored)"""
+    
+    def __init__(self, writer):
+        self.writer = writer
+    
+    @property
+    def count(self):
+        return self.writer.count
+    
+    def write(self, dialogue):
+        """Ghi một dialogue ở dạng delta-only"""
+        self.writer.write({**dialogue, 'turns': to_delta_only(dialogue['turns'])})
+    
+    def close(self):
+        self.writer.close()
+
+
+class VocabEncodingWriter:
+    """Bọc một writer: mã hóa belief states thành [[slot_id, value_id], ...] trước khi ghi"""
+    
+    STATE_KEYS = ('belief_state', 'belief_state_delta', RESTORED_KEY)
+    
+    def __init__(self, writer, vocab):
+        self.writer = writer
+        self.vocab = vocab
+    
+    @property
+    def count(self):
+        return self.writer.count
+    
+    def write(self, dialogue):
+        """Ghi một dialogue với belief states đã mã hóa"""
+        turns = []
+        for turn in dialogue['turns']:
+            encoded = dict(turn)
+            for key in self.STATE_KEYS:
+                if key in encoded:
+                    encoded[key] = self.vocab.encode_pairs(encoded[key], add=True)
+            if REMOVED_KEY in encoded:
+                encoded[REMOVED_KEY] = [self.vocab.slot_id(slot, add=True)
+                                        for slot in encoded[REMOVED_KEY]]
+            turns.append(encoded)
+        self.writer.write({**dialogue, 'turns': turns})
+    
+    def close(self):
+        self.writer.close()
+
+
+class ProcessedCache:
+    """
+    Cache các dialogue đã xử lý, key là hash nội dung (dialogue gốc + config).
+    Manifest lưu danh sách (dialogue_id, hash) của mỗi split ở lần chạy trước.
+    """
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.manifest_file = self.cache_dir / "manifest.json"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+    
+    def path_for(self, key):
+        """Đường dẫn file cache của một hash"""
+        return self.objects_dir / key[:2] / f"{key}.json"
+    
+    def contains(self, key):
+        return self.path_for(key).exists()
+    
+    def get(self, key):
+        """Đọc dialogue đã xử lý từ cache"""
+        with open(self.path_for(key), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def put(self, key, processed):
+        """Ghi dialogue đã xử lý vào cache (atomic)"""
+        path = self.path_for(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(processed, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    
+    def load_manifest(self):
+        """Load manifest của lần chạy trước (rỗng nếu chưa có)"""
+        if not self.manifest_file.exists():
+            return {}
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def save_manifest(self, manifest):
+        tmp_path = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_file)
+    
+    def prune(self, keep):
+        """Xóa các object không còn được dùng, trả về số file đã xóa"""
+        removed = 0
+        for path in self.objects_dir.glob("*/*.json"):
+            if path.stem not in keep:
+                path.unlink()
+                removed += 1
+        return removed
+
 
 class MultiWOZ24Preprocessor:
-    def __init__(self, data_dir, output_dir):
+    # Các format output được hỗ trợ
+    OUTPUT_FORMATS = ['json', 'columnar', 'jsonl']
+    
+    def __init__(self, data_dir, output_dir, output_format='json', num_shards=8, compress=False,
+                 use_vocab=False, delta_only=False):
         self.data_dir = Path(data_dir)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.output_format = output_format
+        
+        # Chỉ dùng cho format jsonl
+        self.num_shards = num_shards
+        self.compress = compress
+        
+        # Mã hóa slot/value thành id theo vocab.json dùng chung
+        self.use_vocab = use_vocab
+        self.vocab = None
+        
+        # Chỉ lưu delta của mỗi turn, belief state được dựng lại khi đọc
+        if delta_only and output_format == 'columnar':
+            raise ValueError("delta_only is not supported with the columnar format")
+        self.delta_only = delta_only
+        
         # Tất cả 7 domains trong MultiWOZ 2.4
         self.domains = ['hotel', 'restaurant', 'attraction', 'taxi', 'train', 'hospital', 'police']
         
+        # Bộ lọc slot dùng trong extract_belief_state
+        self.slot_types = ['book', 'semi']
+        self.ignored_values = ['', 'none', 'not mentioned']
+        
         # Data containers
         self.data = None
         self.ontology = None
         self.val_list = []
         self.test_list = []
+        self.val_set = set()
+        self.test_set = set()
+        
+    def load_data(self, stream=False):
+        """
+        Load dữ liệu gốc
         
-    def load_data(self):
-        """Load dữ liệu gốc"""
+        Args:
+            stream: Nếu True, không load data.json vào memory
+                    (dialogues được đọc dần qua iter_dialogues)
+        """
         print("\n" + "=" * 70)
         print("LOADING DATA")
         print("=" * 70)
         
         # Load main data
         data_file = self.data_dir / "data.json"
-        print(f"Loading {data_file}...")
-        with open(data_file, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
-        print(f"✓ Loaded {len(self.data)} dialogues")
+        if stream:
+            print(f"Streaming {data_file}...")
+        else:
+            print(f"Loading {data_file}...")
+            with open(data_file, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+            print(f"✓ Loaded {len(self.data)} dialogues")
         
         # Load ontology
         ontology_file = self.data_dir / "ontology.json"
@@ -55,8 +327,104 @@ class MultiWOZ24Preprocessor:
             self.test_list = [line.strip() for line in f if line.strip()]
         print(f"✓ Test set: {len(self.test_list)} dialogues")
         
-        train_size = len(self.data) - len(self.val_list) - len(self.test_list)
-        print(f"✓ Train set: {train_size} dialogues")
+        self.val_set = set(self.val_list)
+        self.test_set = set(self.test_list)
+        
+        if self.data is not None:
+            train_size = len(self.data) - len(self.val_list) - len(self.test_list)
+            print(f"✓ Train set: {train_size} dialogues")
+    
+    def get_config(self):
+        """Các tham số ảnh hưởng tới output của process_dialogue"""
+        return {
+            'domains': list(self.domains),
+            'slot_types': list(self.slot_types),
+            'ignored_values': list(self.ignored_values)
+        }
+    
+    def apply_config(self, config):
+        """Áp dụng config (từ get_config) cho preprocessor"""
+        self.domains = list(config['domains'])
+        self.slot_types = list(config['slot_types'])
+        self.ignored_values = list(config['ignored_values'])
+    
+    def config_fingerprint(self):
+        """Hash của config + version, dùng làm một phần key cache"""
+        config = {'version': PREPROCESS_VERSION, **self.get_config()}
+        payload = json.dumps(config, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def dialogue_hash(self, dialogue_id, dialogue, fingerprint):
+        """Hash nội dung của một dialogue gốc (kèm config fingerprint)"""
+        h = hashlib.sha1(fingerprint.encode('utf-8'))
+        h.update(dialogue_id.encode('utf-8'))
+        h.update(b'\0')
+        h.update(json.dumps(dialogue, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return h.hexdigest()
+    
+    def iter_dialogues(self):
+        """Duyệt các dialogue gốc (dialogue_id, dialogue)"""
+        if self.data is not None:
+            yield from self.data.items()
+        else:
+            yield from iter_json_object(self.data_dir / "data.json")
+    
+    def iter_processed(self, workers=1, chunk_size=64, items=None, stats=None):
+        """
+        Xử lý các dialogue gốc, trả về theo đúng thứ tự đọc
+        
+        Args:
+            workers: Số process; > 1 thì chia dialogues theo chunk cho process pool
+            chunk_size: Số dialogues mỗi chunk gửi cho worker
+            items: Iterable (dialogue_id, dialogue); mặc định là iter_dialogues()
+            stats: Dict split -> SplitStatistics để cộng dồn thống kê (với
+                   workers > 1, thống kê được tính trong worker rồi merge theo thứ tự)
+            
+        Yields:
+            Tuple (dialogue_id, processed_dialogue)
+        """
+        if items is None:
+            items = self.iter_dialogues()
+        
+        if workers <= 1:
+            for dialogue_id, dialogue in items:
+                try:
+                    processed = self.process_dialogue(dialogue_id, dialogue)
+                except Exception as e:
+                    print(f"\n✗ Error processing {dialogue_id}: {e}")
+                    continue
+                if stats is not None:
+                    stats[self.get_split(dialogue_id)].update(processed)
+                yield dialogue_id, processed
+            return
+        
+        chunks = iter_chunks(items, chunk_size)
+        
+        with_stats = stats is not None
+        initargs = (str(self.data_dir), str(self.output_dir), self.get_config(),
+                    self.val_list, self.test_list)
+        
+        with Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            # Giữ tối đa vài chunk đang chạy mỗi worker để memory có giới hạn
+            # trong khi vẫn lấy kết quả theo đúng thứ tự gửi đi
+            pending = deque(pool.apply_async(_process_chunk, (chunk, with_stats))
+                            for chunk in islice(chunks, workers * 4))
+            
+            while pending:
+                results, chunk_stats = pending.popleft().get()
+                
+                for chunk in islice(chunks, 1):
+                    pending.append(pool.apply_async(_process_chunk, (chunk, with_stats)))
+                
+                if with_stats:
+                    for split_name, split_stats in chunk_stats.items():
+                        stats[split_name].merge(split_stats)
+                
+                for dialogue_id, processed, error in results:
+                    if error is not None:
+                        print(f"\n✗ Error processing {dialogue_id}: {error}")
+                        continue
+                    yield dialogue_id, processed
     
     def normalize_slot_name(self, domain, slot):
         """Chuẩn hóa tên slot: domain-slot"""
@@ -74,11 +442,11 @@ class MultiWOZ24Preprocessor:
                 domain_data = metadata[domain]
                 
                 # Lấy book và semi slots
-                for slot_type in ['book', 'semi']:
+                for slot_type in self.slot_types:
                     if slot_type in domain_data:
                         for slot, value in domain_data[slot_type].items():
                             # Bỏ qua các giá trị rỗng hoặc 'not mentioned'
-                            if value and value not in ['', 'none', 'not mentioned']:
+                            if value and value not in self.ignored_values:
                                 slot_name = self.normalize_slot_name(domain, slot)
                                 belief_state[slot_name] = value
         
@@ -153,81 +521,93 @@ class MultiWOZ24Preprocessor:
         
         return processed
     
+    def get_split(self, dialogue_id):
+        """Xác định split của một dialogue"""
+        if dialogue_id in self.test_set:
+            return 'test'
+        if dialogue_id in self.val_set:
+            return 'val'
+        return 'train'
+    
     def split_data(self, processed_dialogues):
         """Chia dữ liệu thành train/val/test"""
-        train_data = []
-        val_data = []
-        test_data = []
+        splits = {'train': [], 'val': [], 'test': []}
         
         for dialogue in processed_dialogues:
-            dialogue_id = dialogue['dialogue_id']
-            
-            if dialogue_id in self.test_list:
-                test_data.append(dialogue)
-            elif dialogue_id in self.val_list:
-                val_data.append(dialogue)
-            else:
-                train_data.append(dialogue)
+            splits[self.get_split(dialogue['dialogue_id'])].append(dialogue)
         
-        return train_data, val_data, test_data
+        return splits['train'], splits['val'], splits['test']
     
     def compute_statistics(self, data, split_name):
         """Tính toán thống kê"""
-        stats = {
-            'split': split_name,
-            'num_dialogues': len(data),
-            'num_turns': 0,
-            'num_tokens_user': 0,
-            'num_tokens_system': 0,
-            'domain_counts': Counter(),
-            'slot_counts': Counter(),
-            'slots_per_turn': [],
-            'turns_per_dialogue': []
-        }
+        stats = SplitStatistics(split_name)
         
         for dialogue in data:
-            num_turns = len(dialogue['turns'])
-            stats['num_turns'] += num_turns
-            stats['turns_per_dialogue'].append(num_turns)
-            stats['domain_counts'].update(dialogue['domains'])
-            
-            for turn in dialogue['turns']:
-                # Count tokens
-                stats['num_tokens_user'] += len(turn['utterance'].split())
-                stats['num_tokens_system'] += len(turn['system_response'].split())
-                
-                # Count slots
-                num_slots = len(turn['belief_state'])
-                stats['slots_per_turn'].append(num_slots)
-                stats['slot_counts'].update(turn['belief_state'].keys())
-        
-        # Calculate averages
-        if stats['num_dialogues'] > 0:
-            stats['avg_turns_per_dialogue'] = stats['num_turns'] / stats['num_dialogues']
-        else:
-            stats['avg_turns_per_dialogue'] = 0
+            stats.update(dialogue)
         
-        if stats['num_turns'] > 0:
-            stats['avg_slots_per_turn'] = sum(stats['slots_per_turn']) / stats['num_turns']
-            stats['avg_tokens_user'] = stats['num_tokens_user'] / stats['num_turns']
-            stats['avg_tokens_system'] = stats['num_tokens_system'] / stats['num_turns']
+        return stats.to_dict()
+    
+    def split_output_path(self, split_name):
+        """Đường dẫn output của một split theo output_format"""
+        if self.output_format == 'columnar':
+            return self.output_dir / f"{split_name}.columnar"
+        if self.output_format == 'jsonl':
+            return self.output_dir / f"{split_name}.shards"
+        return self.output_dir / f"{split_name}.json"
+    
+    def open_split_writer(self, split_name):
+        """Tạo writer (write/close/count) cho một split theo output_format"""
+        output_path = self.split_output_path(split_name)
+        vocab = self.get_vocab() if self.use_vocab else None
+        
+        if self.output_format == 'columnar':
+            from src.storage.columnar import ColumnarWriter
+            return ColumnarWriter(output_path, vocab=vocab)
+        
+        if self.output_format == 'jsonl':
+            from src.storage.jsonl import ShardedJsonlWriter
+            writer = ShardedJsonlWriter(output_path, self.num_shards, self.compress)
         else:
-            stats['avg_slots_per_turn'] = 0
-            stats['avg_tokens_user'] = 0
-            stats['avg_tokens_system'] = 0
+            writer = JsonArrayWriter(output_path)
         
-        # Convert Counter to dict for JSON
-        stats['domain_counts'] = dict(stats['domain_counts'])
-        stats['slot_counts'] = dict(stats['slot_counts'])
-        
-        # Remove large lists (keep only summaries)
-        del stats['slots_per_turn']
-        del stats['turns_per_dialogue']
-        
-        return stats
+        if vocab is not None:
+            writer = VocabEncodingWriter(writer, vocab)
+        if self.delta_only:
+            writer = DeltaOnlyWriter(writer)
+        return writer
+    
+    def get_vocab(self):
+        """
+        Vocab dùng chung. Load vocab.json đã có (chỉ thêm id mới, id cũ giữ
+        nguyên để các split không ghi lại vẫn hợp lệ), nếu chưa có thì tạo từ ontology.
+        """
+        if self.vocab is None:
+            vocab_file = self.output_dir / "vocab.json"
+            if vocab_file.exists():
+                self.vocab = Vocab.load(vocab_file)
+            else:
+                self.vocab = Vocab.from_ontology(self.ontology or {})
+        return self.vocab
+    
+    def get_output_config(self):
+        """Các tham số ảnh hưởng tới file output (ghi vào manifest của cache)"""
+        config = {'format': self.output_format}
+        if self.output_format == 'jsonl':
+            config['num_shards'] = self.num_shards
+            config['compress'] = self.compress
+        if self.use_vocab:
+            config['vocab'] = True
+        if self.delta_only:
+            config['delta_only'] = True
+        return config
     
-    def save_processed_data(self, train_data, val_data, test_data):
-        """Lưu dữ liệu đã xử lý"""
+    def save_processed_data(self, train_data, val_data, test_data, stats=None):
+        """
+        Lưu dữ liệu đã xử lý
+        
+        Args:
+            stats: Dict split -> SplitStatistics đã tính sẵn (None thì tính lại)
+        """
         print("\n" + "=" * 70)
         print("SAVING PROCESSED DATA")
         print("=" * 70)
@@ -242,20 +622,36 @@ class MultiWOZ24Preprocessor:
         
         for split_name, split_data in splits.items():
             # Save data
-            output_file = self.output_dir / f"{split_name}.json"
-            print(f"Saving {output_file}...")
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(split_data, f, indent=2, ensure_ascii=False)
-            print(f"✓ Saved {split_name}.json ({len(split_data)} dialogues)")
+            output_path = self.split_output_path(split_name)
+            print(f"Saving {output_path}...")
+            writer = self.open_split_writer(split_name)
+            try:
+                for dialogue in split_data:
+                    writer.write(dialogue)
+            finally:
+                writer.close()
+            print(f"✓ Saved {output_path.name} ({len(split_data)} dialogues)")
             
             # Compute and save statistics
-            stats = self.compute_statistics(split_data, split_name)
-            all_stats[split_name] = stats
-            
-            stats_file = self.output_dir / f"{split_name}_stats.json"
-            with open(stats_file, 'w', encoding='utf-8') as f:
-                json.dump(stats, f, indent=2, ensure_ascii=False)
+            if stats is not None:
+                split_stats = stats[split_name].to_dict()
+            else:
+                split_stats = self.compute_statistics(split_data, split_name)
+            all_stats[split_name] = split_stats
+            self.save_split_statistics(split_stats)
         
+        self.save_metadata(all_stats)
+        
+        return all_stats
+    
+    def save_split_statistics(self, stats):
+        """Lưu thống kê của một split"""
+        stats_file = self.output_dir / f"{stats['split']}_stats.json"
+        with open(stats_file, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2, ensure_ascii=False)
+    
+    def save_metadata(self, all_stats):
+        """Lưu thống kê tổng hợp và ontology"""
         # Save combined stats
         combined_stats_file = self.output_dir / "dataset_stats.json"
         with open(combined_stats_file, 'w', encoding='utf-8') as f:
@@ -267,7 +663,157 @@ class MultiWOZ24Preprocessor:
             json.dump(self.ontology, f, indent=2, ensure_ascii=False)
         print(f"✓ Saved ontology.json")
         
+        if self.vocab is not None:
+            self.vocab.save(self.output_dir / "vocab.json")
+            print(f"✓ Saved vocab.json ({self.vocab.num_slots} slots, {self.vocab.num_values} values)")
+        
         print(f"\n✓ Tất cả dữ liệu đã được lưu tại: {self.output_dir.absolute()}")
+    
+    def process_streaming(self, workers=1):
+        """
+        Xử lý từng dialogue một: đọc -> process_dialogue -> split -> ghi ra file.
+        Memory không phụ thuộc kích thước data.json.
+        """
+        print("\n" + "=" * 70)
+        print("PROCESSING DIALOGUES (STREAMING)")
+        print("=" * 70)
+        
+        split_names = ['train', 'val', 'test']
+        writers = {}
+        all_stats = {}
+        
+        for split_name in split_names:
+            writers[split_name] = self.open_split_writer(split_name)
+            all_stats[split_name] = SplitStatistics(split_name)
+        
+        try:
+            for dialogue_id, processed in tqdm(self.iter_processed(workers, stats=all_stats),
+                                               desc="Processing"):
+                writers[self.get_split(dialogue_id)].write(processed)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        
+        print("\n" + "=" * 70)
+        print("SAVING PROCESSED DATA")
+        print("=" * 70)
+        
+        for split_name in split_names:
+            output_name = self.split_output_path(split_name).name
+            print(f"✓ Saved {output_name} ({writers[split_name].count} dialogues)")
+            all_stats[split_name] = all_stats[split_name].to_dict()
+            self.save_split_statistics(all_stats[split_name])
+        
+        self.save_metadata(all_stats)
+        
+        return all_stats
+    
+    def process_incremental(self, workers=1, cache_dir=None):
+        """
+        Chỉ xử lý lại các dialogue thay đổi (so hash với cache) và chỉ
+        ghi lại các split có thay đổi cùng *_stats.json tương ứng
+        
+        Args:
+            workers: Số process dùng để xử lý các dialogue chưa có trong cache
+            cache_dir: Thư mục cache (mặc định: <output_dir>/.cache)
+        """
+        print("\n" + "=" * 70)
+        print("PROCESSING DIALOGUES (INCREMENTAL)")
+        print("=" * 70)
+        
+        cache = ProcessedCache(cache_dir or self.output_dir / ".cache")
+        manifest = cache.load_manifest()
+        fingerprint = self.config_fingerprint()
+        
+        split_names = ['train', 'val', 'test']
+        entries = {split_name: [] for split_name in split_names}
+        available = set()
+        miss_keys = {}
+        num_cached = 0
+        
+        def iter_misses():
+            """Ghi nhận hash của mọi dialogue, chỉ trả về các dialogue chưa có trong cache"""
+            nonlocal num_cached
+            for dialogue_id, dialogue in self.iter_dialogues():
+                key = self.dialogue_hash(dialogue_id, dialogue, fingerprint)
+                entries[self.get_split(dialogue_id)].append([dialogue_id, key])
+                
+                if key in available or cache.contains(key):
+                    available.add(key)
+                    num_cached += 1
+                    continue
+                
+                miss_keys[dialogue_id] = key
+                yield dialogue_id, dialogue
+        
+        num_processed = 0
+        for dialogue_id, processed in tqdm(self.iter_processed(workers, items=iter_misses()),
+                                           desc="Processing"):
+            key = miss_keys.pop(dialogue_id)
+            cache.put(key, processed)
+            available.add(key)
+            num_processed += 1
+        
+        print(f"\n✓ Cached: {num_cached}, processed: {num_processed}")
+        
+        # Dialogue xử lý lỗi không có trong cache
+        for split_name in split_names:
+            entries[split_name] = [entry for entry in entries[split_name] if entry[1] in available]
+        
+        print("\n" + "=" * 70)
+        print("SAVING PROCESSED DATA")
+        print("=" * 70)
+        
+        old_splits = manifest.get('splits', {})
+        all_stats = {}
+        changed = False
+        
+        for split_name in split_names:
+            output_path = self.split_output_path(split_name)
+            stats_file = self.output_dir / f"{split_name}_stats.json"
+            
+            if (old_splits.get(split_name) == entries[split_name]
+                    and manifest.get('output') == self.get_output_config()
+                    and (not self.use_vocab or (self.output_dir / "vocab.json").exists())
+                    and output_path.exists() and stats_file.exists()):
+                with open(stats_file, 'r', encoding='utf-8') as f:
+                    all_stats[split_name] = json.load(f)
+                print(f"✓ {output_path.name} không thay đổi ({len(entries[split_name])} dialogues)")
+                continue
+            
+            changed = True
+            writer = self.open_split_writer(split_name)
+            stats = SplitStatistics(split_name)
+            try:
+                for _, key in entries[split_name]:
+                    processed = cache.get(key)
+                    writer.write(processed)
+                    stats.update(processed)
+            finally:
+                writer.close()
+            print(f"✓ Saved {output_path.name} ({writer.count} dialogues)")
+            
+            all_stats[split_name] = stats.to_dict()
+            self.save_split_statistics(all_stats[split_name])
+        
+        ontology_hash = hashlib.sha1(
+            json.dumps(self.ontology, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        
+        if (changed or manifest.get('ontology') != ontology_hash
+                or not (self.output_dir / "dataset_stats.json").exists()):
+            self.save_metadata(all_stats)
+        
+        cache.save_manifest({
+            'output': self.get_output_config(),
+            'ontology': ontology_hash,
+            'splits': entries
+        })
+        
+        keep = {key for split_entries in entries.values() for _, key in split_entries}
+        removed = cache.prune(keep)
+        if removed:
+            print(f"✓ Removed {removed} stale cache entries")
         
         return all_stats
     
@@ -298,29 +844,44 @@ class MultiWOZ24Preprocessor:
                                      key=lambda x: x[1], reverse=True)[:5]:
                 print(f"    {slot:<25} {count:>6}")
     
-    def process_all(self):
-        """Xử lý toàn bộ pipeline"""
+    def process_all(self, stream=False, workers=1, incremental=False):
+        """
+        Xử lý toàn bộ pipeline
+        
+        Args:
+            stream: Đọc và ghi từng dialogue một thay vì load toàn bộ data.json
+            workers: Số process dùng cho process_dialogue (output không đổi)
+            incremental: Dùng cache theo hash nội dung, chỉ xử lý/ghi lại phần thay đổi
+        """
         print("=" * 70)
         print("BẮT ĐẦU TIỀN XỬ LÝ MULTIWOZ 2.4")
         print("=" * 70)
         
         # Load data
-        self.load_data()
+        self.load_data(stream=stream)
+        
+        if stream or incremental:
+            if incremental:
+                all_stats = self.process_incremental(workers=workers)
+            else:
+                all_stats = self.process_streaming(workers=workers)
+            self.print_summary(all_stats)
+            
+            print("\n" + "=" * 70)
+            print("✓ TIỀN XỬ LÝ HOÀN TẤT!")
+            print("=" * 70)
+            return
         
         # Process dialogues
         print("\n" + "=" * 70)
         print("PROCESSING DIALOGUES")
         print("=" * 70)
         
-        processed_dialogues = []
-        
-        for dialogue_id, dialogue in tqdm(self.data.items(), desc="Processing"):
-            try:
-                processed = self.process_dialogue(dialogue_id, dialogue)
-                processed_dialogues.append(processed)
-            except Exception as e:
-                print(f"\n✗ Error processing {dialogue_id}: {e}")
-                continue
+        stats = {split_name: SplitStatistics(split_name) for split_name in ['train', 'val', 'test']}
+        processed_dialogues = [
+            processed for _, processed in tqdm(self.iter_processed(workers, stats=stats),
+                                                total=len(self.data), desc="Processing")
+        ]
         
         print(f"\n✓ Processed {len(processed_dialogues)} dialogues")
         
@@ -330,7 +891,7 @@ class MultiWOZ24Preprocessor:
         print(f"✓ Train: {len(train_data)}, Val: {len(val_data)}, Test: {len(test_data)}")
         
         # Save
-        all_stats = self.save_processed_data(train_data, val_data, test_data)
+        all_stats = self.save_processed_data(train_data, val_data, test_data, stats=stats)
         
         # Print summary
         self.print_summary(all_stats)
@@ -340,13 +901,98 @@ class MultiWOZ24Preprocessor:
         print("=" * 70)
 
 
+def iter_chunks(iterable, chunk_size):
+    """Chia iterable thành các list có tối đa chunk_size phần tử"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Preprocessor riêng của mỗi worker process (khởi tạo một lần qua _init_worker)
+_worker_preprocessor = None
+
+
+def _init_worker(data_dir, output_dir, config, val_list, test_list):
+    """Khởi tạo preprocessor trong worker process"""
+    global _worker_preprocessor
+    _worker_preprocessor = MultiWOZ24Preprocessor(data_dir, output_dir)
+    _worker_preprocessor.apply_config(config)
+    _worker_preprocessor.val_set = set(val_list)
+    _worker_preprocessor.test_set = set(test_list)
+
+
+def _process_chunk(chunk, with_stats=False):
+    """
+    Xử lý một chunk dialogues trong worker
+    
+    Returns:
+        Tuple (results, stats): results là list (id, processed, error),
+        stats là dict split -> SplitStatistics của chunk (None nếu không tính)
+    """
+    results = []
+    stats = {} if with_stats else None
+    for dialogue_id, dialogue in chunk:
+        try:
+            processed = _worker_preprocessor.process_dialogue(dialogue_id, dialogue)
+        except Exception as e:
+            results.append((dialogue_id, None, str(e)))
+            continue
+        
+        results.append((dialogue_id, processed, None))
+        if with_stats:
+            split_name = _worker_preprocessor.get_split(dialogue_id)
+            if split_name not in stats:
+                stats[split_name] = SplitStatistics(split_name)
+            stats[split_name].update(processed)
+    return results, stats
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Tiền xử lý MultiWOZ 2.4")
+    parser.add_argument('--data-dir', default="data/multiwoz24",
+                        help="Thư mục chứa dữ liệu gốc")
+    parser.add_argument('--output-dir', default="data/processed",
+                        help="Thư mục lưu dữ liệu đã xử lý")
+    parser.add_argument('--stream', action='store_true',
+                        help="Đọc/ghi từng dialogue một để memory không phụ thuộc kích thước data.json")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Số process xử lý dialogues song song (output giống hệt chạy tuần tự)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Cache theo hash từng dialogue, chỉ xử lý và ghi lại phần thay đổi")
+    parser.add_argument('--format', default='json', choices=MultiWOZ24Preprocessor.OUTPUT_FORMATS,
+                        help="Format lưu các split (columnar: mảng NumPy + string arena, đọc bằng mmap; "
+                             "jsonl: sharded JSON Lines kèm index theo byte offset)")
+    parser.add_argument('--vocab', action='store_true',
+                        help="Lưu belief states dạng [[slot_id, value_id], ...] theo vocab.json dùng chung")
+    parser.add_argument('--delta-only', action='store_true',
+                        help="Chỉ lưu belief_state_delta (+ slot bị xóa/khôi phục) cho mỗi turn, "
+                             "belief state tích lũy được dựng lại khi đọc")
+    parser.add_argument('--shards', type=int, default=8,
+                        help="Số shards mỗi split (format jsonl)")
+    parser.add_argument('--gzip', action='store_true',
+                        help="Nén các shard bằng gzip (format jsonl)")
+    return parser.parse_args()
+
+
 def main():
     """Main function"""
+    args = parse_args()
+    
     preprocessor = MultiWOZ24Preprocessor(
-        data_dir="data/multiwoz24",
-        output_dir="data/processed"
+        data_dir=args.data_dir,
+        output_dir=args.output_dir,
+        output_format=args.format,
+        num_shards=args.shards,
+        compress=args.gzip,
+        use_vocab=args.vocab,
+        delta_only=args.delta_only
     )
-    preprocessor.process_all()
+    preprocessor.process_all(stream=args.stream, workers=args.workers,
+                             incremental=args.incremental)
     
     print("\n🎉 Preprocessing thành công! Dữ liệu đã sẵn sàng để training.")
 
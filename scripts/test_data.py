@@ -43,15 +43,18 @@ def main():
     print("3. PHÂN TÍCH CHI TIẾT TRAIN SET")
     print("=" * 80)
     
+    # Dựng mảng NumPy của train set một lần, các phân tích dùng chung
+    train_arrays = loader.get_arrays('train')
+    
     # Analyze dialogue length
-    length_stats = DataAnalyzer.analyze_dialogue_length(loader.train_data)
+    length_stats = DataAnalyzer.analyze_dialogue_length(train_arrays)
     print(f"\nĐộ dài dialogue:")
     print(f"  Min:  {length_stats['min']:>3} turns")
     print(f"  Max:  {length_stats['max']:>3} turns")
     print(f"  Mean: {length_stats['mean']:>6.2f} turns")
     
     # Analyze domain distribution
-    domain_stats = DataAnalyzer.analyze_domain_distribution(loader.train_data)
+    domain_stats = DataAnalyzer.analyze_domain_distribution(train_arrays)
     print(f"\nPhân bố domain:")
     print(f"  Single-domain:  {domain_stats['single_domain']:>6}")
     print(f"  Multi-domain:   {domain_stats['multi_domain']:>6}")
@@ -61,7 +64,7 @@ def main():
         print(f"    {domain:<15} {count:>6}")
     
     # Analyze slot distribution
-    slot_stats = DataAnalyzer.analyze_slot_distribution(loader.train_data)
+    slot_stats = DataAnalyzer.analyze_slot_distribution(train_arrays)
     print(f"\nPhân bố slots:")
     print(f"  Total turns:         {slot_stats['total_turns']:>6}")
     print(f"  Turns with slots:    {slot_stats['turns_with_slots']:>6}")
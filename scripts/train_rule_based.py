@@ -15,7 +15,6 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.models.rule_based import train_improved_rule_based_model, save_rules
 from src.evaluation.metrics import DSTEvaluator
 from src.evaluation.utils import PredictionSaver
 
@@ -27,50 +26,57 @@ def load_data(filepath):
     return data
 
 
+def is_filled(value):
+    """Value có nghĩa (bỏ 'none' / giá trị không phải chuỗi)"""
+    return isinstance(value, str) and value != 'none'
+
+
 def evaluate_model(model, test_data):
-    """Evaluate model on test data"""
-    from src.evaluation.metrics import DSTMetrics
-    
-    metrics = DSTMetrics()
+    """
+    Evaluate model on test data
+    
+    Returns:
+        (metrics trên delta từng turn, metrics trên belief state tích lũy
+        (cộng dồn các delta dự đoán), list predictions)
+    """
+    # Cumulative mode: state tích lũy được sửa theo delta mỗi turn (gold
+    # delta-only chỉ đọc delta / slot bị xóa, gold đầy đủ tốn O(state) mỗi
+    # turn). Chỉ tính slot gold có value; value dự đoán không bị lọc
+    evaluator = DSTEvaluator(cumulative=True, gold_filter=is_filled)
     all_predictions = []
     
     print("\nEvaluating on test set...")
     for dialogue in test_data:
-        dialogue_history = []
-        
-        for turn in dialogue['turns']:
-            # Only process user turns
-            if turn.get('speaker') != 'user':
-                continue
-                
-            # Add user utterance to history
-            dialogue_history.append(turn['utterance'])
-            
+        # Only process user turns (dữ liệu đã xử lý chỉ có turn user có
+        # belief_state, turn khác không được tính)
+        user_turns = [turn for turn in dialogue['turns'] if turn.get('speaker') == 'user']
+        predicted_turns = []
+        for turn in user_turns:
             # Predict belief state delta (only from current utterance)
             predicted_belief = model.predict([turn['utterance']])
-            
-            # Get ground truth delta (only slots changed in this turn)
-            true_belief = {}
-            for slot, value in turn.get('belief_state_delta', {}).items():
-                if isinstance(value, str) and value != 'none':
-                    true_belief[slot] = value
-            
-            # Update metrics
-            metrics.update(predicted_belief, true_belief)
+            predicted_turns.append({'belief_state_delta': predicted_belief})
             
             # Store prediction for analysis
             all_predictions.append({
-                'dialogue_id': dialogue.get('dialogue_id', 'unknown'),
-                'turn_id': turn.get('turn_id', 0),
+                'dialogue_id': dialogue['dialogue_id'],
+                'turn_id': turn['turn_id'],
                 'utterance': turn['utterance'],
                 'predicted': predicted_belief,
-                'ground_truth': true_belief
+                # Ground truth delta (only slots changed in this turn)
+                'ground_truth': {
+                    slot: value for slot, value in turn['belief_state_delta'].items()
+                    if is_filled(value)
+                }
             })
+        
+        evaluator.evaluate_dialogue(predicted_turns, user_turns, dialogue.get('domains'))
     
-    return metrics, all_predictions
+    return evaluator.metrics, evaluator.cumulative, all_predictions
 
 
 def main():
+    from src.models.rule_based import train_improved_rule_based_model, save_rules
+    
     # Paths
     data_dir = project_root / 'data' / 'processed'
     results_dir = project_root / 'results'
@@ -96,20 +102,23 @@ def main():
     print("\n" + "=" * 80)
     print("EVALUATION ON TEST SET")
     print("=" * 80)
-    metrics_obj, predictions = evaluate_model(model, test_data)
+    metrics_obj, cumulative_obj, predictions = evaluate_model(model, test_data)
     
     # Get metrics
     metrics = metrics_obj.get_summary()
+    cumulative = cumulative_obj.get_summary()
     
     # Print results
     print("\n" + "=" * 80)
     print("RESULTS")
     print("=" * 80)
-    print(f"Joint Goal Accuracy: {metrics['joint_goal_accuracy']:.2%}")
+    print(f"Joint Goal Accuracy (delta): {metrics['joint_goal_accuracy']:.2%}")
     print(f"Slot Accuracy: {metrics['slot_accuracy']:.2%}")
     print(f"Precision: {metrics['precision']:.2%}")
     print(f"Recall: {metrics['recall']:.2%}")
     print(f"F1 Score: {metrics['f1_score']:.2%}")
+    print(f"Cumulative Joint Goal Accuracy: {cumulative['joint_goal_accuracy']:.2%}")
+    print(f"Cumulative Slot Accuracy: {cumulative['slot_accuracy']:.2%}")
     
     print("\nTop 10 Slot Accuracies:")
     per_slot = metrics_obj.get_per_slot_accuracy()
@@ -122,7 +131,11 @@ def main():
     metrics_file = results_dir / 'rule_based_metrics.json'
     full_metrics = {
         **metrics,
-        'per_slot_accuracy': per_slot
+        'per_slot_accuracy': per_slot,
+        'cumulative': {
+            **cumulative,
+            'per_slot_accuracy': cumulative_obj.get_per_slot_accuracy()
+        }
     }
     with open(metrics_file, 'w') as f:
         json.dump(full_metrics, f, indent=2)
@@ -0,0 +1,201 @@
+"""
+Chia một split thành batch (theo turn hoặc theo dialogue) và prefetch
+
+- Kế hoạch batch chỉ gồm (vị trí, độ dài), nên có thể sort theo độ dài
+  (bucket_by_length) và shuffle mà không copy dữ liệu
+- Batch được gom (collate) ở một thread nền và đẩy vào queue có giới hạn,
+  nên việc dựng batch kế tiếp chạy song song với xử lý batch hiện tại
+"""
+
+import queue
+import random
+import threading
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from src.belief_state import BeliefStates
+
+
+BATCH_MODES = ['turn', 'dialogue']
+
+# Khi shuffle + bucket_by_length: sort theo độ dài trong từng nhóm
+# POOL_BATCHES batch liên tiếp (giữ tính ngẫu nhiên giữa các nhóm)
+POOL_BATCHES = 50
+
+_DONE = object()
+
+
+def batch_items(data: Sequence[Dict], by: str = 'turn') -> List[tuple]:
+    """
+    Các phần tử cần chia batch kèm độ dài:
+    by='dialogue': (position, số turns), by='turn': ((position, turn index), số token utterance)
+    """
+    if by not in BATCH_MODES:
+        raise ValueError(f"Unknown batch mode: {by}")
+    
+    items = []
+    # Duyệt theo index (với backend jsonl thứ tự duyệt theo shard khác thứ tự index)
+    for position in range(len(data)):
+        turns = data[position]['turns']
+        if by == 'dialogue':
+            items.append((position, len(turns)))
+        else:
+            for index, turn in enumerate(turns):
+                items.append(((position, index), len(turn.get('utterance', '').split())))
+    return items
+
+
+def plan_batches(items: List[tuple], batch_size: int, bucket_by_length: bool = True,
+                 shuffle_seed: Optional[int] = None) -> List[List[tuple]]:
+    """
+    Chia items thành các batch. bucket_by_length: các phần tử có độ dài gần
+    nhau vào cùng batch (ít padding). shuffle_seed: shuffle phần tử và thứ tự
+    batch (cùng seed -> cùng kế hoạch), None thì giữ thứ tự gốc.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+    
+    items = list(items)
+    rng = random.Random(shuffle_seed) if shuffle_seed is not None else None
+    if rng is not None:
+        rng.shuffle(items)
+    
+    if bucket_by_length:
+        if rng is None:
+            items.sort(key=lambda item: item[1])
+        else:
+            pool = batch_size * POOL_BATCHES
+            items = [
+                item for start in range(0, len(items), pool)
+                for item in sorted(items[start:start + pool], key=lambda item: item[1])
+            ]
+    
+    batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+    if rng is not None and bucket_by_length:
+        rng.shuffle(batches)
+    return batches
+
+
+def collate_dialogues(data: Sequence[Dict], batch: List[tuple]) -> Dict[str, list]:
+    """Batch dialogue: các list song song"""
+    dialogues = [data[position] for position, _ in batch]
+    return {
+        'positions': [position for position, _ in batch],
+        'dialogue_ids': [dialogue['dialogue_id'] for dialogue in dialogues],
+        'lengths': [length for _, length in batch],
+        'dialogues': dialogues
+    }
+
+
+def collate_turns(data: Sequence[Dict], batch: List[tuple],
+                  states: Optional[Dict[int, BeliefStates]] = None,
+                  remaining: Optional[Dict[int, int]] = None) -> Dict[str, list]:
+    """
+    Batch turn: các list song song, kèm belief state tích lũy của từng turn.
+    states: cache position -> BeliefStates dùng chung giữa các batch (giữ các
+    checkpoint, dữ liệu delta-only không phải dựng lại từ turn 0 mỗi batch)
+    remaining: position -> số turn của dialogue chưa được gom trong kế hoạch
+    batch; khi về 0 thì BeliefStates của dialogue bị bỏ khỏi states
+    """
+    result = {key: [] for key in [
+        'positions', 'turn_indices', 'dialogue_ids', 'turn_ids', 'speakers', 'utterances',
+        'system_responses', 'belief_states', 'belief_state_deltas', 'lengths'
+    ]}
+    if states is None:
+        states = {}
+    for (position, index), length in batch:
+        dialogue = data[position]
+        turn = dialogue['turns'][index]
+        if position not in states:
+            states[position] = BeliefStates(dialogue['turns'])
+        
+        result['positions'].append(position)
+        result['turn_indices'].append(index)
+        result['dialogue_ids'].append(dialogue['dialogue_id'])
+        result['turn_ids'].append(turn.get('turn_id', index))
+        result['speakers'].append(turn.get('speaker'))
+        result['utterances'].append(turn.get('utterance', ''))
+        result['system_responses'].append(turn.get('system_response', ''))
+        result['belief_states'].append(states[position][index])
+        result['belief_state_deltas'].append(turn.get('belief_state_delta', {}))
+        result['lengths'].append(length)
+        
+        if remaining is not None:
+            remaining[position] -= 1
+            if not remaining[position]:
+                del remaining[position], states[position]
+    return result
+
+
+def prefetch(iterator: Iterator, size: int = 2) -> Iterator:
+    """
+    Chạy iterator ở một thread nền, giữ tối đa size phần tử đã sẵn sàng.
+    Exception trong thread được raise lại ở phía consumer; dừng duyệt giữa
+    chừng (break / close) thì thread cũng dừng.
+    """
+    if size <= 0:
+        yield from iterator
+        return
+    
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def worker():
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as error:
+            put((_DONE, error))
+    
+    thread = threading.Thread(target=worker, name='batch-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def iter_batches(data: Sequence[Dict], batch_size: int = 32, by: str = 'turn',
+                 bucket_by_length: bool = True, shuffle_seed: Optional[int] = None,
+                 prefetch_batches: int = 2) -> Iterator[Dict[str, list]]:
+    """
+    Duyệt các batch của data (list dialogues hoặc split có truy cập theo index)
+    
+    Args:
+        by: 'turn' (mỗi phần tử là một turn) hoặc 'dialogue'
+        bucket_by_length: Gom các phần tử cùng độ dài (số token utterance /
+                          số turns); False và shuffle_seed=None giữ thứ tự gốc
+        shuffle_seed: Seed để shuffle (None: không shuffle)
+        prefetch_batches: Số batch dựng trước ở thread nền (0: không dùng thread)
+    
+    Yields:
+        Dict các list song song (xem collate_turns / collate_dialogues)
+    """
+    batches = plan_batches(batch_items(data, by), batch_size, bucket_by_length, shuffle_seed)
+    if by == 'dialogue':
+        collated = (collate_dialogues(data, batch) for batch in batches)
+    else:
+        # BeliefStates của mỗi dialogue chỉ được giữ đến khi mọi turn của
+        # dialogue trong kế hoạch batch đã được gom
+        states = {}
+        remaining = Counter(position for batch in batches for (position, _), _ in batch)
+        collated = (collate_turns(data, batch, states, remaining) for batch in batches)
+    return prefetch(collated, prefetch_batches)
@@ -0,0 +1,157 @@
+"""
+Lưu belief state dạng delta-only và dựng lại belief state tích lũy (lazy)
+
+Ở dạng delta-only, mỗi turn không có 'belief_state' mà chỉ có:
+- belief_state_delta: giữ nguyên như dạng đầy đủ (slot mới / đổi giá trị)
+- belief_state_removed: [slot, ...] các slot bị xóa khỏi state (nếu có)
+- belief_state_restored: {slot: value} các slot xuất hiện lại với giá trị cũ,
+  không nằm trong delta (nếu có)
+
+state(t) = state(t-1) - removed(t) + restored(t) + delta(t)
+"""
+
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+REMOVED_KEY = 'belief_state_removed'
+RESTORED_KEY = 'belief_state_restored'
+
+_MISSING = object()
+
+
+def to_delta_only(turns: Iterable[Dict]) -> List[Dict]:
+    """Chuyển các turn (có belief_state đầy đủ) sang dạng delta-only"""
+    result = []
+    prev_state = {}
+    for turn in turns:
+        state = turn.get('belief_state', {})
+        delta = turn.get('belief_state_delta', {})
+        
+        stored = {key: value for key, value in turn.items() if key != 'belief_state'}
+        removed = [slot for slot in prev_state if slot not in state]
+        restored = {
+            slot: value for slot, value in state.items()
+            if slot not in delta and prev_state.get(slot, _MISSING) != value
+        }
+        if removed:
+            stored[REMOVED_KEY] = removed
+        if restored:
+            stored[RESTORED_KEY] = restored
+        
+        result.append(stored)
+        prev_state = state
+    return result
+
+
+def apply_turn(state: Dict, turn: Dict) -> Dict:
+    """Belief state sau turn, từ state của turn trước (không sửa state cũ)"""
+    if 'belief_state' in turn:
+        return dict(turn['belief_state'])
+    
+    removed = turn.get(REMOVED_KEY)
+    if removed:
+        removed = set(removed)
+        new_state = {slot: value for slot, value in state.items() if slot not in removed}
+    else:
+        new_state = dict(state)
+    new_state.update(turn.get(RESTORED_KEY, {}))
+    new_state.update(turn.get('belief_state_delta', {}))
+    return new_state
+
+
+def turn_changes(state: Dict, turn: Dict) -> Tuple[Dict, List]:
+    """
+    (slot được gán / đổi giá trị, slot bị xóa) để từ state của turn trước
+    thành state sau turn, không copy state. Dạng delta-only chỉ đọc delta
+    (O(delta)); dạng đầy đủ thì so cả state trước với belief_state của turn
+    để tìm slot bị xóa (O(số slot của state) mỗi turn, vì belief_state_delta
+    của dạng đầy đủ không ghi slot bị xóa).
+    """
+    if 'belief_state' in turn:
+        new_state = turn['belief_state']
+        removed = [slot for slot in state if slot not in new_state]
+        updates = {
+            slot: value for slot, value in new_state.items()
+            if state.get(slot, _MISSING) != value
+        }
+        return updates, removed
+    
+    updates = turn.get('belief_state_delta', {})
+    restored = turn.get(RESTORED_KEY)
+    if restored:
+        updates = {**restored, **updates}
+    return updates, turn.get(REMOVED_KEY, [])
+
+
+def iter_belief_states(turns: Iterable[Dict]) -> Iterator[Dict]:
+    """Duyệt belief state tích lũy của từng turn (dạng đầy đủ hoặc delta-only)"""
+    state = {}
+    for turn in turns:
+        if 'belief_state' in turn:
+            # Dạng đầy đủ: dùng luôn state đã lưu (apply_turn không sửa state cũ)
+            state = turn['belief_state']
+        else:
+            state = apply_turn(state, turn)
+        yield state
+
+
+def stored_belief_states(turns: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    belief_state lưu ở từng turn ({} nếu không có), không dựng lại từ delta.
+    Dùng cho predictions: turn dự đoán không có belief_state được tính là
+    state rỗng (evaluate prediction dạng delta: DSTEvaluator(cumulative=True))
+    """
+    for turn in turns:
+        yield turn.get('belief_state', {})
+
+
+class BeliefStates(Sequence):
+    """
+    Belief state tích lũy của các turn, dựng lại lazy khi truy cập.
+    State của mỗi checkpoint_every turn được giữ lại, nên truy cập ngẫu nhiên
+    chỉ cần áp dụng tối đa checkpoint_every - 1 delta.
+    """
+    
+    def __init__(self, turns, checkpoint_every: int = 8):
+        if checkpoint_every < 1:
+            raise ValueError(f"checkpoint_every must be >= 1, got {checkpoint_every}")
+        self.turns = turns
+        self.checkpoint_every = checkpoint_every
+        self.checkpoints = {}
+    
+    def __len__(self):
+        return len(self.turns)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        
+        turn = self.turns[index]
+        if 'belief_state' in turn:
+            return turn['belief_state']
+        
+        # Dựng lại từ checkpoint gần nhất phía trước
+        start = index - index % self.checkpoint_every
+        while start > 0 and start not in self.checkpoints:
+            start -= self.checkpoint_every
+        
+        if start in self.checkpoints:
+            state = self.checkpoints[start]
+            first = start + 1
+        else:
+            state = {}
+            first = 0
+        
+        for i in range(first, index + 1):
+            state = apply_turn(state, self.turns[i])
+            if i % self.checkpoint_every == 0:
+                self.checkpoints[i] = state
+        return dict(state)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        return iter_belief_states(self.turns)
@@ -0,0 +1,183 @@
+"""
+Breakdown metrics theo domain, độ sâu turn, loại dialogue và họ slot
+
+Một cube counter nhỏ được cập nhật trong mỗi DSTMetrics.update, nên sau một
+lượt evaluate có sẵn mọi lát cắt, không cần evaluate lại trên tập con.
+
+Mỗi ô của cube có key (group, value, turn_bucket, dialogue_type):
+- group 'all': cả turn (joint = toàn bộ state đúng)
+- group 'slot_domain' / 'slot_family': chỉ các slot có tên bắt đầu bằng
+  '<domain>-' / thuộc họ slot đó (joint = mọi slot của nhóm đúng); turn được
+  tính cho nhóm khi nhóm có slot trong predicted hoặc gold state
+- group 'active_domain': cả turn, tính cho từng domain trong `domains` của
+  dialogue (turn của dialogue nhiều domain có mặt ở nhiều ô nên tổng các ô
+  lớn hơn số turn)
+và các counter COUNTS. Ô của cùng group cộng được với nhau theo turn_bucket
+và dialogue_type.
+"""
+
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# (turn index nhỏ nhất, lớn nhất) của từng bucket, None = không giới hạn
+TURN_BUCKETS = [(0, 1), (2, 3), (4, 5), (6, 8), (9, None)]
+
+DIMENSIONS = ['slot_domain', 'active_domain', 'slot_family', 'turn_bucket', 'dialogue_type']
+
+# Các chiều ứng với group của cube (không kết hợp được với nhau khi slice)
+GROUP_DIMENSIONS = ['slot_domain', 'active_domain', 'slot_family']
+
+COUNTS = ['turns', 'joint', 'true_positives', 'false_positives', 'false_negatives',
+          'slots', 'correct_slots']
+
+UNKNOWN = 'unknown'
+
+
+def turn_bucket(turn_index: Optional[int]) -> str:
+    """Nhãn bucket của turn index (vd. '2-3', '9+')"""
+    if turn_index is None:
+        return UNKNOWN
+    for low, high in TURN_BUCKETS:
+        if high is None:
+            if turn_index >= low:
+                return f"{low}+"
+        elif low <= turn_index <= high:
+            return f"{low}-{high}"
+    return UNKNOWN
+
+
+def dialogue_type(domains: Optional[List[str]]) -> str:
+    """'single' / 'multi' theo số domain của dialogue"""
+    if domains is None:
+        return UNKNOWN
+    return 'multi' if len(domains) > 1 else 'single'
+
+
+def default_slot_family(slot: str) -> str:
+    """Họ slot khi không có ontology: chỉ '<domain>-booked' là book"""
+    return 'book' if slot.endswith('-booked') else 'semi'
+
+
+def summarize(counts: List[int]) -> Dict:
+    """Counter của một ô (hoặc tổng các ô) -> JGA, slot accuracy, P/R/F1"""
+    turns, joint, tp, fp, fn, slots, correct = counts
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'turns': turns,
+        'joint_goal_accuracy': joint / turns if turns else 0.0,
+        'slot_accuracy': correct / slots if slots else 0.0,
+        'precision': precision,
+        'recall': recall,
+        'f1_score': 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    }
+
+
+class Breakdown:
+    """
+    Cube counter cho các lát cắt của DST metrics
+    
+    Args:
+        slot_family: Hàm slot -> 'book'/'semi' (vd. OntologyIndex.slot_family)
+    """
+    
+    def __init__(self, slot_family: Callable[[str], str] = None):
+        self.slot_family = slot_family or default_slot_family
+        self.cells: Dict[Tuple, List[int]] = defaultdict(lambda: [0] * len(COUNTS))
+    
+    def update(self, predicted_state: Dict, ground_truth_state: Dict,
+               turn_index: Optional[int] = None, domains: Optional[List[str]] = None):
+        """
+        Thêm một turn (slot dạng tên)
+        
+        Args:
+            turn_index: Vị trí turn trong dialogue (cho turn_bucket)
+            domains: Domains của dialogue (cho active_domain / dialogue_type)
+        """
+        bucket = turn_bucket(turn_index)
+        kind = dialogue_type(domains)
+        
+        # (group, value) -> [joint, tp, fp, fn, slots, correct] của turn này
+        groups = {}
+        for slot in set(predicted_state) | set(ground_truth_state):
+            in_pred = slot in predicted_state
+            in_true = slot in ground_truth_state
+            pred_value = predicted_state.get(slot)
+            true_value = ground_truth_state.get(slot)
+            
+            tp = int(in_pred and in_true and pred_value == true_value)
+            fp = int(in_pred) - tp
+            fn = int(in_true and not in_pred)
+            correct = int(pred_value == true_value)
+            exact = in_pred == in_true and correct
+            
+            for key in (('slot_domain', slot.split('-')[0]), ('slot_family', self.slot_family(slot))):
+                counts = groups.get(key)
+                if counts is None:
+                    counts = groups[key] = [1, 0, 0, 0, 0, 0]
+                counts[0] &= exact
+                counts[1] += tp
+                counts[2] += fp
+                counts[3] += fn
+                counts[4] += 1
+                counts[5] += correct
+        
+        totals = [int(predicted_state == ground_truth_state), 0, 0, 0, 0, 0]
+        for (group, _), counts in groups.items():
+            if group == 'slot_domain':
+                for i in range(1, 6):
+                    totals[i] += counts[i]
+        groups[('all', 'all')] = totals
+        for domain in (domains if domains is not None else [UNKNOWN]):
+            groups[('active_domain', domain)] = totals
+        
+        for (group, value), counts in groups.items():
+            cell = self.cells[group, value, bucket, kind]
+            cell[0] += 1
+            for i, count in enumerate(counts, 1):
+                cell[i] += count
+    
+    def merge(self, other: 'Breakdown') -> 'Breakdown':
+        for key, counts in other.cells.items():
+            cell = self.cells[key]
+            for i, count in enumerate(counts):
+                cell[i] += count
+        return self
+    
+    def to_state(self) -> List[list]:
+        return [list(key) + counts for key, counts in self.cells.items()]
+    
+    def load_state(self, state: List[list]):
+        for row in state:
+            self.cells[tuple(row[:4])] = list(row[4:])
+    
+    def slice(self, *dimensions: str) -> Dict:
+        """
+        Metrics theo các chiều (xem DIMENSIONS), vd. slice('slot_domain'),
+        slice('active_domain', 'turn_bucket'). Nhiều chiều -> key là tuple.
+        Chỉ dùng được tối đa một chiều trong GROUP_DIMENSIONS.
+        """
+        unknown = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimensions: {', '.join(unknown)}")
+        groups = [dimension for dimension in dimensions if dimension in GROUP_DIMENSIONS]
+        if len(groups) > 1:
+            raise ValueError(f"Cannot slice by more than one of {', '.join(GROUP_DIMENSIONS)}")
+        
+        group = groups[0] if groups else 'all'
+        totals = defaultdict(lambda: [0] * len(COUNTS))
+        for (cell_group, value, bucket, kind), counts in self.cells.items():
+            if cell_group != group:
+                continue
+            coordinates = {group: value, 'turn_bucket': bucket, 'dialogue_type': kind}
+            key = tuple(coordinates[dimension] for dimension in dimensions)
+            total = totals[key[0] if len(key) == 1 else key]
+            for i, count in enumerate(counts):
+                total[i] += count
+        
+        return {key: summarize(counts) for key, counts in sorted(totals.items(), key=lambda item: str(item[0]))}
+    
+    def report(self) -> Dict[str, Dict]:
+        """Các lát cắt một chiều"""
+        return {dimension: self.slice(dimension) for dimension in DIMENSIONS}
@@ -0,0 +1,130 @@
+"""
+Evaluate belief state tích lũy từ delta của từng turn
+
+CumulativeTracker giữ state predicted / gold của dialogue hiện tại và sửa
+trực tiếp theo delta mỗi turn (không copy cả state). Các counter của
+DSTMetrics (JGA, slot accuracy, P/R/F1) chỉ phụ thuộc vài tổng trên các slot
+của state, nên mỗi turn chỉ cần cập nhật lại phần đóng góp của các slot
+trong delta: O(delta) thay vì O(state).
+
+Per-slot accuracy được cộng theo khoảng: mỗi slot nhớ turn bắt đầu trạng
+thái hiện tại (đúng / sai) và chỉ cộng số turns khi trạng thái kết thúc
+(slot đổi giá trị hoặc hết dialogue), nên cần gọi flush() / start_dialogue()
+trước khi đọc per-slot accuracy.
+"""
+
+from typing import Dict, Iterable
+
+_MISSING = object()
+
+
+class CumulativeTracker:
+    """
+    State tích lũy predicted / gold của một dialogue, đẩy kết quả từng turn
+    vào metrics (DSTMetrics, kết quả giống gọi metrics.update với state đầy đủ)
+    
+    tracker.start_dialogue()
+    for turn in dialogue:
+        tracker.update(predicted_delta, gold_delta, predicted_removed, gold_removed)
+    tracker.flush()
+    """
+    
+    def __init__(self, metrics):
+        if metrics.breakdown is not None:
+            raise ValueError("CumulativeTracker does not support breakdown metrics")
+        self.metrics = metrics
+        self.predicted: Dict = {}
+        self.gold: Dict = {}
+        self._reset()
+    
+    def _reset(self):
+        self.turn_index = 0
+        # slot -> turn bắt đầu trạng thái hiện tại (các slot có trong predicted hoặc gold)
+        self.since: Dict = {}
+        # Tổng trên các slot của state: số slot, số slot có ở cả hai,
+        # số slot khớp hoàn toàn, số slot đúng (cùng value, kể cả None)
+        self.num_slots = 0
+        self.num_both = 0
+        self.num_exact = 0
+        self.num_correct = 0
+    
+    def start_dialogue(self):
+        """Bắt đầu dialogue mới (flush per-slot counters của dialogue trước)"""
+        self.flush()
+        self.predicted = {}
+        self.gold = {}
+        self._reset()
+    
+    def flush(self):
+        """Cộng phần per-slot còn treo (từ đầu trạng thái hiện tại tới turn cuối)"""
+        for slot, start in self.since.items():
+            self._close(slot, start, self.predicted.get(slot) == self.gold.get(slot))
+            self.since[slot] = self.turn_index
+    
+    def _close(self, slot, start: int, correct: bool):
+        turns = self.turn_index - start
+        if turns:
+            self.metrics.slot_total[slot] += turns
+            if correct:
+                self.metrics.slot_correct[slot] += turns
+    
+    def _count(self, slot, sign: int) -> bool:
+        """Cộng (sign=1) / trừ (sign=-1) đóng góp của slot; False nếu slot không có ở đâu"""
+        pred_value = self.predicted.get(slot, _MISSING)
+        true_value = self.gold.get(slot, _MISSING)
+        if pred_value is _MISSING and true_value is _MISSING:
+            return False
+        
+        both = pred_value is not _MISSING and true_value is not _MISSING
+        self.num_slots += sign
+        self.num_both += sign * both
+        self.num_exact += sign * (both and pred_value == true_value)
+        self.num_correct += sign * (self.predicted.get(slot) == self.gold.get(slot))
+        return True
+    
+    def update(self, predicted_delta: Dict, gold_delta: Dict,
+               predicted_removed: Iterable = (), gold_removed: Iterable = ()):
+        """
+        Áp dụng delta của một turn (slot gán / đổi giá trị và slot bị xóa,
+        xem src.belief_state.turn_changes) rồi cập nhật metrics cho turn đó
+        """
+        touched = set(predicted_delta).union(gold_delta, predicted_removed, gold_removed)
+        
+        for slot in touched:
+            if self._count(slot, -1):
+                self._close(slot, self.since.pop(slot), self.predicted.get(slot) == self.gold.get(slot))
+        
+        for slot in predicted_removed:
+            self.predicted.pop(slot, None)
+        for slot in gold_removed:
+            self.gold.pop(slot, None)
+        self.predicted.update(predicted_delta)
+        self.gold.update(gold_delta)
+        
+        for slot in touched:
+            if self._count(slot, 1):
+                self.since[slot] = self.turn_index
+        
+        self._record()
+        self.turn_index += 1
+    
+    def _record(self):
+        metrics = self.metrics
+        metrics.total_turns += 1
+        
+        # predicted == gold <=> mọi slot đều có ở cả hai với cùng value
+        joint = self.num_exact == self.num_slots
+        if joint:
+            metrics.correct_joint_goals += 1
+            metrics.perfect_turns += 1
+        
+        metrics.total_slots += self.num_slots
+        metrics.correct_slots += self.num_correct
+        metrics.true_positives += self.num_exact
+        metrics.false_positives += len(self.predicted) - self.num_exact
+        metrics.false_negatives += len(self.gold) - self.num_both
+        
+        if metrics.record_outcomes:
+            metrics.joint_outcomes.append(joint)
+            metrics.turn_correct_slots.append(self.num_correct)
+            metrics.turn_total_slots.append(self.num_slots)
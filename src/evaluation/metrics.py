@@ -2,16 +2,76 @@
 Metrics đánh giá cho Dialogue State Tracking
 """
 
-from typing import Dict, List, Tuple
+import gzip
+import json
+import pickle
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from collections import defaultdict
 
+import numpy as np
+
+from src.belief_state import (REMOVED_KEY, RESTORED_KEY, iter_belief_states,
+                              stored_belief_states, turn_changes)
+from src.evaluation.breakdown import Breakdown
+from src.evaluation.cumulative import CumulativeTracker
+
+
+# Value id của slot có mặt với value None (khác 0 = không có slot)
+NULL_VALUE_ID = -1
+
+
+def encode_state_matrices(vocab, *state_lists: Sequence[Dict]) -> List[np.ndarray]:
+    """
+    Các list belief state -> các ma trận value id (turns x slots) cùng số cột,
+    cột j là slot id j của vocab, 0 = slot không có, NULL_VALUE_ID = value None
+    (slot/value mới được thêm vào vocab). Dùng cho DSTMetrics.update_batch.
+    """
+    encoded = [
+        [[(vocab.add_slot(slot), NULL_VALUE_ID if value is None else vocab.add_value(value))
+          for slot, value in state.items()]
+         for state in states]
+        for states in state_lists
+    ]
+    matrices = []
+    for rows in encoded:
+        matrix = np.zeros((len(rows), vocab.num_slots), dtype=np.int32)
+        for i, pairs in enumerate(rows):
+            for slot_id, value_id in pairs:
+                matrix[i, slot_id] = value_id
+        matrices.append(matrix)
+    return matrices
+
 
 class DSTMetrics:
-    """Các metrics chuẩn cho DST evaluation"""
+    """
+    Các metrics chuẩn cho DST evaluation
+    
+    Belief state có thể là {slot: value} hoặc {slot_id: value_id} (xem
+    src.vocab.Vocab); với dạng id, truyền vocab để báo cáo per-slot theo tên.
+    
+    record_outcomes=True: giữ thêm kết quả từng turn (joint hit, số slot đúng,
+    số slot được tính) để tính khoảng tin cậy / kiểm định (src.evaluation.significance)
     
-    def __init__(self):
+    breakdown=True: cập nhật thêm cube counter theo domain của slot, domain của
+    dialogue, turn bucket, loại dialogue và họ slot (src.evaluation.breakdown),
+    xem self.breakdown.slice(); state dạng id cần vocab.
+    slot_family: hàm slot -> 'book'/'semi' (vd. loader.ontology_index.slot_family)
+    """
+    
+    def __init__(self, vocab=None, record_outcomes: bool = False,
+                 breakdown: bool = False, slot_family=None):
+        self.vocab = vocab
+        self.record_outcomes = record_outcomes
+        self.slot_family = slot_family
+        self.use_breakdown = breakdown
         self.reset()
     
+    def _empty_like(self) -> 'DSTMetrics':
+        return DSTMetrics(self.vocab, self.record_outcomes, self.use_breakdown, self.slot_family)
+    
     def reset(self):
         """Reset tất cả counters"""
         self.total_turns = 0
@@ -30,20 +90,40 @@ class DSTMetrics:
         
         # Turn-level stats
         self.perfect_turns = 0
+        
+        # Kết quả từng turn (khi record_outcomes)
+        self.joint_outcomes = array('b')
+        self.turn_correct_slots = array('i')
+        self.turn_total_slots = array('i')
+        
+        self.breakdown = Breakdown(self.slot_family) if self.use_breakdown else None
+    
+    def turn_outcomes(self) -> Dict[str, np.ndarray]:
+        """Kết quả từng turn dạng mảng: joint (bool), correct_slots, total_slots"""
+        return {
+            'joint': np.frombuffer(self.joint_outcomes, dtype=np.int8).astype(bool),
+            'correct_slots': np.frombuffer(self.turn_correct_slots, dtype=np.int32),
+            'total_slots': np.frombuffer(self.turn_total_slots, dtype=np.int32)
+        }
     
     def update(self, predicted_state: Dict[str, str], 
-               ground_truth_state: Dict[str, str]):
+               ground_truth_state: Dict[str, str],
+               turn_index: int = None, domains: List[str] = None):
         """
         Update metrics với một prediction
         
         Args:
             predicted_state: Dict of slot-value pairs (predicted)
             ground_truth_state: Dict of slot-value pairs (ground truth)
+            turn_index / domains: Vị trí turn và domains của dialogue (chỉ dùng
+                cho breakdown)
         """
         self.total_turns += 1
+        correct_before = self.correct_slots
         
         # Joint Goal Accuracy - tất cả slots phải đúng
-        if predicted_state == ground_truth_state:
+        joint = predicted_state == ground_truth_state
+        if joint:
             self.correct_joint_goals += 1
             self.perfect_turns += 1
         
@@ -74,6 +154,173 @@ class DSTMetrics:
         for slot in ground_truth_state:
             if slot not in predicted_state:
                 self.false_negatives += 1
+        
+        if self.record_outcomes:
+            self.joint_outcomes.append(joint)
+            self.turn_correct_slots.append(self.correct_slots - correct_before)
+            self.turn_total_slots.append(len(all_slots))
+        
+        if self.breakdown is not None:
+            self.breakdown.update(self._named(predicted_state), self._named(ground_truth_state),
+                                  turn_index, domains)
+    
+    def update_batch(self, predicted: np.ndarray, ground_truth: np.ndarray,
+                     mask: np.ndarray = None, slots: Sequence = None):
+        """
+        Update metrics với nhiều turns cùng lúc (kết quả giống hệt gọi update
+        cho từng turn)
+        
+        Args:
+            predicted / ground_truth: Ma trận value id (turns x slots, hoặc
+                dialogues x turns x slots như src.tensor_export), 0 = không có slot,
+                NULL_VALUE_ID = slot có value None (xem encode_state_matrices)
+            mask: Turn mask (shape như predicted bỏ chiều slot), False = padding
+            slots: Key của từng cột cho per-slot counters. Mặc định cột j là
+                slot id j của self.vocab; không có vocab thì phải truyền slots
+                khi có slot được tính (per-slot counters cần tên slot)
+        """
+        if self.breakdown is not None:
+            raise ValueError("update_batch does not support breakdown metrics, use update")
+        
+        predicted = np.asarray(predicted)
+        ground_truth = np.asarray(ground_truth)
+        if predicted.shape != ground_truth.shape:
+            raise ValueError(f"Shape mismatch: {predicted.shape} vs {ground_truth.shape}")
+        
+        # Số dòng tính từ shape (reshape(-1, 0) lỗi khi vocab chưa có slot nào:
+        # khi đó mỗi turn là joint hit với 0 slot, như update({}, {}))
+        num_slots = predicted.shape[-1]
+        num_rows = int(np.prod(predicted.shape[:-1]))
+        predicted = predicted.reshape(num_rows, num_slots)
+        ground_truth = ground_truth.reshape(num_rows, num_slots)
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool).reshape(-1)
+            predicted = predicted[mask]
+            ground_truth = ground_truth[mask]
+        
+        pred_present = predicted != 0
+        true_present = ground_truth != 0
+        either = pred_present | true_present
+        # Như update: joint so sánh cả dict (value None khác không có slot),
+        # slot accuracy so sánh get(slot) (value None giống không có slot)
+        joint_hits = (predicted == ground_truth).all(axis=1)
+        joint = int(joint_hits.sum())
+        correct = either & (np.maximum(predicted, 0) == np.maximum(ground_truth, 0))
+        
+        slot_total = either.sum(axis=0)
+        if slots is None:
+            if self.vocab is None and slot_total.any():
+                raise ValueError("update_batch needs slot names for per-slot stats: "
+                                 "pass slots=... or use DSTMetrics(vocab)")
+            slots = range(num_slots)
+        elif len(slots) != num_slots:
+            raise ValueError(f"Got {len(slots)} slot names for {num_slots} columns")
+        
+        num_turns = len(predicted)
+        self.total_turns += num_turns
+        self.correct_joint_goals += joint
+        self.perfect_turns += joint
+        
+        slot_correct = correct.sum(axis=0)
+        self.total_slots += int(slot_total.sum())
+        self.correct_slots += int(slot_correct.sum())
+        
+        for j in np.flatnonzero(slot_total):
+            self.slot_total[slots[j]] += int(slot_total[j])
+            if slot_correct[j]:
+                self.slot_correct[slots[j]] += int(slot_correct[j])
+        
+        # TP: dự đoán đúng value; FP: dự đoán sai hoặc thừa slot; FN: thiếu slot
+        true_positives = int((pred_present & true_present & (predicted == ground_truth)).sum())
+        self.true_positives += true_positives
+        self.false_positives += int(pred_present.sum()) - true_positives
+        self.false_negatives += int((true_present & ~pred_present).sum())
+        
+        if self.record_outcomes:
+            self.joint_outcomes.extend(joint_hits.astype(np.int8).tolist())
+            self.turn_correct_slots.extend(correct.sum(axis=1).tolist())
+            self.turn_total_slots.extend(either.sum(axis=1).tolist())
+    
+    # Các counter số nguyên (dùng cho merge / serialize)
+    COUNTERS = ['total_turns', 'correct_joint_goals', 'correct_slots', 'total_slots',
+                'true_positives', 'false_positives', 'false_negatives', 'perfect_turns']
+    
+    def merge(self, other: 'DSTMetrics') -> 'DSTMetrics':
+        """
+        Cộng dồn metrics của other vào self (vd. kết quả của từng worker).
+        Merge theo thứ tự các phần của dữ liệu cho kết quả giống chạy tuần tự.
+        Hai bên phải cùng record_outcomes / breakdown.
+        """
+        if other.record_outcomes != self.record_outcomes or other.use_breakdown != self.use_breakdown:
+            raise ValueError(
+                "Cannot merge metrics with different record_outcomes/breakdown settings: "
+                f"({self.record_outcomes}, {self.use_breakdown}) vs "
+                f"({other.record_outcomes}, {other.use_breakdown})"
+            )
+        
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for slot, total in other.slot_total.items():
+            self.slot_total[slot] += total
+        for slot, correct in other.slot_correct.items():
+            self.slot_correct[slot] += correct
+        if self.record_outcomes:
+            self.joint_outcomes.extend(other.joint_outcomes)
+            self.turn_correct_slots.extend(other.turn_correct_slots)
+            self.turn_total_slots.extend(other.turn_total_slots)
+        if self.breakdown is not None:
+            self.breakdown.merge(other.breakdown)
+        return self
+    
+    def __add__(self, other: 'DSTMetrics') -> 'DSTMetrics':
+        if not isinstance(other, DSTMetrics):
+            return NotImplemented
+        return self._empty_like().merge(self).merge(other)
+    
+    def __radd__(self, other):
+        # Cho phép sum(list_metrics)
+        if other == 0:
+            return self._empty_like().merge(self)
+        return NotImplemented
+    
+    def to_state(self) -> Dict:
+        """State gọn, lưu được ra JSON (slot key có thể là tên hoặc id)"""
+        state = {name: getattr(self, name) for name in self.COUNTERS}
+        state['slots'] = [
+            [slot, self.slot_correct.get(slot, 0), total]
+            for slot, total in self.slot_total.items()
+        ]
+        if self.record_outcomes:
+            state['outcomes'] = [list(self.joint_outcomes), list(self.turn_correct_slots),
+                                 list(self.turn_total_slots)]
+        if self.breakdown is not None:
+            state['breakdown'] = self.breakdown.to_state()
+        return state
+    
+    @classmethod
+    def from_state(cls, state: Dict, vocab=None) -> 'DSTMetrics':
+        metrics = cls(vocab, record_outcomes='outcomes' in state, breakdown='breakdown' in state)
+        for name in cls.COUNTERS:
+            setattr(metrics, name, state[name])
+        for slot, correct, total in state['slots']:
+            metrics.slot_total[slot] = total
+            if correct:
+                metrics.slot_correct[slot] = correct
+        if 'outcomes' in state:
+            joint, correct_slots, total_slots = state['outcomes']
+            metrics.joint_outcomes.extend(joint)
+            metrics.turn_correct_slots.extend(correct_slots)
+            metrics.turn_total_slots.extend(total_slots)
+        if 'breakdown' in state:
+            metrics.breakdown.load_state(state['breakdown'])
+        return metrics
+    
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.to_state(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    @classmethod
+    def from_bytes(cls, data: bytes, vocab=None) -> 'DSTMetrics':
+        return cls.from_state(json.loads(data.decode('utf-8')), vocab)
     
     def get_joint_goal_accuracy(self) -> float:
         """Joint Goal Accuracy - % turns với tất cả slots đúng"""
@@ -110,14 +357,28 @@ class DSTMetrics:
             return 0.0
         return 2 * (precision * recall) / (precision + recall)
     
+    def _slot_name(self, slot) -> str:
+        """Tên slot (slot id được đổi về tên qua vocab nếu có)"""
+        if self.vocab is not None and isinstance(slot, int):
+            return self.vocab.slot(slot)
+        return slot
+    
+    def _named(self, state: Dict) -> Dict:
+        """State dạng id -> dạng tên (breakdown cần tên slot)"""
+        if state and isinstance(next(iter(state)), int):
+            if self.vocab is None:
+                raise ValueError("Breakdown metrics on id states need the vocab: DSTMetrics(vocab, breakdown=True)")
+            return {self.vocab.slot(slot): value for slot, value in state.items()}
+        return state
+    
     def get_per_slot_accuracy(self) -> Dict[str, float]:
         """Accuracy cho từng slot riêng biệt"""
         per_slot = {}
         for slot in self.slot_total:
             if self.slot_total[slot] > 0:
-                per_slot[slot] = self.slot_correct[slot] / self.slot_total[slot]
+                per_slot[self._slot_name(slot)] = self.slot_correct[slot] / self.slot_total[slot]
             else:
-                per_slot[slot] = 0.0
+                per_slot[self._slot_name(slot)] = 0.0
         return per_slot
     
     def get_summary(self) -> Dict:
@@ -151,9 +412,29 @@ class DSTMetrics:
         print(f"F1 Score:                 {summary['f1_score']:>10.2%}")
         print("=" * 70)
     
+    def print_breakdown(self):
+        """In JGA / F1 theo từng chiều của breakdown"""
+        if self.breakdown is None:
+            print("✗ Breakdown metrics not enabled (DSTMetrics(breakdown=True))")
+            return
+        
+        for dimension, rows in self.breakdown.report().items():
+            print("\n" + "=" * 70)
+            print(f"BREAKDOWN BY {dimension.upper()}")
+            print("=" * 70)
+            print(f"{'':<20} {'Turns':>10} {'JGA':>10} {'Slot Acc':>10} {'F1':>10}")
+            print("-" * 70)
+            for value, row in rows.items():
+                print(f"{value:<20} {row['turns']:>10} {row['joint_goal_accuracy']:>10.2%} "
+                      f"{row['slot_accuracy']:>10.2%} {row['f1_score']:>10.2%}")
+            print("=" * 70)
+    
     def print_per_slot_accuracy(self, top_k: int = 10):
         """In per-slot accuracy (top-k worst performing slots)"""
-        per_slot = self.get_per_slot_accuracy()
+        per_slot = {
+            slot: self.slot_correct[slot] / total
+            for slot, total in self.slot_total.items() if total > 0
+        }
         
         # Sort by accuracy (ascending)
         sorted_slots = sorted(per_slot.items(), key=lambda x: x[1])
@@ -167,68 +448,426 @@ class DSTMetrics:
         for slot, accuracy in sorted_slots[:top_k]:
             correct = self.slot_correct[slot]
             total = self.slot_total[slot]
-            print(f"{slot:<30} {correct:>10} {total:>10} {accuracy:>10.2%}")
+            print(f"{self._slot_name(slot):<30} {correct:>10} {total:>10} {accuracy:>10.2%}")
         
         print("=" * 70)
 
 
 class DSTEvaluator:
-    """Evaluator để đánh giá model trên dataset"""
+    """
+    Evaluator để đánh giá model trên dataset
+    
+    cumulative=True: predicted turns chỉ cần belief_state_delta (+ slot bị
+    xóa, xem src.belief_state). Trong cùng một lượt, self.metrics tính trên
+    delta từng turn (delta-JGA) và self.cumulative trên belief state tích lũy
+    (cumulative-JGA), state được cộng dồn theo delta (src.evaluation.cumulative)
+    
+    gold_filter: chỉ tính các slot gold có gold_filter(value) là True (vd. bỏ
+    'none' / value không phải chuỗi), slot khác coi như không có trong gold
+    state. Prediction không bị lọc (value dự đoán sai vẫn bị tính là sai)
+    """
     
-    def __init__(self):
-        self.metrics = DSTMetrics()
+    def __init__(self, vocab=None, record_outcomes: bool = False,
+                 breakdown: bool = False, slot_family=None, cumulative: bool = False,
+                 gold_filter: Optional[Callable[[Any], bool]] = None):
+        self.metrics = DSTMetrics(vocab, record_outcomes, breakdown, slot_family)
+        self.gold_filter = gold_filter
+        self.cumulative: Optional[DSTMetrics] = None
+        if cumulative:
+            self.cumulative = DSTMetrics(vocab, record_outcomes)
+            self.tracker = CumulativeTracker(self.cumulative)
+        # Metrics của từng hệ thống (evaluate_many)
+        self.systems: Dict[str, DSTMetrics] = {}
+    
+    def reset(self):
+        self.metrics.reset()
+        if self.cumulative is not None:
+            self.cumulative.reset()
+            self.tracker = CumulativeTracker(self.cumulative)
+    
+    def get_summary(self) -> Dict:
+        """Summary của self.metrics, kèm 'cumulative' khi ở cumulative mode"""
+        summary = self.metrics.get_summary()
+        if self.cumulative is not None:
+            summary['cumulative'] = self.cumulative.get_summary()
+        return summary
     
     def evaluate_dialogue(self, predicted_turns: List[Dict], 
-                         ground_truth_turns: List[Dict]) -> None:
+                         ground_truth_turns: List[Dict],
+                         domains: List[str] = None) -> None:
         """
         Evaluate một dialogue
         
         Args:
             predicted_turns: List of predicted turns with belief_state
+                             (cumulative mode: belief_state_delta)
             ground_truth_turns: List of ground truth turns with belief_state
+            domains: Domains của dialogue gold (cho breakdown)
         """
-        # Đảm bảo số turns giống nhau
-        min_turns = min(len(predicted_turns), len(ground_truth_turns))
+        if self.cumulative is not None:
+            self._evaluate_deltas(predicted_turns, ground_truth_turns, domains)
+            return
         
-        for i in range(min_turns):
-            pred_state = predicted_turns[i].get('belief_state', {})
-            true_state = ground_truth_turns[i].get('belief_state', {})
-            
-            self.metrics.update(pred_state, true_state)
+        # zip dừng ở turn cuối của dialogue ngắn hơn (số turns có thể khác nhau)
+        # Belief state gold được dựng lại nếu dữ liệu lưu dạng delta-only;
+        # prediction dùng belief_state đã lưu ({} nếu không có)
+        states = zip(stored_belief_states(predicted_turns), iter_belief_states(ground_truth_turns))
+        for turn_index, (pred_state, true_state) in enumerate(states):
+            self.metrics.update(pred_state, self._filtered(true_state), turn_index, domains)
+    
+    def _filtered(self, state: Dict) -> Dict:
+        """Các slot của gold state được tính (theo gold_filter)"""
+        if self.gold_filter is None:
+            return state
+        return {slot: value for slot, value in state.items() if self.gold_filter(value)}
+    
+    def _gold_changes(self, state: Dict, turn: Dict) -> Tuple[Dict, List]:
+        """turn_changes của gold theo gold_filter: slot có value không được tính thì bị xóa"""
+        updates, removed = turn_changes(state, turn)
+        if self.gold_filter is None:
+            return updates, removed
+        kept = self._filtered(updates)
+        if len(kept) < len(updates):
+            removed = list(removed)
+            removed.extend(slot for slot in updates if slot not in kept)
+        return kept, removed
+    
+    def _evaluate_deltas(self, predicted_turns: List[Dict], ground_truth_turns: List[Dict],
+                         domains: List[str] = None) -> None:
+        """
+        Cumulative mode: delta metrics và cumulative metrics trong một lượt duyệt turns
+        
+        Turn dạng delta-only chỉ tốn O(delta); turn có belief_state đầy đủ (gold
+        chưa chuyển delta-only) phải so cả state trước để tìm slot bị xóa, tức
+        O(số slot của state) mỗi turn (xem turn_changes)
+        """
+        tracker = self.tracker
+        tracker.start_dialogue()
+        for turn_index, (pred_turn, gt_turn) in enumerate(zip(predicted_turns, ground_truth_turns)):
+            pred_updates, pred_removed = turn_changes(tracker.predicted, pred_turn)
+            gold_updates, gold_removed = self._gold_changes(tracker.gold, gt_turn)
+            self.metrics.update(pred_turn.get('belief_state_delta', pred_updates),
+                                self._filtered(gt_turn.get('belief_state_delta', gold_updates)),
+                                turn_index, domains)
+            tracker.update(pred_updates, gold_updates, pred_removed, gold_removed)
+        tracker.flush()
     
     def evaluate_dataset(self, predictions: List[Dict], 
-                        ground_truth: List[Dict]) -> Dict:
+                        ground_truth: List[Dict], workers: int = 1,
+                        chunk_size: int = 64) -> Dict:
         """
         Evaluate toàn bộ dataset
         
         Args:
             predictions: List of predicted dialogues
             ground_truth: List of ground truth dialogues
+            workers: > 1 thì chia dialogues theo chunk cho process pool rồi
+                     merge metrics từng phần (kết quả giống chạy tuần tự).
+                     Cấu hình evaluator (kể cả gold_filter / slot_family) được
+                     pickle gửi cho mỗi worker một lần, nên các hàm này phải là
+                     hàm cấp module (không dùng lambda / hàm lồng)
+            chunk_size: Số dialogues mỗi chunk khi chạy song song
             
         Returns:
             Dict of metrics
         """
-        self.metrics.reset()
+        self.reset()
         
         # Create mapping by dialogue_id
         gt_dict = {d['dialogue_id']: d for d in ground_truth}
         
-        for pred_dialogue in predictions:
-            dialogue_id = pred_dialogue['dialogue_id']
+        pairs = (
+            (pred_dialogue['turns'], gt_dict[pred_dialogue['dialogue_id']]['turns'],
+             gt_dict[pred_dialogue['dialogue_id']].get('domains'))
+            for pred_dialogue in predictions
+            if pred_dialogue['dialogue_id'] in gt_dict
+        )
+        
+        if workers <= 1:
+            for pred_turns, gt_turns, domains in pairs:
+                self.evaluate_dialogue(pred_turns, gt_turns, domains)
+        else:
+            from itertools import islice
+            from multiprocessing import Pool
             
-            if dialogue_id not in gt_dict:
-                continue
+            metrics = self.metrics
+            options = {'vocab': metrics.vocab, 'record_outcomes': metrics.record_outcomes,
+                       'breakdown': metrics.use_breakdown, 'slot_family': metrics.slot_family,
+                       'cumulative': self.cumulative is not None, 'gold_filter': self.gold_filter}
+            _check_picklable(options)
+            # Worker nhận turns dạng dict thường (view columnar / record không cần pickle được)
+            plain_pairs = (
+                (_plain_turns(pred_turns), _plain_turns(gt_turns), None if domains is None else list(domains))
+                for pred_turns, gt_turns, domains in pairs
+            )
+            chunks = iter(lambda: list(islice(plain_pairs, chunk_size)), [])
+            with Pool(workers, initializer=_init_evaluate_worker, initargs=(options,)) as pool:
+                # imap giữ thứ tự chunk nên thứ tự per-slot giống chạy tuần tự
+                for state, cumulative_state in pool.imap(_evaluate_chunk, chunks):
+                    self.metrics.merge(DSTMetrics.from_state(state))
+                    if cumulative_state is not None:
+                        self.cumulative.merge(DSTMetrics.from_state(cumulative_state))
+        
+        return self.get_summary()
+    
+    def evaluate_stream(self, predictions: Union[Iterable[Dict], str, Path],
+                        gold_source) -> Dict:
+        """
+        Evaluate predictions theo dạng stream: mỗi predicted dialogue được so
+        với gold dialogue lấy qua index rồi bỏ đi, memory không phụ thuộc số
+        predictions
+        
+        Args:
+            predictions: Iterator các predicted dialogues (vd. từ model), hoặc
+                         path file JSON Lines (.jsonl / .jsonl.gz) mỗi dòng một dialogue
+            gold_source: Nguồn gold tra theo dialogue_id (xem gold_lookup):
+                         DataLoader, split có find() (backend jsonl/columnar),
+                         dict {dialogue_id: dialogue}, list dialogues, thư mục
+                         <split>.shards, hoặc hàm dialogue_id -> dialogue
             
-            gt_dialogue = gt_dict[dialogue_id]
+        Returns:
+            Dict of metrics (giống evaluate_dataset)
+        
+        Raises:
+            ValueError: Có predictions nhưng không dialogue_id nào có trong gold
+                        (thường do nguồn gold sai / rỗng)
+        """
+        if isinstance(gold_source, (str, Path)):
+            # Thư mục shards: đóng file handle của các shard sau khi evaluate
+            from src.storage.jsonl import ShardedJsonlSplit
+            with ShardedJsonlSplit(gold_source) as split:
+                return self.evaluate_stream(predictions, split)
+        
+        self.reset()
+        
+        if isinstance(predictions, (str, Path)):
+            predictions = iter_jsonl(predictions)
+        find_gold = gold_lookup(gold_source)
+        
+        num_predictions = num_matched = 0
+        for pred_dialogue in predictions:
+            num_predictions += 1
+            gt_dialogue = find_gold(pred_dialogue['dialogue_id'])
+            if gt_dialogue is None:
+                continue
+            num_matched += 1
+            self.evaluate_dialogue(pred_dialogue['turns'], gt_dialogue['turns'],
+                                   gt_dialogue.get('domains'))
+        
+        if num_predictions and not num_matched:
+            raise ValueError(f"None of the {num_predictions} predicted dialogue_ids was found in the gold source")
+        return self.get_summary()
+    
+    def evaluate_many(self, predictions_by_system: Dict[str, List[Dict]],
+                      ground_truth: Iterable[Dict]) -> Dict[str, Dict]:
+        """
+        Evaluate nhiều hệ thống với cùng gold: belief state gold của mỗi
+        dialogue chỉ dựng một lần rồi dùng lại cho mọi hệ thống
+        
+        Mỗi hệ thống cho kết quả giống evaluate_dataset: turns được duyệt theo
+        thứ tự predictions của hệ thống đó, bỏ qua dialogue không có trong
+        gold. Với record_outcomes, kết quả từng turn của các hệ thống có
+        predictions cùng thứ tự dialogue sẽ thẳng hàng (dùng được cho
+        src.evaluation.significance.compare)
+        
+        Args:
+            predictions_by_system: {tên hệ thống: list predicted dialogues}
+            ground_truth: Gold dialogues (list hoặc iterator)
             
-            self.evaluate_dialogue(
-                pred_dialogue['turns'],
-                gt_dialogue['turns']
-            )
+        Returns:
+            {tên hệ thống: summary} (metrics ở self.systems)
+        
+        Raises:
+            ValueError: Cumulative mode, hoặc dialogue_id bị trùng trong gold
+                        / trong predictions của một hệ thống
+        """
+        if self.cumulative is not None:
+            raise ValueError("evaluate_many does not support cumulative mode")
         
-        return self.metrics.get_summary()
+        gold_by_id = {}
+        for gt_dialogue in ground_truth:
+            dialogue_id = gt_dialogue['dialogue_id']
+            if dialogue_id in gold_by_id:
+                raise ValueError(f"Duplicate dialogue_id in ground truth: {dialogue_id}")
+            gold_by_id[dialogue_id] = gt_dialogue
+        # dialogue_id -> belief states gold (đã lọc), dựng ở lần dùng đầu
+        gold_states = {}
+        
+        self.systems = {}
+        for name, predictions in predictions_by_system.items():
+            metrics = self.systems[name] = self.metrics._empty_like()
+            seen = set()
+            for pred_dialogue in predictions:
+                dialogue_id = pred_dialogue['dialogue_id']
+                if dialogue_id in seen:
+                    raise ValueError(f"Duplicate dialogue_id in predictions of {name}: {dialogue_id}")
+                seen.add(dialogue_id)
+                gt_dialogue = gold_by_id.get(dialogue_id)
+                if gt_dialogue is None:
+                    continue
+                
+                gt_states = gold_states.get(dialogue_id)
+                if gt_states is None:
+                    gt_states = gold_states[dialogue_id] = [
+                        self._filtered(state) for state in iter_belief_states(gt_dialogue['turns'])
+                    ]
+                domains = gt_dialogue.get('domains')
+                states = zip(stored_belief_states(pred_dialogue['turns']), gt_states)
+                for turn_index, (pred_state, true_state) in enumerate(states):
+                    metrics.update(pred_state, true_state, turn_index, domains)
+        
+        return {name: metrics.get_summary() for name, metrics in self.systems.items()}
+    
+    def comparison_table(self) -> Dict:
+        """Summary và per-slot accuracy của các hệ thống (sau evaluate_many), theo cột"""
+        per_slot = {}
+        for name, metrics in self.systems.items():
+            for slot, accuracy in metrics.get_per_slot_accuracy().items():
+                per_slot.setdefault(slot, {})[name] = accuracy
+        return {
+            'summary': {name: metrics.get_summary() for name, metrics in self.systems.items()},
+            'per_slot_accuracy': per_slot
+        }
+    
+    def print_comparison(self, top_k_slots: int = 15):
+        """In bảng so sánh các hệ thống (sau evaluate_many)"""
+        table = self.comparison_table()
+        names = list(self.systems)
+        width = max([12] + [len(name) for name in names])
+        
+        rows = [
+            ('Total Turns', 'total_turns', '{:>{w}}'),
+            ('Joint Goal Accuracy', 'joint_goal_accuracy', '{:>{w}.2%}'),
+            ('Slot Accuracy', 'slot_accuracy', '{:>{w}.2%}'),
+            ('Precision', 'precision', '{:>{w}.2%}'),
+            ('Recall', 'recall', '{:>{w}.2%}'),
+            ('F1 Score', 'f1_score', '{:>{w}.2%}'),
+        ]
+        
+        line_width = 30 + (width + 1) * len(names)
+        print("=" * line_width)
+        print("DST EVALUATION METRICS (COMPARISON)")
+        print("=" * line_width)
+        print(f"{'Metric':<30}" + ' '.join(f"{name:>{width}}" for name in names))
+        print("-" * line_width)
+        for label, key, fmt in rows:
+            values = ' '.join(fmt.format(table['summary'][name][key], w=width) for name in names)
+            print(f"{label:<30}{values}")
+        print("=" * line_width)
+        
+        # Các slot có accuracy trung bình thấp nhất
+        per_slot = table['per_slot_accuracy']
+        worst = sorted(per_slot.items(), key=lambda item: sum(item[1].values()) / len(item[1]))
+        
+        print("\n" + "=" * line_width)
+        print(f"PER-SLOT ACCURACY (Top {top_k_slots} worst performing)")
+        print("=" * line_width)
+        print(f"{'Slot':<30}" + ' '.join(f"{name:>{width}}" for name in names))
+        print("-" * line_width)
+        for slot, accuracies in worst[:top_k_slots]:
+            values = ' '.join(
+                f"{accuracies[name]:>{width}.2%}" if name in accuracies else f"{'-':>{width}}"
+                for name in names
+            )
+            print(f"{str(slot):<30}{values}")
+        print("=" * line_width)
     
     def print_results(self, top_k_slots: int = 15):
         """Print evaluation results"""
         self.metrics.print_summary()
         self.metrics.print_per_slot_accuracy(top_k=top_k_slots)
+        if self.cumulative is not None:
+            print("\nCumulative belief state:")
+            self.cumulative.print_summary()
+            self.cumulative.print_per_slot_accuracy(top_k=top_k_slots)
+
+
+def iter_jsonl(path) -> Iterator[Dict]:
+    """Đọc file JSON Lines (gzip nếu đuôi .gz) từng dòng một"""
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def gold_lookup(gold_source) -> Callable[[str], Optional[Dict]]:
+    """Hàm dialogue_id -> gold dialogue (None nếu không có) cho một nguồn gold"""
+    if isinstance(gold_source, (str, Path)):
+        # Kiểm tra trước find(): str cũng có method find
+        from src.storage.jsonl import ShardedJsonlSplit
+        return ShardedJsonlSplit(gold_source).find
+    if hasattr(gold_source, 'get_dialogue'):
+        # DataLoader: tra index dialogue_id -> vị trí trên các split đã load
+        if all(getattr(gold_source, f"{split}_data") is None for split in gold_source.SPLITS):
+            raise ValueError("DataLoader has no loaded split, call load_all() before using it as gold source")
+        return gold_source.get_dialogue
+    if hasattr(gold_source, 'find'):
+        # ShardedJsonlSplit (một lần seek) / ColumnarSplit
+        return gold_source.find
+    if isinstance(gold_source, Mapping):
+        return gold_source.get
+    if callable(gold_source):
+        return gold_source
+    
+    # List dialogues: chỉ index dialogue_id -> vị trí
+    positions = {}
+    for position, dialogue in enumerate(gold_source):
+        positions.setdefault(dialogue['dialogue_id'], position)
+    
+    def find(dialogue_id: str) -> Optional[Dict]:
+        position = positions.get(dialogue_id)
+        return None if position is None else gold_source[position]
+    return find
+
+
+# Các field của turn mà evaluator đọc
+_EVALUATED_FIELDS = ('belief_state', 'belief_state_delta', REMOVED_KEY, RESTORED_KEY)
+
+
+def _plain_turns(turns: Iterable[Dict]) -> List[Dict]:
+    """Turns -> list dict thường chỉ gồm các field state (để gửi sang worker)"""
+    plain = []
+    for turn in turns:
+        fields = {}
+        for key in _EVALUATED_FIELDS:
+            value = turn.get(key)
+            if value is not None:
+                fields[key] = list(value) if key == REMOVED_KEY else dict(value)
+        plain.append(fields)
+    return plain
+
+
+def _check_picklable(options: Dict) -> None:
+    """Báo lỗi rõ ràng trước khi tạo pool nếu cấu hình không pickle được"""
+    for name, value in options.items():
+        try:
+            pickle.dumps(value)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            raise ValueError(
+                f"{name}={value!r} cannot be pickled for worker processes (workers > 1); "
+                f"use a module-level function instead of a lambda or nested function"
+            ) from e
+
+
+# Cấu hình evaluator của mỗi worker process (khởi tạo một lần qua _init_evaluate_worker)
+_worker_options = None
+
+
+def _init_evaluate_worker(options: Dict) -> None:
+    """Lưu cấu hình evaluator trong worker process"""
+    global _worker_options
+    _worker_options = options
+
+
+def _evaluate_chunk(pairs: List[tuple]) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Worker: metrics và cumulative metrics (dạng state, None nếu không ở
+    cumulative mode) của một chunk (predicted turns, gold turns, domains)
+    """
+    evaluator = DSTEvaluator(**_worker_options)
+    for pred_turns, gt_turns, domains in pairs:
+        evaluator.evaluate_dialogue(pred_turns, gt_turns, domains)
+    cumulative = evaluator.cumulative
+    return evaluator.metrics.to_state(), None if cumulative is None else cumulative.to_state()
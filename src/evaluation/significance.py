@@ -0,0 +1,164 @@
+"""
+Khoảng tin cậy bootstrap và kiểm định có cặp cho DST metrics
+
+Dựa trên kết quả từng turn của DSTMetrics(record_outcomes=True). Không
+resample từng turn: một lần bootstrap chỉ phụ thuộc số lần mỗi loại kết quả
+được chọn, nên
+- JGA (kết quả 0/1): số hit của mỗi lần resample ~ Binomial(n, p)
+- Slot accuracy (cặp (số slot đúng, số slot) mỗi turn): số lần chọn mỗi cặp
+  khác nhau ~ Multinomial(n, tần suất), statistic = tổng đúng / tổng slot
+- So sánh có cặp hai hệ thống: chỉ các turn bất đồng (một đúng một sai) làm
+  thay đổi hiệu số; dưới giả thuyết H0 mỗi turn bất đồng đổi dấu với xác
+  suất 1/2, nên hiệu số hoán vị = 2 * Binomial(d, 1/2) - d
+Mỗi phép tính là một lần sinh mảng NumPy (num_resamples,) hoặc
+(num_resamples, số loại kết quả), không có vòng lặp Python theo resample.
+"""
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def _interval(samples: np.ndarray, estimate: float, confidence: float) -> Dict[str, float]:
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(samples, [alpha, 1 - alpha])
+    return {
+        'estimate': float(estimate),
+        'lower': float(lower),
+        'upper': float(upper),
+        'confidence': confidence
+    }
+
+
+def bootstrap_accuracy(hits: np.ndarray, num_resamples: int = 10000,
+                       confidence: float = 0.95, seed: Optional[int] = None) -> Dict[str, float]:
+    """Khoảng tin cậy bootstrap (percentile) cho tỉ lệ hit của vector 0/1"""
+    hits = np.asarray(hits, dtype=bool)
+    n = len(hits)
+    if n == 0:
+        return {'estimate': 0.0, 'lower': 0.0, 'upper': 0.0, 'confidence': confidence}
+    
+    rng = np.random.default_rng(seed)
+    k = int(hits.sum())
+    samples = rng.binomial(n, k / n, size=num_resamples) / n
+    return _interval(samples, k / n, confidence)
+
+
+def bootstrap_ratio(numerators: np.ndarray, denominators: np.ndarray, num_resamples: int = 10000,
+                    confidence: float = 0.95, seed: Optional[int] = None) -> Dict[str, float]:
+    """
+    Khoảng tin cậy bootstrap cho sum(numerators) / sum(denominators), resample
+    theo turn (vd. slot accuracy: số slot đúng / số slot của từng turn)
+    """
+    numerators = np.asarray(numerators, dtype=np.int64)
+    denominators = np.asarray(denominators, dtype=np.int64)
+    n = len(numerators)
+    total = int(denominators.sum())
+    if n == 0 or total == 0:
+        return {'estimate': 0.0, 'lower': 0.0, 'upper': 0.0, 'confidence': confidence}
+    
+    # Resample trên các cặp (tử, mẫu) khác nhau thay vì trên từng turn
+    pairs, counts = np.unique(np.stack([numerators, denominators], axis=1), axis=0, return_counts=True)
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(n, counts / n, size=num_resamples)
+    sample_totals = draws @ pairs[:, 1]
+    samples = np.divide(draws @ pairs[:, 0], sample_totals,
+                        out=np.zeros(num_resamples), where=sample_totals > 0)
+    return _interval(samples, numerators.sum() / total, confidence)
+
+
+def _discordant(hits_a: np.ndarray, hits_b: np.ndarray):
+    hits_a = np.asarray(hits_a, dtype=bool)
+    hits_b = np.asarray(hits_b, dtype=bool)
+    if hits_a.shape != hits_b.shape:
+        raise ValueError(f"Outcome vectors differ in length: {len(hits_a)} vs {len(hits_b)}")
+    return int((hits_a & ~hits_b).sum()), int((~hits_a & hits_b).sum()), len(hits_a)
+
+
+def paired_bootstrap(hits_a: np.ndarray, hits_b: np.ndarray, num_resamples: int = 10000,
+                     confidence: float = 0.95, seed: Optional[int] = None) -> Dict[str, float]:
+    """Khoảng tin cậy bootstrap có cặp cho hiệu accuracy(a) - accuracy(b)"""
+    only_a, only_b, n = _discordant(hits_a, hits_b)
+    if n == 0:
+        return {'estimate': 0.0, 'lower': 0.0, 'upper': 0.0, 'confidence': confidence}
+    
+    # Các turn đồng thuận không ảnh hưởng hiệu số: chỉ cần 3 loại kết quả
+    rng = np.random.default_rng(seed)
+    probabilities = [only_a / n, only_b / n, (n - only_a - only_b) / n]
+    draws = rng.multinomial(n, probabilities, size=num_resamples)
+    samples = (draws[:, 0] - draws[:, 1]) / n
+    return _interval(samples, (only_a - only_b) / n, confidence)
+
+
+def permutation_test(hits_a: np.ndarray, hits_b: np.ndarray, num_resamples: int = 10000,
+                     seed: Optional[int] = None) -> float:
+    """
+    p-value hai phía của kiểm định hoán vị có cặp (đổi ngẫu nhiên kết quả
+    của a và b trên từng turn) cho hiệu accuracy
+    """
+    only_a, only_b, _ = _discordant(hits_a, hits_b)
+    discordant = only_a + only_b
+    if discordant == 0:
+        return 1.0
+    
+    rng = np.random.default_rng(seed)
+    permuted = 2 * rng.binomial(discordant, 0.5, size=num_resamples) - discordant
+    observed = abs(only_a - only_b)
+    # +1 để p-value không bằng 0 (quan sát gốc cũng là một hoán vị)
+    return float((np.count_nonzero(np.abs(permuted) >= observed) + 1) / (num_resamples + 1))
+
+
+def sign_test(hits_a: np.ndarray, hits_b: np.ndarray) -> float:
+    """p-value hai phía chính xác của sign test (McNemar chính xác) trên các turn bất đồng"""
+    only_a, only_b, _ = _discordant(hits_a, hits_b)
+    discordant = only_a + only_b
+    if discordant == 0:
+        return 1.0
+    
+    # P(X <= min) với X ~ Binomial(d, 1/2), tính trong log-space
+    log_norm = math.lgamma(discordant + 1) - discordant * math.log(2)
+    log_pmf = np.array([
+        log_norm - math.lgamma(k + 1) - math.lgamma(discordant - k + 1)
+        for k in range(min(only_a, only_b) + 1)
+    ])
+    tail = float(np.exp(log_pmf).sum())
+    return min(1.0, 2 * tail)
+
+
+def _outcomes(metrics) -> Dict[str, np.ndarray]:
+    if not metrics.record_outcomes:
+        raise ValueError("Metrics were not recorded with record_outcomes=True")
+    return metrics.turn_outcomes()
+
+
+def confidence_intervals(metrics, num_resamples: int = 10000, confidence: float = 0.95,
+                         seed: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """Khoảng tin cậy bootstrap của JGA và slot accuracy"""
+    outcomes = _outcomes(metrics)
+    return {
+        'joint_goal_accuracy': bootstrap_accuracy(outcomes['joint'], num_resamples, confidence, seed),
+        'slot_accuracy': bootstrap_ratio(outcomes['correct_slots'], outcomes['total_slots'],
+                                         num_resamples, confidence, seed)
+    }
+
+
+def compare(metrics_a, metrics_b, num_resamples: int = 10000, confidence: float = 0.95,
+            seed: Optional[int] = None) -> Dict:
+    """
+    So sánh JGA của hai hệ thống trên cùng các turn (cùng thứ tự):
+    hiệu số kèm khoảng tin cậy, p-value hoán vị và sign test
+    """
+    joint_a = _outcomes(metrics_a)['joint']
+    joint_b = _outcomes(metrics_b)['joint']
+    only_a, only_b, n = _discordant(joint_a, joint_b)
+    return {
+        'num_turns': n,
+        'joint_goal_accuracy_a': float(joint_a.mean()) if n else 0.0,
+        'joint_goal_accuracy_b': float(joint_b.mean()) if n else 0.0,
+        'only_a_correct': only_a,
+        'only_b_correct': only_b,
+        'difference': paired_bootstrap(joint_a, joint_b, num_resamples, confidence, seed),
+        'permutation_p_value': permutation_test(joint_a, joint_b, num_resamples, seed),
+        'sign_test_p_value': sign_test(joint_a, joint_b)
+    }
@@ -3,10 +3,32 @@ Evaluation utilities cho DST models
 """
 
 import json
+from collections.abc import Mapping
 from pathlib import Path
 from typing import Dict, List
 from datetime import datetime
 
+from src.belief_state import iter_belief_states, stored_belief_states
+
+
+def _state_to_pairs(state: Dict, vocab) -> List[List[int]]:
+    """Belief state ({slot: value} hoặc {slot_id: value_id}) -> [[slot_id, value_id], ...]"""
+    if state and isinstance(next(iter(state)), int):
+        return [[slot_id, value_id] for slot_id, value_id in state.items()]
+    return vocab.encode_pairs(state, add=True)
+
+
+def _name_state(state: Dict, vocab) -> Dict:
+    """Belief state dạng id -> {slot: value} (giữ nguyên nếu đã là tên)"""
+    if vocab is not None and state and isinstance(next(iter(state)), int):
+        return vocab.decode_state(state)
+    return state
+
+
+def _to_json_state(state):
+    """State lưu ra JSON được (FrozenState của src.records -> dict)"""
+    return dict(state.items()) if isinstance(state, Mapping) and not isinstance(state, dict) else state
+
 
 class PredictionSaver:
     """Lưu predictions dưới dạng JSON để debug"""
@@ -15,7 +37,8 @@ class PredictionSaver:
     def save_predictions(predictions: List[Dict], 
                         ground_truth: List[Dict],
                         output_path: str,
-                        metadata: Dict = None):
+                        metadata: Dict = None,
+                        vocab=None):
         """
         Lưu predictions kèm ground truth để debug
         
@@ -24,6 +47,8 @@ class PredictionSaver:
             ground_truth: List of ground truth dialogues
             output_path: Path to save
             metadata: Additional metadata (model info, metrics, etc.)
+            vocab: Nếu có, các state được lưu dạng [[slot_id, value_id], ...]
+                   theo vocab này
         """
         # Create mapping
         gt_dict = {d['dialogue_id']: d for d in ground_truth}
@@ -46,15 +71,13 @@ class PredictionSaver:
                 'turns': []
             }
             
-            min_turns = min(len(pred_dialogue['turns']), len(gt_dialogue['turns']))
+            # Belief state gold được dựng lại nếu dữ liệu lưu dạng delta-only,
+            # prediction dùng belief_state đã lưu
+            turn_pairs = zip(pred_dialogue['turns'],
+                             stored_belief_states(pred_dialogue['turns']),
+                             iter_belief_states(gt_dialogue['turns']))
             
-            for i in range(min_turns):
-                pred_turn = pred_dialogue['turns'][i]
-                gt_turn = gt_dialogue['turns'][i]
-                
-                pred_state = pred_turn.get('belief_state', {})
-                gt_state = gt_turn.get('belief_state', {})
-                
+            for pred_turn, pred_state, gt_state in turn_pairs:
                 # Check if perfect match
                 is_correct = (pred_state == gt_state)
                 
@@ -76,11 +99,20 @@ class PredictionSaver:
                                          else 'incorrect'
                         })
                 
+                if vocab is not None:
+                    pred_state = _state_to_pairs(pred_state, vocab)
+                    gt_state = _state_to_pairs(gt_state, vocab)
+                    for error in errors:
+                        if not isinstance(error['slot'], int):
+                            error['slot'] = vocab.slot_id(error['slot'], add=True)
+                            error['predicted'] = vocab.value_id(error['predicted'], add=True)
+                            error['ground_truth'] = vocab.value_id(error['ground_truth'], add=True)
+                
                 turn_result = {
                     'turn_id': pred_turn['turn_id'],
                     'utterance': pred_turn['utterance'],
-                    'predicted_state': pred_state,
-                    'ground_truth_state': gt_state,
+                    'predicted_state': _to_json_state(pred_state),
+                    'ground_truth_state': _to_json_state(gt_state),
                     'is_correct': is_correct,
                     'errors': errors,
                     'num_errors': len(errors)
@@ -95,6 +127,7 @@ class PredictionSaver:
             'metadata': metadata or {},
             'timestamp': datetime.now().isoformat(),
             'total_dialogues': len(results),
+            'state_format': 'ids' if vocab is not None else 'names',
             'predictions': results
         }
         
@@ -109,7 +142,8 @@ class PredictionSaver:
     @staticmethod
     def save_error_analysis(predictions: List[Dict],
                            ground_truth: List[Dict],
-                           output_path: str):
+                           output_path: str,
+                           vocab=None):
         """
         Phân tích và lưu các lỗi phổ biến
         
@@ -117,6 +151,7 @@ class PredictionSaver:
             predictions: List of predicted dialogues
             ground_truth: List of ground truth dialogues
             output_path: Path to save
+            vocab: Vocab để đổi state dạng id về tên trong báo cáo
         """
         from collections import Counter
         
@@ -137,11 +172,12 @@ class PredictionSaver:
                 continue
             
             gt_dialogue = gt_dict[dialogue_id]
-            min_turns = min(len(pred_dialogue['turns']), len(gt_dialogue['turns']))
+            turn_states = zip(stored_belief_states(pred_dialogue['turns']),
+                              iter_belief_states(gt_dialogue['turns']))
             
-            for i in range(min_turns):
-                pred_state = pred_dialogue['turns'][i].get('belief_state', {})
-                gt_state = gt_dialogue['turns'][i].get('belief_state', {})
+            for pred_state, gt_state in turn_states:
+                pred_state = _name_state(pred_state, vocab)
+                gt_state = _name_state(gt_state, vocab)
                 
                 all_slots = set(pred_state.keys()) | set(gt_state.keys())
                 
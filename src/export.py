@@ -0,0 +1,205 @@
+"""
+Streaming exporters (CSV/TSV, text) cho DataExporter
+
+- Nhận bất kỳ iterator dialogues nào (list, backend lazy, generator), xử lý
+  theo từng chunk nên memory không phụ thuộc kích thước split
+- Mỗi chunk được format (và nén) thành một khối bytes rồi ghi một lần
+- Nén bằng thư viện chuẩn: gzip / bz2 / xz. Mỗi chunk là một stream nén
+  riêng, nối lại vẫn là file hợp lệ (đọc bằng gzip.open / bz2.open / lzma.open)
+- Có thể chia ra nhiều shard và format/nén song song trên nhiều process
+"""
+
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+from collections import deque
+from collections.abc import Mapping
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.belief_state import iter_belief_states
+
+
+CSV_COLUMNS = ['dialogue_id', 'turn_id', 'speaker', 'utterance',
+               'belief_state', 'system_response']
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    'gzip': lambda data: gzip.compress(data, mtime=0),
+    'bz2': bz2.compress,
+    'xz': lzma.compress,
+}
+
+_json_encoder = json.JSONEncoder()
+
+
+def iter_chunks(iterable, chunk_size: int):
+    """Chia iterable thành các list có tối đa chunk_size phần tử"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def shard_path(path, shard: int) -> Path:
+    """'train.csv.gz' -> 'train-00003.csv.gz'"""
+    path = Path(path)
+    suffix = ''.join(path.suffixes)
+    stem = path.name[:len(path.name) - len(suffix)] if suffix else path.name
+    return path.with_name(f"{stem}-{shard:05d}{suffix}")
+
+
+def csv_header(columns: List[str], delimiter: str = ',') -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=delimiter).writerow(columns)
+    return buffer.getvalue()
+
+
+def format_csv_rows(dialogues: Iterable[Dict], columns: List[str], delimiter: str = ',') -> str:
+    """Các dòng CSV (mỗi turn một dòng) của các dialogues, chỉ gồm columns"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+    need_state = 'belief_state' in columns
+    
+    for dialogue in dialogues:
+        dialogue_id = dialogue['dialogue_id']
+        turns = dialogue['turns']
+        states = iter_belief_states(turns) if need_state else None
+        for turn in turns:
+            row = {
+                'dialogue_id': dialogue_id,
+                'turn_id': turn['turn_id'],
+                'speaker': turn['speaker'],
+                'utterance': turn['utterance'],
+                'system_response': turn.get('system_response', '')
+            }
+            if need_state:
+                row['belief_state'] = _json_encoder.encode(dict(next(states)))
+            writer.writerow([row[column] for column in columns])
+    
+    return buffer.getvalue()
+
+
+def format_text(dialogues: Iterable[Dict]) -> str:
+    """Dạng text dễ đọc của các dialogues"""
+    parts = []
+    for dialogue in dialogues:
+        parts.append(f"=== {dialogue['dialogue_id']} ===\n")
+        parts.append(f"Domains: {', '.join(dialogue.get('domains', []))}\n\n")
+        
+        turns = dialogue['turns']
+        for turn, belief_state in zip(turns, iter_belief_states(turns)):
+            parts.append(f"[Turn {turn['turn_id']}]\n")
+            parts.append(f"User: {turn['utterance']}\n")
+            
+            if belief_state:
+                parts.append(f"Belief: {dict(belief_state)}\n")
+            
+            if turn.get('system_response'):
+                parts.append(f"System: {turn['system_response']}\n")
+            
+            parts.append("\n")
+        
+        parts.append("\n" + "=" * 80 + "\n\n")
+    return ''.join(parts)
+
+
+def encode_block(text: str, compress: Optional[str] = None) -> bytes:
+    """Text -> bytes UTF-8 (nén thành một stream riêng nếu có compress)"""
+    data = text.encode('utf-8')
+    if compress:
+        data = COMPRESSORS[compress](data)
+    return data
+
+
+def _format_chunk(task) -> bytes:
+    """Worker: format + nén một chunk"""
+    kind, dialogues, options = task
+    if kind == 'csv':
+        text = format_csv_rows(dialogues, options['columns'], options['delimiter'])
+    else:
+        text = format_text(dialogues)
+    return encode_block(text, options['compress'])
+
+
+def _picklable(dialogue):
+    """Dialogue dạng view lazy (vd. backend columnar) -> dict để gửi sang worker"""
+    if isinstance(dialogue, dict) or not isinstance(dialogue, Mapping):
+        return dialogue
+    if hasattr(dialogue, 'to_dict'):
+        return dialogue.to_dict()
+    return {
+        'dialogue_id': dialogue['dialogue_id'],
+        'domains': list(dialogue.get('domains', [])),
+        'turns': [
+            {key: dict(value) if isinstance(value, Mapping) else value for key, value in turn.items()}
+            for turn in dialogue['turns']
+        ]
+    }
+
+
+def export_stream(kind: str, dialogues: Iterable[Dict], output_file, header: str = '',
+                  columns: Optional[List[str]] = None, delimiter: str = ',',
+                  compress: Optional[str] = None, chunk_size: int = 256,
+                  num_shards: int = 1, workers: int = 1) -> List[Path]:
+    """
+    Ghi dialogues ra file (hoặc num_shards file) theo từng chunk
+    
+    Args:
+        kind: 'csv' hoặc 'text'
+        header: Dòng đầu của mỗi file (CSV header)
+        compress: None, 'gzip', 'bz2' hoặc 'xz'
+        chunk_size: Số dialogues mỗi chunk (chunk thứ i vào shard i % num_shards)
+        workers: > 1 thì format/nén các chunk song song
+    
+    Returns:
+        Danh sách file đã ghi
+    """
+    if compress is not None and compress not in COMPRESSORS:
+        raise ValueError(f"Unknown compression: {compress}")
+    if num_shards < 1:
+        raise ValueError(f"num_shards must be >= 1, got {num_shards}")
+    
+    output_file = Path(output_file)
+    paths = [output_file] if num_shards == 1 else [shard_path(output_file, i) for i in range(num_shards)]
+    options = {'columns': columns, 'delimiter': delimiter, 'compress': compress}
+    
+    files = []
+    try:
+        for path in paths:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            f = open(path, 'wb')
+            files.append(f)
+            if header:
+                f.write(encode_block(header, compress))
+        
+        chunks = iter_chunks(dialogues, chunk_size)
+        
+        if workers <= 1:
+            for index, chunk in enumerate(chunks):
+                files[index % num_shards].write(_format_chunk((kind, chunk, options)))
+        else:
+            from multiprocessing import Pool
+            
+            tasks = ((kind, [_picklable(d) for d in chunk], options) for chunk in chunks)
+            with Pool(workers) as pool:
+                # Giới hạn số chunk đang xử lý để memory có giới hạn, ghi theo đúng thứ tự
+                pending = deque(pool.apply_async(_format_chunk, (task,))
+                                for task in islice(tasks, workers * 4))
+                index = 0
+                while pending:
+                    block = pending.popleft().get()
+                    for task in islice(tasks, 1):
+                        pending.append(pool.apply_async(_format_chunk, (task,)))
+                    files[index % num_shards].write(block)
+                    index += 1
+    finally:
+        for f in files:
+            f.close()
+    
+    return paths
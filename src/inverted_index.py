@@ -0,0 +1,162 @@
+"""
+Inverted indexes cho một split: domain -> dialogues, slot -> turns,
+(slot, value) -> turns
+
+Posting lists là mảng NumPy int32 đã sort (vị trí dialogue trong split, hoặc
+số thứ tự turn toàn cục trong split). Kết hợp bằng intersect()/union().
+"""
+
+from collections import defaultdict
+from functools import reduce
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from src.belief_state import iter_belief_states
+from src.vocab import value_key
+
+
+POSTING_DTYPE = np.int32
+
+_EMPTY = np.empty(0, dtype=POSTING_DTYPE)
+
+
+def intersect(*postings: np.ndarray) -> np.ndarray:
+    """Giao các posting lists (bắt đầu từ list ngắn nhất)"""
+    if not postings:
+        return _EMPTY
+    postings = sorted(postings, key=len)
+    return reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), postings)
+
+
+def union(*postings: np.ndarray) -> np.ndarray:
+    """Hợp các posting lists"""
+    if not postings:
+        return _EMPTY
+    return np.unique(np.concatenate(postings)).astype(POSTING_DTYPE, copy=False)
+
+
+def difference(posting: np.ndarray, *others: np.ndarray) -> np.ndarray:
+    """Các phần tử của posting không nằm trong others"""
+    if not others:
+        return posting
+    return np.setdiff1d(posting, union(*others), assume_unique=True)
+
+
+def _finalize(postings: Dict) -> Dict:
+    return {key: np.asarray(items, dtype=POSTING_DTYPE) for key, items in postings.items()}
+
+
+class SplitIndex:
+    """
+    Inverted indexes của một split (list các dialogue)
+    
+    - dialogues_with_domain(domain): dialogue positions
+    - turns_with_slot(slot, cumulative): turns có slot trong delta
+      (cumulative=False) hoặc trong belief state tích lũy (cumulative=True)
+    - turns_with_value(slot, value, cumulative): tương tự cho cặp (slot, value)
+    - turns_where(slot, predicate, cumulative): hợp các value thỏa predicate
+    
+    Turn được đánh số toàn cục trong split; turn_location()/turns_to_dialogues()
+    đổi về (dialogue position, turn index) / dialogue positions.
+    """
+    
+    def __init__(self, data: Sequence[Dict]):
+        domain_dialogues = defaultdict(list)
+        delta_slots = defaultdict(list)
+        state_slots = defaultdict(list)
+        delta_values = defaultdict(list)
+        state_values = defaultdict(list)
+        # slot -> {value_key: value gốc}
+        self.slot_values: Dict[str, Dict] = defaultdict(dict)
+        
+        turn_offsets = [0]
+        turn = 0
+        # Duyệt theo index: position phải khớp với data[position] khi tra cứu
+        for position in range(len(data)):
+            dialogue = data[position]
+            for domain in dialogue.get('domains', []):
+                domain_dialogues[domain].append(position)
+            
+            turns = dialogue['turns']
+            for turn_data, state in zip(turns, iter_belief_states(turns)):
+                for slot, value in turn_data.get('belief_state_delta', {}).items():
+                    key = value_key(value)
+                    delta_slots[slot].append(turn)
+                    delta_values[slot, key].append(turn)
+                    self.slot_values[slot].setdefault(key, value)
+                for slot, value in state.items():
+                    key = value_key(value)
+                    state_slots[slot].append(turn)
+                    state_values[slot, key].append(turn)
+                    self.slot_values[slot].setdefault(key, value)
+                turn += 1
+            turn_offsets.append(turn)
+        
+        self.num_dialogues = len(turn_offsets) - 1
+        self.num_turns = turn
+        self.turn_offsets = np.asarray(turn_offsets, dtype=np.int64)
+        self.turn_dialogue = np.repeat(
+            np.arange(self.num_dialogues, dtype=POSTING_DTYPE), np.diff(self.turn_offsets)
+        )
+        
+        self.domain_dialogues = _finalize(domain_dialogues)
+        self.delta_slots = _finalize(delta_slots)
+        self.state_slots = _finalize(state_slots)
+        self.delta_values = _finalize(delta_values)
+        self.state_values = _finalize(state_values)
+        self.slot_values = dict(self.slot_values)
+    
+    def domains(self) -> List[str]:
+        return sorted(self.domain_dialogues)
+    
+    def slots(self) -> List[str]:
+        return sorted(self.slot_values)
+    
+    def values(self, slot: str) -> List:
+        """Các value đã xuất hiện của slot"""
+        return list(self.slot_values.get(slot, {}).values())
+    
+    def dialogues_with_domain(self, domain: str) -> np.ndarray:
+        return self.domain_dialogues.get(domain, _EMPTY)
+    
+    def turns_with_slot(self, slot: str, cumulative: bool = False) -> np.ndarray:
+        postings = self.state_slots if cumulative else self.delta_slots
+        return postings.get(slot, _EMPTY)
+    
+    def turns_with_value(self, slot: str, value, cumulative: bool = False) -> np.ndarray:
+        postings = self.state_values if cumulative else self.delta_values
+        return postings.get((slot, value_key(value)), _EMPTY)
+    
+    def turns_where(self, slot: str, predicate: Callable, cumulative: bool = False) -> np.ndarray:
+        """Turns mà slot có value thỏa predicate(value)"""
+        return union(*[
+            self.turns_with_value(slot, value, cumulative)
+            for value in self.values(slot) if predicate(value)
+        ])
+    
+    def all_turns(self) -> np.ndarray:
+        return np.arange(self.num_turns, dtype=POSTING_DTYPE)
+    
+    def all_dialogues(self) -> np.ndarray:
+        return np.arange(self.num_dialogues, dtype=POSTING_DTYPE)
+    
+    def dialogue_turns(self, dialogues: np.ndarray) -> np.ndarray:
+        """Tất cả turns của các dialogue (để giao với posting lists của turns)"""
+        dialogues = np.asarray(dialogues, dtype=np.int64)
+        starts = self.turn_offsets[dialogues]
+        lengths = self.turn_offsets[dialogues + 1] - starts
+        if lengths.sum() == 0:
+            return _EMPTY
+        # arange của từng đoạn [start, start + length)
+        first = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return (first + np.arange(lengths.sum())).astype(POSTING_DTYPE)
+    
+    def turns_to_dialogues(self, turns: np.ndarray) -> np.ndarray:
+        """Dialogue positions (không trùng, đã sort) chứa các turns"""
+        return np.unique(self.turn_dialogue[turns])
+    
+    def turn_location(self, turn: int) -> Tuple[int, int]:
+        """Turn toàn cục -> (dialogue position, turn index trong dialogue)"""
+        dialogue = int(self.turn_dialogue[turn])
+        return dialogue, int(turn - self.turn_offsets[dialogue])
@@ -0,0 +1,178 @@
+"""
+OntologyIndex: ontology đã biên dịch để tra cứu slot/value O(1)
+
+ontology.json của MultiWOZ 2.4 là flat ({'hotel-book day': [...], ...});
+dạng nested ({domain: {'semi'/'book': {slot: [...]}}}) cũng được hỗ trợ.
+Tên slot được chuẩn hóa giống dữ liệu đã xử lý ('hotel-book day' -> 'hotel-day').
+
+Value phức hợp trong ontology:
+- 'centre|west': một trong các lựa chọn (kind 'any')
+- 'cheap>moderate' (hoặc 'monday<thursday'): giá trị bị đổi trong dialogue
+  (kind 'changed')
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from src.vocab import iter_ontology_slots, normalize_ontology_slot
+
+
+ONTOLOGY_INDEX_VERSION = 2
+
+# Ký tự phân tách value phức hợp -> kind
+COMPOUND_SEPARATORS = {'|': 'any', '>': 'changed', '<': 'changed'}
+
+
+def normalize_value(value: str) -> str:
+    """Dạng chuẩn hóa của value (lowercase, gộp khoảng trắng)"""
+    return ' '.join(str(value).lower().split())
+
+
+def slot_families(ontology: Dict) -> Dict[str, str]:
+    """
+    Slot (tên đã chuẩn hóa) -> 'book' hoặc 'semi' ('hotel-book day' là slot
+    book, dạng nested lấy theo section 'book'/'semi')
+    """
+    families = {}
+    for key, entry in ontology.items():
+        if isinstance(entry, list):
+            slot = key.partition('-')[2].lower()
+            families[normalize_ontology_slot(key)] = 'book' if slot.startswith('book ') else 'semi'
+        elif isinstance(entry, dict):
+            for slot_type in ['semi', 'book']:
+                for slot in entry.get(slot_type, {}):
+                    families[f"{key}-{slot}".lower()] = slot_type
+    return families
+
+
+def parse_compound(value: str) -> Tuple[Optional[str], Tuple[str, ...]]:
+    """
+    Tách value phức hợp: 'centre|west' -> ('any', ('centre', 'west')),
+    'cheap>moderate' -> ('changed', ('cheap', 'moderate')), value đơn -> (None, (value,))
+    """
+    for separator, kind in COMPOUND_SEPARATORS.items():
+        if separator in value:
+            return kind, tuple(part.strip() for part in value.split(separator))
+    return None, (value,)
+
+
+class OntologyIndex:
+    """
+    Ontology đã biên dịch:
+    - slot_values: slot -> frozenset values (values: tuple theo thứ tự gốc)
+    - value_slots: value -> frozenset slots (reverse map, gồm cả các phần
+      của value phức hợp)
+    - compounds: value phức hợp -> (kind, parts)
+    - normalized: slot -> {dạng chuẩn hóa: value gốc} (gồm cả các phần)
+    - families: slot -> 'book' / 'semi'
+    """
+    
+    def __init__(self, ontology: Dict):
+        slot_value_lists = {}
+        for slot, values in iter_ontology_slots(ontology):
+            slot_value_lists.setdefault(slot, []).extend(values)
+        
+        self.slots: Tuple[str, ...] = tuple(slot_value_lists)
+        self.domains: Tuple[str, ...] = tuple(dict.fromkeys(slot.split('-')[0] for slot in self.slots))
+        self.values: Dict[str, Tuple[str, ...]] = {
+            slot: tuple(dict.fromkeys(values)) for slot, values in slot_value_lists.items()
+        }
+        self.slot_values: Dict[str, FrozenSet[str]] = {
+            slot: frozenset(values) for slot, values in self.values.items()
+        }
+        
+        self.compounds: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+        self.normalized: Dict[str, Dict[str, str]] = {}
+        value_slots = {}
+        for slot, values in self.values.items():
+            normalized = {}
+            for value in values:
+                kind, parts = parse_compound(value)
+                if kind is not None:
+                    self.compounds[value] = (kind, parts)
+                for item in (value,) + (parts if kind is not None else ()):
+                    value_slots.setdefault(item, set()).add(slot)
+                    normalized.setdefault(normalize_value(item), item)
+            self.normalized[slot] = normalized
+        
+        self.value_slots: Dict[str, FrozenSet[str]] = {
+            value: frozenset(slots) for value, slots in value_slots.items()
+        }
+        self.families: Dict[str, str] = slot_families(ontology)
+    
+    @classmethod
+    def load(cls, path, cache_dir=None) -> 'OntologyIndex':
+        """
+        Load ontology.json và biên dịch index. Nếu có cache_dir, index được
+        cache ra đĩa (dùng lại khi ontology.json không đổi).
+        """
+        from src.storage.snapshot import load_snapshot, save_snapshot, source_signatures
+        
+        path = Path(path)
+        options = {'kind': 'ontology_index', 'version': ONTOLOGY_INDEX_VERSION}
+        cache_path = Path(cache_dir) / "ontology_index.pkl" if cache_dir else None
+        
+        if cache_path is not None:
+            index = load_snapshot(cache_path, [path], options)
+            if index is not None:
+                return index
+            signatures = source_signatures([path])
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            index = cls(json.load(f))
+        
+        if cache_path is not None:
+            try:
+                save_snapshot(cache_path, signatures, options, index)
+            except OSError:
+                pass
+        return index
+    
+    @staticmethod
+    def normalize_slot(slot: str) -> str:
+        """Tên slot chuẩn hóa (nhận cả tên theo ontology, vd. 'hotel-book day')"""
+        return normalize_ontology_slot(slot)
+    
+    def _slot(self, slot: str) -> str:
+        return slot if slot in self.slot_values else normalize_ontology_slot(slot)
+    
+    def has_slot(self, slot: str) -> bool:
+        return self._slot(slot) in self.slot_values
+    
+    def get_slot_values(self, slot: str) -> Tuple[str, ...]:
+        """Các value của slot theo thứ tự trong ontology (rỗng nếu không có)"""
+        return self.values.get(self._slot(slot), ())
+    
+    def has_value(self, slot: str, value: str) -> bool:
+        """Value có đúng nguyên văn trong ontology của slot không"""
+        return value in self.slot_values.get(self._slot(slot), ())
+    
+    def slots_for_value(self, value: str) -> FrozenSet[str]:
+        """Các slot có value này (kể cả là một phần của value phức hợp)"""
+        return self.value_slots.get(value, frozenset())
+    
+    def expand(self, value: str) -> Tuple[str, ...]:
+        """Các phần của value (value đơn -> (value,))"""
+        compound = self.compounds.get(value)
+        if compound is None:
+            return parse_compound(value)[1]
+        return compound[1]
+    
+    def normalize(self, slot: str, value: str) -> Optional[str]:
+        """Value trong ontology ứng với value (so theo dạng chuẩn hóa), None nếu không có"""
+        return self.normalized.get(self._slot(slot), {}).get(normalize_value(value))
+    
+    def slot_family(self, slot: str) -> str:
+        """'book' hoặc 'semi' (slot ngoài ontology: '<domain>-booked' là book)"""
+        family = self.families.get(self._slot(slot))
+        if family is None:
+            family = 'book' if slot.endswith('-booked') else 'semi'
+        return family
+    
+    def is_valid(self, slot: str, value: str) -> bool:
+        """Value (hoặc mọi phần của value phức hợp) có trong ontology của slot không"""
+        normalized = self.normalized.get(self._slot(slot))
+        if not normalized:
+            return False
+        return all(normalize_value(part) in normalized for part in self.expand(value))
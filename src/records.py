@@ -0,0 +1,221 @@
+"""
+Record types gọn (dùng __slots__) cho dialogue/turn đã xử lý
+
+Dialogue, Turn và FrozenState vẫn truy cập được như dict
+(dialogue['turns'][i]['belief_state'], .get, .items, ...) nên code cũ
+dùng được mà không phải sửa, nhưng không tốn một dict cho mỗi turn/state.
+"""
+
+import sys
+from collections.abc import ItemsView, Mapping, ValuesView
+from typing import Any, Dict, Iterator, List, Tuple
+
+from src.belief_state import REMOVED_KEY, RESTORED_KEY
+from src.vocab import value_key
+
+
+# Tuple slot names dùng chung giữa các state có cùng tập slot
+_KEY_TUPLES: Dict[Tuple, Tuple] = {}
+
+
+def _intern(item):
+    return sys.intern(item) if isinstance(item, str) else item
+
+
+class _FrozenItems(ItemsView):
+    __slots__ = ()
+    
+    def __iter__(self):
+        return zip(self._mapping._keys, self._mapping._values)
+
+
+class _FrozenValues(ValuesView):
+    __slots__ = ()
+    
+    def __iter__(self):
+        return iter(self._mapping._values)
+
+
+class FrozenState(Mapping):
+    """
+    Belief state bất biến {slot: value}, lưu bằng hai tuple (slots, values).
+    Tuple slots được dùng chung giữa các state có cùng tập slot.
+    """
+    
+    __slots__ = ('_keys', '_values', '_hash')
+    
+    def __init__(self, keys: Tuple = (), values: Tuple = ()):
+        if len(keys) != len(values):
+            raise ValueError("keys and values must have the same length")
+        self._keys = _KEY_TUPLES.setdefault(keys, keys)
+        self._values = values
+        self._hash = None
+    
+    @classmethod
+    def from_dict(cls, state) -> 'FrozenState':
+        """Tạo từ dict {slot: value} (giữ thứ tự slot)"""
+        if isinstance(state, FrozenState):
+            return state
+        keys = tuple(_intern(slot) for slot in state)
+        values = tuple(_intern(value) for value in state.values())
+        return cls(keys, values)
+    
+    def __getitem__(self, slot):
+        try:
+            return self._values[self._keys.index(slot)]
+        except ValueError:
+            raise KeyError(slot) from None
+    
+    def get(self, slot, default=None):
+        if slot in self._keys:
+            return self._values[self._keys.index(slot)]
+        return default
+    
+    def __contains__(self, slot):
+        return slot in self._keys
+    
+    def __iter__(self) -> Iterator:
+        return iter(self._keys)
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def items(self):
+        return _FrozenItems(self)
+    
+    def values(self):
+        return _FrozenValues(self)
+    
+    def __eq__(self, other):
+        if isinstance(other, FrozenState) and self._keys is other._keys:
+            # Cùng tập slot cùng thứ tự: so sánh tuple values
+            return self._values == other._values
+        return super().__eq__(other)
+    
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(zip(self._keys, map(value_key, self._values))))
+        return self._hash
+    
+    def __reduce__(self):
+        # Dựng lại qua __init__: không pickle _hash (hash của str khác nhau
+        # giữa các process) và tuple slots được dùng chung lại sau khi load
+        return FrozenState, (self._keys, self._values)
+    
+    def __repr__(self):
+        return f"FrozenState({dict(self.items())!r})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._keys, self._values))
+
+
+EMPTY_STATE = FrozenState()
+
+
+def _freeze(state):
+    return FrozenState.from_dict(state) if state else EMPTY_STATE
+
+
+class Turn(Mapping):
+    """Một turn đã xử lý, truy cập như dict (field không có thì là None)"""
+    
+    FIELDS = ('turn_id', 'speaker', 'utterance', 'belief_state',
+              'belief_state_delta', 'system_response', REMOVED_KEY, RESTORED_KEY)
+    STATE_FIELDS = ('belief_state', 'belief_state_delta', RESTORED_KEY)
+    
+    __slots__ = FIELDS
+    
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown turn fields: {', '.join(fields)}")
+    
+    @classmethod
+    def from_dict(cls, turn: Dict) -> 'Turn':
+        """Tạo từ dict của một turn (belief states được đóng băng)"""
+        if isinstance(turn, Turn):
+            return turn
+        fields = dict(turn)
+        for name in cls.STATE_FIELDS:
+            if name in fields:
+                fields[name] = _freeze(fields[name])
+        if fields.get(REMOVED_KEY):
+            fields[REMOVED_KEY] = [_intern(slot) for slot in fields[REMOVED_KEY]]
+        if 'speaker' in fields:
+            fields['speaker'] = _intern(fields['speaker'])
+        return cls(**fields)
+    
+    def __getitem__(self, key):
+        if key in Turn.__slots__:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+    
+    def __iter__(self):
+        return (name for name in self.FIELDS if getattr(self, name) is not None)
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def __repr__(self):
+        return f"Turn({self.turn_id!r}, {self.utterance!r})"
+    
+    def to_dict(self) -> Dict:
+        """Dict thuần (lưu ra JSON được)"""
+        turn = {}
+        for name in self:
+            value = getattr(self, name)
+            if isinstance(value, FrozenState):
+                value = value.to_dict()
+            elif isinstance(value, list):
+                value = list(value)
+            turn[name] = value
+        return turn
+
+
+class Dialogue(Mapping):
+    """Một dialogue đã xử lý, truy cập như dict"""
+    
+    FIELDS = ('dialogue_id', 'domains', 'turns')
+    
+    __slots__ = FIELDS
+    
+    def __init__(self, dialogue_id: str, domains: List[str] = None, turns: List[Turn] = None):
+        self.dialogue_id = dialogue_id
+        self.domains = domains if domains is not None else []
+        self.turns = turns if turns is not None else []
+    
+    @classmethod
+    def from_dict(cls, dialogue: Dict) -> 'Dialogue':
+        """Tạo từ dict của một dialogue"""
+        if isinstance(dialogue, Dialogue):
+            return dialogue
+        return cls(
+            dialogue['dialogue_id'],
+            [_intern(domain) for domain in dialogue.get('domains', [])],
+            [Turn.from_dict(turn) for turn in dialogue['turns']]
+        )
+    
+    def __getitem__(self, key):
+        if key in Dialogue.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+    
+    def __iter__(self):
+        return iter(self.FIELDS)
+    
+    def __len__(self):
+        return len(self.FIELDS)
+    
+    def __repr__(self):
+        return f"Dialogue({self.dialogue_id!r}, {len(self.turns)} turns)"
+    
+    def to_dict(self) -> Dict:
+        """Dict thuần (lưu ra JSON được)"""
+        return {
+            'dialogue_id': self.dialogue_id,
+            'domains': list(self.domains),
+            'turns': [turn.to_dict() for turn in self.turns]
+        }
@@ -0,0 +1,145 @@
+"""
+Biểu diễn mảng NumPy của một split để phân tích vectorized
+
+Dựng một lần cho mỗi split (một lượt Python trên list dialogues, hoặc lấy
+thẳng từ các mảng của backend columnar, không cần lượt Python nào), sau đó
+mọi phân phối / coverage chỉ là các phép reduce trên mảng.
+"""
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from src.belief_state import iter_belief_states
+
+
+def _bitmasks(ids: np.ndarray, offsets: np.ndarray, num_bits: int) -> np.ndarray:
+    """Bitmask (uint64, mỗi hàng ceil(num_bits / 64) word) cho mỗi đoạn ids[offsets[i]:offsets[i+1]]"""
+    num_rows = len(offsets) - 1
+    num_words = max(1, (num_bits + 63) // 64)
+    masks = np.zeros((num_rows, num_words), dtype=np.uint64)
+    if len(ids):
+        rows = np.repeat(np.arange(num_rows), np.diff(offsets))
+        bits = np.left_shift(np.uint64(1), (ids % 64).astype(np.uint64))
+        np.bitwise_or.at(masks, (rows, ids // 64), bits)
+    return masks
+
+
+class SplitArrays:
+    """
+    Các mảng của một split:
+    - turns_per_dialogue: số turns mỗi dialogue
+    - dialogue_domains / domain_offsets: domain ids của từng dialogue (CSR)
+    - turn_slots / slot_offsets: slot ids trong belief state tích lũy của
+      từng turn (CSR, theo thứ tự gặp trong dữ liệu)
+    - domain_masks / slot_masks: bitmask uint64 theo dialogue / turn
+    Tên domain/slot ở self.domains / self.slots (index = id).
+    """
+    
+    def __init__(self, turns_per_dialogue, dialogue_domains, domain_offsets, domains,
+                 turn_slots, slot_offsets, slots):
+        self.turns_per_dialogue = np.asarray(turns_per_dialogue, dtype=np.int64)
+        self.dialogue_domains = np.asarray(dialogue_domains, dtype=np.int64)
+        self.domain_offsets = np.asarray(domain_offsets, dtype=np.int64)
+        self.domains: List[str] = list(domains)
+        self.turn_slots = np.asarray(turn_slots, dtype=np.int64)
+        self.slot_offsets = np.asarray(slot_offsets, dtype=np.int64)
+        self.slots: List[str] = list(slots)
+        
+        self.domain_masks = _bitmasks(self.dialogue_domains, self.domain_offsets, len(self.domains))
+        self.slot_masks = _bitmasks(self.turn_slots, self.slot_offsets, len(self.slots))
+    
+    @classmethod
+    def build(cls, data: Iterable[Dict]) -> 'SplitArrays':
+        """Dựng từ một split (list dialogues, hoặc ColumnarSplit)"""
+        if hasattr(data, 'arrays') and 'state_slots' in getattr(data, 'arrays', {}):
+            return cls.from_columnar(data)
+        
+        domain_ids: Dict[str, int] = {}
+        slot_ids: Dict[str, int] = {}
+        turns_per_dialogue = []
+        dialogue_domains = []
+        domain_offsets = [0]
+        turn_slots = []
+        slot_offsets = [0]
+        
+        for dialogue in data:
+            turns = dialogue['turns']
+            turns_per_dialogue.append(len(turns))
+            
+            for domain in dialogue.get('domains', []):
+                dialogue_domains.append(domain_ids.setdefault(domain, len(domain_ids)))
+            domain_offsets.append(len(dialogue_domains))
+            
+            for state in iter_belief_states(turns):
+                for slot in state:
+                    turn_slots.append(slot_ids.setdefault(slot, len(slot_ids)))
+                slot_offsets.append(len(turn_slots))
+        
+        return cls(turns_per_dialogue, dialogue_domains, domain_offsets, domain_ids,
+                   turn_slots, slot_offsets, slot_ids)
+    
+    @classmethod
+    def from_columnar(cls, split) -> 'SplitArrays':
+        """Dựng từ ColumnarSplit (dùng trực tiếp các mảng đã lưu)"""
+        arrays = split.arrays
+        return cls(
+            np.diff(arrays['dialogue_turn_offsets']),
+            arrays['dialogue_domains'], arrays['dialogue_domain_offsets'], split.domains,
+            arrays['state_slots'], arrays['state_offsets'], split.slots
+        )
+    
+    @property
+    def num_dialogues(self) -> int:
+        return len(self.turns_per_dialogue)
+    
+    @property
+    def num_turns(self) -> int:
+        return len(self.slot_offsets) - 1
+    
+    def domains_per_dialogue(self) -> np.ndarray:
+        return np.diff(self.domain_offsets)
+    
+    def slots_per_turn(self) -> np.ndarray:
+        return np.diff(self.slot_offsets)
+    
+    @staticmethod
+    def _counts_in_order(ids: np.ndarray, names: List[str]) -> List[tuple]:
+        """
+        [(name, count), ...] theo thứ tự xuất hiện đầu tiên trong ids
+        (giống thứ tự key của Counter khi đếm tuần tự)
+        """
+        if len(ids) == 0:
+            return []
+        counts = np.bincount(ids, minlength=len(names))
+        unique, first = np.unique(ids, return_index=True)
+        ordered = unique[np.argsort(first, kind='stable')]
+        return [(names[i], int(counts[i])) for i in ordered]
+    
+    def domain_counts(self) -> List[tuple]:
+        """[(domain, số dialogues), ...] theo thứ tự xuất hiện"""
+        return self._counts_in_order(self.dialogue_domains, self.domains)
+    
+    def slot_counts(self) -> List[tuple]:
+        """[(slot, số turns có slot trong state), ...] theo thứ tự xuất hiện"""
+        return self._counts_in_order(self.turn_slots, self.slots)
+    
+    @staticmethod
+    def _rows_with_all(masks: np.ndarray, names: List[str], wanted: List[str]) -> np.ndarray:
+        """Các hàng có đủ tất cả các bit ứng với wanted"""
+        name_index = {name: i for i, name in enumerate(names)}
+        query = np.zeros(masks.shape[1], dtype=np.uint64)
+        for name in wanted:
+            if name not in name_index:
+                return np.empty(0, dtype=np.int64)
+            i = name_index[name]
+            query[i // 64] |= np.uint64(1) << np.uint64(i % 64)
+        return np.flatnonzero(((masks & query) == query).all(axis=1))
+    
+    def turns_with_all_slots(self, slots: List[str]) -> np.ndarray:
+        """Các turn (đánh số toàn cục) có đủ tất cả các slot trong belief state"""
+        return self._rows_with_all(self.slot_masks, self.slots, slots)
+    
+    def dialogues_with_all_domains(self, domains: List[str]) -> np.ndarray:
+        """Các dialogue có đủ tất cả các domain"""
+        return self._rows_with_all(self.domain_masks, self.domains, domains)
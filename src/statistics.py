@@ -0,0 +1,169 @@
+"""
+Accumulators thống kê một lượt (one-pass) có thể merge
+cho các split MultiWOZ đã xử lý
+"""
+
+import math
+from collections import Counter
+from typing import Dict, Optional
+
+from src.belief_state import iter_belief_states
+
+
+class QuantileSketch:
+    """
+    Sketch xấp xỉ quantile có thể merge (kiểu DDSketch):
+    - giá trị nguyên trong [0, exact_limit] được đếm chính xác
+    - giá trị khác rơi vào bucket logarit với sai số tương đối relative_accuracy
+    Memory chỉ phụ thuộc số bucket khác nhau, không phụ thuộc số phần tử.
+    """
+    
+    def __init__(self, relative_accuracy: float = 0.01, exact_limit: int = 1024):
+        self.relative_accuracy = relative_accuracy
+        self.exact_limit = exact_limit
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        
+        self.exact = Counter()
+        self.buckets = Counter()
+        self.count = 0
+    
+    def add(self, value, count: int = 1):
+        """Thêm một giá trị (không âm)"""
+        if isinstance(value, int) and 0 <= value <= self.exact_limit:
+            self.exact[value] += count
+        else:
+            self.buckets[math.ceil(math.log(max(value, 1e-9)) / self.log_gamma)] += count
+        self.count += count
+    
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Gộp sketch khác vào sketch này"""
+        if other.relative_accuracy != self.relative_accuracy or other.exact_limit != self.exact_limit:
+            raise ValueError("Cannot merge sketches with different parameters")
+        self.exact.update(other.exact)
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        return self
+    
+    def _bucket_value(self, key: int) -> float:
+        # Giá trị đại diện của bucket (sai số tương đối <= relative_accuracy)
+        return 2 * self.gamma ** key / (self.gamma + 1)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Quantile q (0..1) theo nearest-rank, None nếu sketch rỗng"""
+        if self.count == 0:
+            return None
+        
+        rank = max(1, math.ceil(q * self.count))
+        items = list(self.exact.items())
+        items += [(self._bucket_value(key), count) for key, count in self.buckets.items()]
+        
+        seen = 0
+        for value, count in sorted(items):
+            seen += count
+            if seen >= rank:
+                break
+        return value
+    
+    def summary(self, quantiles=(0.5, 0.9, 0.99)) -> Dict[str, Optional[float]]:
+        """Dict dạng {'p50': ..., 'p90': ..., 'p99': ...}"""
+        return {f"p{round(q * 100):g}": self.quantile(q) for q in quantiles}
+
+
+class SplitStatistics:
+    """
+    Thống kê của một split, cập nhật từng dialogue một và merge được
+    (giữa các worker, các shard). to_dict() cho ra format của *_stats.json.
+    """
+    
+    SKETCHES = ['turns_per_dialogue', 'slots_per_turn',
+                'tokens_user_per_turn', 'tokens_system_per_turn']
+    
+    def __init__(self, split_name: str):
+        self.split = split_name
+        self.num_dialogues = 0
+        self.num_turns = 0
+        self.num_tokens_user = 0
+        self.num_tokens_system = 0
+        self.total_slots = 0
+        self.domain_counts = Counter()
+        self.slot_counts = Counter()
+        self.sketches = {name: QuantileSketch() for name in self.SKETCHES}
+    
+    def update(self, dialogue: Dict):
+        """Cộng dồn thống kê của một dialogue"""
+        sketches = self.sketches
+        turns = dialogue['turns']
+        
+        self.num_dialogues += 1
+        self.num_turns += len(turns)
+        self.domain_counts.update(dialogue['domains'])
+        sketches['turns_per_dialogue'].add(len(turns))
+        
+        for turn, belief_state in zip(turns, iter_belief_states(turns)):
+            # Count tokens
+            tokens_user = len(turn['utterance'].split())
+            tokens_system = len(turn['system_response'].split())
+            self.num_tokens_user += tokens_user
+            self.num_tokens_system += tokens_system
+            sketches['tokens_user_per_turn'].add(tokens_user)
+            sketches['tokens_system_per_turn'].add(tokens_system)
+            
+            # Count slots
+            self.total_slots += len(belief_state)
+            self.slot_counts.update(belief_state.keys())
+            sketches['slots_per_turn'].add(len(belief_state))
+    
+    def merge(self, other: 'SplitStatistics') -> 'SplitStatistics':
+        """
+        Gộp thống kê khác (cùng split) vào đây. Merge theo đúng thứ tự
+        dữ liệu thì kết quả giống hệt khi tính tuần tự.
+        """
+        self.num_dialogues += other.num_dialogues
+        self.num_turns += other.num_turns
+        self.num_tokens_user += other.num_tokens_user
+        self.num_tokens_system += other.num_tokens_system
+        self.total_slots += other.total_slots
+        self.domain_counts.update(other.domain_counts)
+        self.slot_counts.update(other.slot_counts)
+        for name, sketch in other.sketches.items():
+            self.sketches[name].merge(sketch)
+        return self
+    
+    def __add__(self, other: 'SplitStatistics') -> 'SplitStatistics':
+        result = SplitStatistics(self.split)
+        return result.merge(self).merge(other)
+    
+    def to_dict(self) -> Dict:
+        """Format lưu ra *_stats.json"""
+        stats = {
+            'split': self.split,
+            'num_dialogues': self.num_dialogues,
+            'num_turns': self.num_turns,
+            'num_tokens_user': self.num_tokens_user,
+            'num_tokens_system': self.num_tokens_system,
+            'domain_counts': dict(self.domain_counts),
+            'slot_counts': dict(self.slot_counts)
+        }
+        
+        # Calculate averages
+        if self.num_dialogues > 0:
+            stats['avg_turns_per_dialogue'] = self.num_turns / self.num_dialogues
+        else:
+            stats['avg_turns_per_dialogue'] = 0
+        
+        if self.num_turns > 0:
+            stats['avg_slots_per_turn'] = self.total_slots / self.num_turns
+            stats['avg_tokens_user'] = self.num_tokens_user / self.num_turns
+            stats['avg_tokens_system'] = self.num_tokens_system / self.num_turns
+        else:
+            stats['avg_slots_per_turn'] = 0
+            stats['avg_tokens_user'] = 0
+            stats['avg_tokens_system'] = 0
+        
+        # Quantiles (p50/p90/p99) từ sketches
+        stats['quantiles'] = {
+            name: sketch.summary() for name, sketch in self.sketches.items()
+        }
+        
+        return stats
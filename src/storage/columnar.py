@@ -0,0 +1,422 @@
+"""
+Columnar binary format cho các split đã xử lý
+
+Mỗi split được lưu trong một thư mục `<split>.columnar/`:
+- meta.json: số lượng, bảng slot/value/domain/speaker đã intern
+- strings.bin: UTF-8 arena chứa dialogue_id, utterance, system_response
+- *.npy: các mảng NumPy (offsets, ids), mở bằng mmap khi đọc
+"""
+
+import json
+import mmap
+import shutil
+from array import array
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.vocab import Vocab, value_key
+
+
+FORMAT_VERSION = 1
+
+# Tên mảng -> dtype
+ARRAY_DTYPES = {
+    'string_offsets': np.int64,
+    'dialogue_ids': np.int32,
+    'dialogue_turn_offsets': np.int64,
+    'dialogue_domain_offsets': np.int64,
+    'dialogue_domains': np.int16,
+    'turn_ids': np.int32,
+    'turn_speakers': np.int8,
+    'turn_utterances': np.int32,
+    'turn_system_responses': np.int32,
+    'state_offsets': np.int64,
+    'state_slots': np.int32,
+    'state_values': np.int32,
+    'delta_offsets': np.int64,
+    'delta_slots': np.int32,
+    'delta_values': np.int32,
+}
+
+# Typecode của array.array tương ứng (dùng khi build)
+_TYPECODES = {
+    np.int64: 'q',
+    np.int32: 'i',
+    np.int16: 'h',
+    np.int8: 'b',
+}
+
+
+class _Interner:
+    """Map giá trị -> id liên tục theo thứ tự xuất hiện"""
+    
+    def __init__(self, key=None):
+        self.ids = {}
+        self.items = []
+        self.key = key
+    
+    def intern(self, item) -> int:
+        key = self.key(item) if self.key else item
+        item_id = self.ids.get(key)
+        if item_id is None:
+            item_id = len(self.items)
+            self.ids[key] = item_id
+            self.items.append(item)
+        return item_id
+
+
+class _VocabTable:
+    """Interner dùng id của một Vocab dùng chung"""
+    
+    def __init__(self, add, items):
+        self.intern = add
+        self.items = items
+
+
+class ColumnarBuilder:
+    """
+    Xây dựng các mảng columnar từ các dialogue (dạng dict)
+    
+    Args:
+        vocab: Vocab dùng chung; nếu có, slot/value ids trong các mảng là id
+               của vocab, ngược lại mỗi split tự intern
+    """
+    
+    def __init__(self, vocab: Optional[Vocab] = None):
+        self.arrays = {
+            name: array(_TYPECODES[dtype]) for name, dtype in ARRAY_DTYPES.items()
+        }
+        self.arrays['string_offsets'].append(0)
+        self.arrays['dialogue_turn_offsets'].append(0)
+        self.arrays['dialogue_domain_offsets'].append(0)
+        self.arrays['state_offsets'].append(0)
+        self.arrays['delta_offsets'].append(0)
+        
+        self.arena = bytearray()
+        self.num_strings = 0
+        # Số phần tử / byte đã được ghi ra đĩa (ColumnarWriter), offsets tính cả phần này
+        self.flushed = dict.fromkeys(ARRAY_DTYPES, 0)
+        self.flushed_arena = 0
+        
+        if vocab is not None:
+            self.slots = _VocabTable(vocab.add_slot, vocab.slots)
+            self.values = _VocabTable(vocab.add_value, vocab.values)
+        else:
+            self.slots = _Interner()
+            self.values = _Interner(key=value_key)
+        self.domains = _Interner()
+        self.speakers = _Interner()
+        
+        self.count = 0
+    
+    def _add_string(self, text: str) -> int:
+        self.arena += text.encode('utf-8')
+        self.arrays['string_offsets'].append(self.flushed_arena + len(self.arena))
+        self.num_strings += 1
+        return self.num_strings - 1
+    
+    def _add_state(self, prefix: str, state: Dict):
+        slots = self.arrays[f'{prefix}_slots']
+        values = self.arrays[f'{prefix}_values']
+        for slot, value in state.items():
+            slots.append(self.slots.intern(slot))
+            values.append(self.values.intern(value))
+        self.arrays[f'{prefix}_offsets'].append(self.flushed[f'{prefix}_slots'] + len(slots))
+    
+    def write(self, dialogue: Dict):
+        """Thêm một dialogue"""
+        arrays = self.arrays
+        
+        arrays['dialogue_ids'].append(self._add_string(dialogue['dialogue_id']))
+        
+        for domain in dialogue.get('domains', []):
+            arrays['dialogue_domains'].append(self.domains.intern(domain))
+        arrays['dialogue_domain_offsets'].append(self.flushed['dialogue_domains'] + len(arrays['dialogue_domains']))
+        
+        for turn in dialogue['turns']:
+            arrays['turn_ids'].append(turn['turn_id'])
+            arrays['turn_speakers'].append(self.speakers.intern(turn.get('speaker', 'user')))
+            arrays['turn_utterances'].append(self._add_string(turn.get('utterance', '')))
+            arrays['turn_system_responses'].append(self._add_string(turn.get('system_response', '')))
+            self._add_state('state', turn.get('belief_state', {}))
+            self._add_state('delta', turn.get('belief_state_delta', {}))
+        arrays['dialogue_turn_offsets'].append(self.flushed['turn_ids'] + len(arrays['turn_ids']))
+        
+        self.count += 1
+    
+    def build_meta(self) -> Dict:
+        return {
+            'format_version': FORMAT_VERSION,
+            'num_dialogues': self.count,
+            'num_turns': self.flushed['turn_ids'] + len(self.arrays['turn_ids']),
+            'slots': list(self.slots.items),
+            'values': list(self.values.items),
+            'domains': self.domains.items,
+            'speakers': self.speakers.items
+        }
+    
+    def build_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            name: np.frombuffer(self.arrays[name], dtype=dtype)
+            for name, dtype in ARRAY_DTYPES.items()
+        }
+
+
+class ColumnarWriter(ColumnarBuilder):
+    """
+    Ghi một split ra thư mục columnar (cùng interface với JsonArrayWriter)
+    
+    Khi các mảng và arena trong memory vượt flush_bytes, chúng được ghi nối
+    vào strings.bin và các file tạm <tên mảng>.part, nên memory không phụ
+    thuộc kích thước split (preprocess --stream). close() ghép .part thành .npy.
+    """
+    
+    def __init__(self, path, vocab: Optional[Vocab] = None, flush_bytes: int = 64 << 20):
+        super().__init__(vocab)
+        self.path = Path(path)
+        self.flush_bytes = flush_bytes
+        
+        # meta.json cũ bị xóa trước: thư mục chỉ hợp lệ lại khi close() xong
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_file = self.path / "meta.json"
+        if meta_file.exists():
+            meta_file.unlink()
+        self.strings_file = open(self.path / "strings.bin", 'wb')
+        self.part_files = {name: open(self.path / f"{name}.part", 'wb') for name in ARRAY_DTYPES}
+    
+    def write(self, dialogue: Dict):
+        super().write(dialogue)
+        size = len(self.arena) + sum(len(values) * values.itemsize for values in self.arrays.values())
+        if size >= self.flush_bytes:
+            self.flush()
+    
+    def flush(self):
+        """Ghi nối arena và các mảng đang giữ ra đĩa rồi làm rỗng"""
+        self.strings_file.write(self.arena)
+        self.flushed_arena += len(self.arena)
+        self.arena = bytearray()
+        for name, values in self.arrays.items():
+            values.tofile(self.part_files[name])
+            self.flushed[name] += len(values)
+            self.arrays[name] = array(values.typecode)
+    
+    def close(self):
+        """Ghi phần còn lại, ghép các mảng thành .npy và ghi meta"""
+        self.flush()
+        self.strings_file.close()
+        
+        for name, dtype in ARRAY_DTYPES.items():
+            self.part_files[name].close()
+            part_path = self.path / f"{name}.part"
+            # Header giống np.save rồi chép nguyên dữ liệu thô (không load cả mảng)
+            header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                      'fortran_order': False, 'shape': (self.flushed[name],)}
+            with open(self.path / f"{name}.npy", 'wb') as f, open(part_path, 'rb') as part:
+                np.lib.format.write_array_header_1_0(f, header)
+                shutil.copyfileobj(part, f)
+            part_path.unlink()
+        
+        # meta.json ghi cuối cùng: thư mục chỉ hợp lệ khi có meta
+        with open(self.path / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump(self.build_meta(), f, ensure_ascii=False)
+
+
+class ColumnarTurn(Mapping):
+    """View lazy của một turn, truy cập như dict"""
+    
+    __slots__ = ('_split', '_index')
+    
+    _KEYS = ('turn_id', 'speaker', 'utterance', 'belief_state',
+             'belief_state_delta', 'system_response')
+    
+    def __init__(self, split: 'ColumnarSplit', index: int):
+        self._split = split
+        self._index = index
+    
+    def __getitem__(self, key):
+        split = self._split
+        i = self._index
+        if key == 'turn_id':
+            return int(split.arrays['turn_ids'][i])
+        if key == 'speaker':
+            return split.speakers[split.arrays['turn_speakers'][i]]
+        if key == 'utterance':
+            return split.get_string(split.arrays['turn_utterances'][i])
+        if key == 'system_response':
+            return split.get_string(split.arrays['turn_system_responses'][i])
+        if key == 'belief_state':
+            return split.get_state('state', i)
+        if key == 'belief_state_delta':
+            return split.get_state('delta', i)
+        raise KeyError(key)
+    
+    def __iter__(self):
+        return iter(self._KEYS)
+    
+    def __len__(self):
+        return len(self._KEYS)
+    
+    def __repr__(self):
+        return f"ColumnarTurn({dict(self)!r})"
+
+
+class ColumnarTurns(Sequence):
+    """Danh sách turns (lazy) của một dialogue"""
+    
+    __slots__ = ('_split', '_start', '_stop')
+    
+    def __init__(self, split: 'ColumnarSplit', start: int, stop: int):
+        self._split = split
+        self._start = start
+        self._stop = stop
+    
+    def __len__(self):
+        return self._stop - self._start
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return ColumnarTurn(self._split, self._start + index)
+
+
+class ColumnarDialogue(Mapping):
+    """View lazy của một dialogue, truy cập như dict"""
+    
+    __slots__ = ('_split', '_index')
+    
+    _KEYS = ('dialogue_id', 'domains', 'turns')
+    
+    def __init__(self, split: 'ColumnarSplit', index: int):
+        self._split = split
+        self._index = index
+    
+    def __getitem__(self, key):
+        split = self._split
+        i = self._index
+        if key == 'dialogue_id':
+            return split.get_dialogue_id(i)
+        if key == 'domains':
+            offsets = split.arrays['dialogue_domain_offsets']
+            domain_ids = split.arrays['dialogue_domains'][offsets[i]:offsets[i + 1]]
+            return [split.domains[d] for d in domain_ids]
+        if key == 'turns':
+            offsets = split.arrays['dialogue_turn_offsets']
+            return ColumnarTurns(split, int(offsets[i]), int(offsets[i + 1]))
+        raise KeyError(key)
+    
+    def __iter__(self):
+        return iter(self._KEYS)
+    
+    def __len__(self):
+        return len(self._KEYS)
+    
+    def __repr__(self):
+        return f"ColumnarDialogue({self.get_dialogue_id()!r})"
+    
+    def get_dialogue_id(self) -> str:
+        return self._split.get_dialogue_id(self._index)
+
+
+class ColumnarSplit(Sequence):
+    """
+    Một split ở dạng columnar, truy cập như list các dialogue.
+    Dialogue/turn chỉ được decode khi truy cập.
+    """
+    
+    def __init__(self, meta: Dict, arrays: Dict[str, np.ndarray], arena):
+        self.meta = meta
+        self.arrays = arrays
+        self.arena = arena
+        self.slots = meta['slots']
+        self.values = meta['values']
+        self.domains = meta['domains']
+        self.speakers = meta['speakers']
+        self._index = None
+    
+    @classmethod
+    def open(cls, path) -> 'ColumnarSplit':
+        """Mở thư mục columnar bằng mmap (không đọc dữ liệu vào memory)"""
+        path = Path(path)
+        meta_file = path / "meta.json"
+        if not meta_file.exists():
+            raise FileNotFoundError(f"File not found: {meta_file}")
+        
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version: {meta.get('format_version')}")
+        
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode='r')
+            for name in ARRAY_DTYPES
+        }
+        
+        arena = b''
+        strings_file = path / "strings.bin"
+        if strings_file.stat().st_size > 0:
+            with open(strings_file, 'rb') as f:
+                arena = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        return cls(meta, arrays, arena)
+    
+    def __len__(self):
+        return self.meta['num_dialogues']
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return ColumnarDialogue(self, index)
+    
+    def __iter__(self) -> Iterator[ColumnarDialogue]:
+        for i in range(len(self)):
+            yield ColumnarDialogue(self, i)
+    
+    def get_string(self, string_id: int) -> str:
+        offsets = self.arrays['string_offsets']
+        return bytes(self.arena[offsets[string_id]:offsets[string_id + 1]]).decode('utf-8')
+    
+    def get_dialogue_id(self, index: int) -> str:
+        return self.get_string(self.arrays['dialogue_ids'][index])
+    
+    def get_state(self, prefix: str, turn_index: int) -> Dict:
+        offsets = self.arrays[f'{prefix}_offsets']
+        start, stop = offsets[turn_index], offsets[turn_index + 1]
+        slots = self.arrays[f'{prefix}_slots'][start:stop]
+        values = self.arrays[f'{prefix}_values'][start:stop]
+        return {self.slots[s]: self.values[v] for s, v in zip(slots, values)}
+    
+    def dialogue_ids(self) -> List[str]:
+        """Danh sách dialogue_id theo thứ tự trong split"""
+        return [self.get_dialogue_id(i) for i in range(len(self))]
+    
+    def find(self, dialogue_id: str) -> Optional[ColumnarDialogue]:
+        """Tìm dialogue theo ID (index dialogue_id -> vị trí dựng ở lần gọi đầu)"""
+        if self._index is None:
+            self._index = {}
+            for i, item in enumerate(self.dialogue_ids()):
+                self._index.setdefault(item, i)
+        
+        i = self._index.get(dialogue_id)
+        if i is None:
+            return None
+        return ColumnarDialogue(self, i)
+
+
+def write_columnar(dialogues, path) -> int:
+    """Ghi một danh sách dialogues ra thư mục columnar, trả về số dialogues"""
+    writer = ColumnarWriter(path)
+    for dialogue in dialogues:
+        writer.write(dialogue)
+    writer.close()
+    return writer.count
@@ -0,0 +1,197 @@
+"""
+Sharded JSON Lines format cho các split đã xử lý
+
+Mỗi split được lưu trong một thư mục `<split>.shards/`:
+- shard-00000.jsonl ... : mỗi dòng một dialogue, chia round-robin vào N shards
+- index.json: dialogue_id -> [shard, byte offset, length] theo thứ tự gốc
+
+Khi bật gzip, mỗi dòng được nén thành một gzip member riêng. File shard
+vẫn là file gzip hợp lệ (đọc tuần tự bằng gzip.open) và offset/length trỏ
+tới đúng member của dialogue nên vẫn đọc được bằng một lần seek.
+"""
+
+import gzip
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+INDEX_FILE = "index.json"
+
+
+def shard_filename(shard: int, compress: bool = False) -> str:
+    """Tên file của một shard"""
+    suffix = ".jsonl.gz" if compress else ".jsonl"
+    return f"shard-{shard:05d}{suffix}"
+
+
+class ShardedJsonlWriter:
+    """Ghi một split ra các shard JSONL kèm index (cùng interface với JsonArrayWriter)"""
+    
+    def __init__(self, path, num_shards: int = 8, compress: bool = False):
+        if num_shards < 1:
+            raise ValueError(f"num_shards must be >= 1, got {num_shards}")
+        
+        self.path = Path(path)
+        self.num_shards = num_shards
+        self.compress = compress
+        self.count = 0
+        self.index = {}
+        
+        # Xóa shards cũ (số shard có thể khác lần ghi trước)
+        self.path.mkdir(parents=True, exist_ok=True)
+        for old_file in self.path.glob("shard-*.jsonl*"):
+            old_file.unlink()
+        index_file = self.path / INDEX_FILE
+        if index_file.exists():
+            index_file.unlink()
+        
+        self.files = [
+            open(self.path / shard_filename(shard, compress), 'wb')
+            for shard in range(num_shards)
+        ]
+        self.offsets = [0] * num_shards
+    
+    def write(self, dialogue: Dict):
+        """Ghi một dialogue vào shard kế tiếp (round-robin)"""
+        dialogue_id = dialogue['dialogue_id']
+        if dialogue_id in self.index:
+            # index.json chỉ giữ được một vị trí cho mỗi dialogue_id
+            raise ValueError(f"Duplicate dialogue_id: {dialogue_id}")
+        
+        shard = self.count % self.num_shards
+        data = (json.dumps(dialogue, ensure_ascii=False) + '\n').encode('utf-8')
+        if self.compress:
+            data = gzip.compress(data, mtime=0)
+        
+        self.files[shard].write(data)
+        self.index[dialogue_id] = [shard, self.offsets[shard], len(data)]
+        self.offsets[shard] += len(data)
+        self.count += 1
+    
+    def close(self):
+        """Đóng các shard và ghi index"""
+        for f in self.files:
+            f.close()
+        
+        index = {
+            'num_shards': self.num_shards,
+            'compress': self.compress,
+            'num_dialogues': self.count,
+            'dialogues': self.index
+        }
+        with open(self.path / INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+
+
+class ShardedJsonlSplit:
+    """
+    Đọc một split dạng sharded JSONL.
+    
+    - find(dialogue_id): đọc đúng một dialogue bằng một lần seek
+    - iter(split): stream theo thứ tự gốc (giống split[i]), đọc tuần tự song
+      song các shard, không load toàn bộ split
+    - iter_shards(): stream từng shard một (thứ tự khác thứ tự gốc)
+    - split[i]: dialogue thứ i theo thứ tự gốc (qua index)
+    
+    find / split[i] giữ file handle của các shard đã đọc cho các lần seek sau;
+    đóng bằng close() hoặc dùng `with ShardedJsonlSplit(path) as split:`
+    
+    Args:
+        path: Thư mục <split>.shards
+        transform: Hàm áp dụng cho mỗi dialogue sau khi parse (tùy chọn)
+    """
+    
+    def __init__(self, path, transform: Optional[Callable[[Dict], Dict]] = None):
+        self.path = Path(path)
+        self.transform = transform
+        index_file = self.path / INDEX_FILE
+        if not index_file.exists():
+            raise FileNotFoundError(f"File not found: {index_file}")
+        
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        
+        self.num_shards = index['num_shards']
+        self.compress = index['compress']
+        self.index = index['dialogues']
+        self.order = list(self.index)
+        self._handles = {}
+    
+    def __len__(self):
+        return len(self.order)
+    
+    def __contains__(self, dialogue_id):
+        return dialogue_id in self.index
+    
+    def __iter__(self) -> Iterator[Dict]:
+        # Trong mỗi shard, dialogue nằm theo thứ tự gốc: dialogue kế tiếp của
+        # thứ tự gốc luôn là dòng kế tiếp của shard chứa nó
+        shards = [self.iter_shard(shard) for shard in range(self.num_shards)]
+        try:
+            for dialogue_id in self.order:
+                yield next(shards[self.index[dialogue_id][0]])
+        finally:
+            for shard in shards:
+                shard.close()
+    
+    def iter_shards(self) -> Iterator[Dict]:
+        """Stream lần lượt từng shard (mỗi lúc chỉ mở một file)"""
+        for shard in range(self.num_shards):
+            yield from self.iter_shard(shard)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.find(dialogue_id) for dialogue_id in self.order[index]]
+        return self.find(self.order[index])
+    
+    def shard_path(self, shard: int) -> Path:
+        return self.path / shard_filename(shard, self.compress)
+    
+    def iter_shard(self, shard: int) -> Iterator[Dict]:
+        """Stream các dialogue của một shard"""
+        opener = gzip.open if self.compress else open
+        with opener(self.shard_path(shard), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield self._parse(line)
+    
+    def find(self, dialogue_id: str) -> Optional[Dict]:
+        """Đọc một dialogue theo ID bằng một lần seek"""
+        location = self.index.get(dialogue_id)
+        if location is None:
+            return None
+        
+        shard, offset, length = location
+        handle = self._handles.get(shard)
+        if handle is None:
+            handle = open(self.shard_path(shard), 'rb')
+            self._handles[shard] = handle
+        
+        handle.seek(offset)
+        data = handle.read(length)
+        if self.compress:
+            data = gzip.decompress(data)
+        return self._parse(data)
+    
+    def _parse(self, data) -> Dict:
+        dialogue = json.loads(data)
+        if self.transform is not None:
+            dialogue = self.transform(dialogue)
+        return dialogue
+    
+    def dialogue_ids(self) -> List[str]:
+        """Danh sách dialogue_id theo thứ tự gốc"""
+        return list(self.order)
+    
+    def close(self):
+        """Đóng các file handle đang mở"""
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = {}
+    
+    def __enter__(self) -> 'ShardedJsonlSplit':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
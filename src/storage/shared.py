@@ -0,0 +1,179 @@
+"""
+Chia sẻ một split giữa nhiều process qua multiprocessing.shared_memory
+
+Process chính publish split một lần thành một khối shared memory chứa các
+mảng columnar (xem src.storage.columnar) và string arena. Worker attach bằng
+handle (dict nhỏ, pickle được) và nhận một ColumnarSplit mà các mảng là view
+zero-copy trên khối đó, nên N worker chỉ tốn khoảng một bản dữ liệu.
+
+    with loader.share_split('test') as shared:
+        with Pool(8, initializer=init_worker, initargs=(shared.handle,)) as pool:
+            ...
+    # trong worker: split = attach_split(handle)
+"""
+
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from src.belief_state import iter_belief_states
+from src.storage.columnar import ARRAY_DTYPES, ColumnarBuilder, ColumnarSplit
+
+
+# Căn lề offset của từng mảng trong khối shared memory
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _with_full_states(dialogue: Dict) -> Dict:
+    """Dialogue có belief_state đầy đủ ở mọi turn (dựng lại nếu là delta-only)"""
+    turns = dialogue['turns']
+    return {
+        'dialogue_id': dialogue['dialogue_id'],
+        'domains': list(dialogue.get('domains', [])),
+        'turns': [
+            dict(turn, belief_state=state)
+            for turn, state in zip(turns, iter_belief_states(turns))
+        ]
+    }
+
+
+def _columnar_parts(data: Iterable[Dict]):
+    """(meta, arrays, arena) của split; ColumnarSplit thì dùng thẳng các mảng"""
+    if isinstance(data, ColumnarSplit):
+        return data.meta, data.arrays, data.arena
+    
+    builder = ColumnarBuilder()
+    for dialogue in data:
+        builder.write(_with_full_states(dialogue))
+    return builder.build_meta(), builder.build_arrays(), builder.arena
+
+
+def _open_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach vào khối shared memory mà không đăng ký với resource tracker
+    (nếu không, process attach sẽ unlink khối khi thoát)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 chưa có tham số track
+        pass
+    
+    from multiprocessing import resource_tracker
+    
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _views(shm: shared_memory.SharedMemory, handle: Dict) -> ColumnarSplit:
+    arrays = {}
+    for name, (offset, length) in handle['arrays'].items():
+        array = np.ndarray((length,), dtype=ARRAY_DTYPES[name], buffer=shm.buf, offset=offset)
+        array.flags.writeable = False
+        arrays[name] = array
+    
+    offset, size = handle['arena']
+    arena = shm.buf[offset:offset + size].toreadonly()
+    
+    split = ColumnarSplit(handle['meta'], arrays, arena)
+    # Giữ tham chiếu để khối không bị đóng khi split còn được dùng
+    split.shared_memory = shm
+    return split
+
+
+class SharedSplit:
+    """
+    Một split đã publish vào shared memory (phía process chính)
+    
+    - handle: truyền cho worker (vd. qua initargs của Pool) để attach_split()
+    - split: ColumnarSplit trên chính khối shared memory
+    - close(): giải phóng khối (unlink), gọi khi các worker đã xong
+    """
+    
+    def __init__(self, shm: shared_memory.SharedMemory, handle: Dict):
+        self.shm = shm
+        self.handle = handle
+        self.split: Optional[ColumnarSplit] = _views(shm, handle)
+    
+    @classmethod
+    def publish(cls, data: Iterable[Dict]) -> 'SharedSplit':
+        """Copy split (list dialogues, ColumnarSplit, ...) vào một khối shared memory mới"""
+        meta, arrays, arena = _columnar_parts(data)
+        
+        layout = {}
+        offset = 0
+        for name in ARRAY_DTYPES:
+            array = np.ascontiguousarray(arrays[name], dtype=ARRAY_DTYPES[name])
+            offset = _align(offset)
+            layout[name] = (offset, len(array))
+            offset += array.nbytes
+        arena_offset = _align(offset)
+        total = arena_offset + len(arena)
+        
+        shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        try:
+            for name, (start, length) in layout.items():
+                target = np.ndarray((length,), dtype=ARRAY_DTYPES[name], buffer=shm.buf, offset=start)
+                target[:] = arrays[name]
+                del target
+            shm.buf[arena_offset:total] = arena
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        
+        handle = {
+            'name': shm.name,
+            'size': total,
+            'arrays': layout,
+            'arena': (arena_offset, len(arena)),
+            'meta': meta
+        }
+        return cls(shm, handle)
+    
+    @property
+    def nbytes(self) -> int:
+        return self.handle['size']
+    
+    def close(self):
+        """Đóng và unlink khối shared memory (split không dùng được nữa)"""
+        if self.shm is None:
+            return
+        split, self.split = self.split, None
+        if split is not None:
+            _release(split)
+        self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Còn mảng view bên ngoài: vùng nhớ được giải phóng khi các view bị thu hồi
+            pass
+        self.shm = None
+    
+    def __enter__(self) -> 'SharedSplit':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _release(split: ColumnarSplit):
+    """Bỏ các view trên shared memory để khối có thể được đóng"""
+    split.arrays = {}
+    arena, split.arena = split.arena, b''
+    if isinstance(arena, memoryview):
+        arena.release()
+
+
+def attach_split(handle: Dict) -> ColumnarSplit:
+    """Phía worker: ColumnarSplit zero-copy trên khối shared memory của handle"""
+    return _views(_open_shared_memory(handle['name']), handle)
@@ -0,0 +1,104 @@
+"""
+Snapshot nhị phân (pickle) của dữ liệu đã load, dùng để khởi động nhanh
+
+File snapshot gồm hai pickle liên tiếp:
+- header: version, options của loader và chữ ký các file nguồn
+  (size, mtime_ns, sha1)
+- payload: dữ liệu đã load
+
+Snapshot hợp lệ khi options giống nhau và mọi file nguồn có cùng size và
+mtime; nếu chỉ mtime khác (file bị touch/copy lại) thì so sánh sha1.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+SNAPSHOT_VERSION = 2
+
+
+def file_sha1(path, chunk_size: int = 1 << 20) -> str:
+    """sha1 nội dung file"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_signature(path, with_hash: bool = True) -> Optional[List]:
+    """[size, mtime_ns, sha1] của file, None nếu file không tồn tại"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns, file_sha1(path) if with_hash else None]
+
+
+def source_signatures(sources: List[Path]) -> Dict[str, Optional[List]]:
+    """
+    Chữ ký các file nguồn. Nên tính trước khi đọc các file này: nếu file
+    bị sửa trong lúc đọc thì snapshot sẽ bị coi là cũ ở lần load sau.
+    """
+    return {source.name: file_signature(source) for source in sources}
+
+
+def _is_fresh(path, signature: Optional[List]) -> bool:
+    current = file_signature(path, with_hash=False)
+    if current is None or signature is None:
+        return current is None and signature is None
+    if current[0] != signature[0]:
+        return False
+    if current[1] == signature[1]:
+        return True
+    return file_sha1(path) == signature[2]
+
+
+def load_snapshot(snapshot_path, sources: List[Path], options: Dict) -> Optional[Any]:
+    """Payload của snapshot nếu còn hợp lệ với các file nguồn, ngược lại None"""
+    snapshot_path = Path(snapshot_path)
+    if not snapshot_path.exists():
+        return None
+    
+    try:
+        with open(snapshot_path, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('version') != SNAPSHOT_VERSION or header.get('options') != options:
+                return None
+            
+            signatures = header.get('files', {})
+            if set(signatures) != {source.name for source in sources}:
+                return None
+            if not all(_is_fresh(source, signatures[source.name]) for source in sources):
+                return None
+            
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        # Snapshot hỏng hoặc tạo bởi phiên bản code khác: bỏ qua, load lại từ nguồn
+        return None
+
+
+def save_snapshot(snapshot_path, signatures: Dict[str, Optional[List]], options: Dict, payload: Any):
+    """
+    Ghi snapshot (ghi ra file tạm rồi rename để không để lại file dở dang)
+    
+    Args:
+        signatures: Kết quả của source_signatures() (tính trước khi đọc nguồn)
+    """
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    header = {
+        'version': SNAPSHOT_VERSION,
+        'options': options,
+        'files': signatures
+    }
+    
+    tmp_path = snapshot_path.with_name(snapshot_path.name + f".{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
@@ -0,0 +1,241 @@
+"""
+Export một split thành các mảng sẵn sàng cho model (.npz hoặc .npy mmap)
+
+Dialogues được chia bucket theo số turns (và sort trong bucket) để giảm
+padding. Mỗi bucket k gồm các mảng:
+- dialogue_index: (n,) vị trí dialogue trong split
+- turn_mask: (n, T) bool, True ở các turn có thật
+- user_tokens / system_tokens: (n, T, L) token ids (0 = padding)
+- state / delta: (n, T, S) value id của từng slot (cột = vocab.slots, 0 = không có)
+
+Val/test dùng lại vocab slot/value và TokenVocab của train ở dạng cố định:
+token / value chưa có -> UNK_ID / UNK_VALUE_ID, slot chưa có bị bỏ qua, nên
+cột và value id giống hệt train.
+
+format='npz': một file <path>.npz với key 'b{k}/<tên mảng>'
+format='npy': thư mục <path>/ với các file 'b{k}.<tên mảng>.npy' (mở bằng mmap)
+Kèm meta.json (bucket, số slot), tokens.json và vocab.json để decode lại.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.belief_state import iter_belief_states
+from src.vocab import Vocab, value_key
+
+
+PAD_ID = 0
+UNK_ID = 1
+# Value chưa có trong vocab cố định (value id hợp lệ luôn >= 0)
+UNK_VALUE_ID = -1
+
+DEFAULT_BUCKETS = (4, 8, 12, 16, 24)
+
+TENSOR_FORMATS = ['npz', 'npy']
+
+
+class TokenVocab:
+    """Token <-> id cho utterances (0 = <pad>, 1 = <unk>)"""
+    
+    def __init__(self, tokens: Iterable[str] = ()):
+        self.tokens: List[str] = ['<pad>', '<unk>']
+        self.token_to_id: Dict[str, int] = {'<pad>': PAD_ID, '<unk>': UNK_ID}
+        for token in tokens:
+            self.add(token)
+    
+    def __len__(self):
+        return len(self.tokens)
+    
+    def add(self, token: str) -> int:
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.token_to_id[token] = token_id
+            self.tokens.append(token)
+        return token_id
+    
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Tách token theo khoảng trắng (giống cách đếm token trong statistics)"""
+        return text.split()
+    
+    def encode(self, text: str, add: bool = False, max_tokens: Optional[int] = None) -> List[int]:
+        tokens = self.tokenize(text)
+        if max_tokens is not None:
+            tokens = tokens[:max_tokens]
+        if add:
+            return [self.add(token) for token in tokens]
+        return [self.token_to_id.get(token, UNK_ID) for token in tokens]
+    
+    def decode(self, ids: Iterable[int]) -> str:
+        return ' '.join(self.tokens[i] for i in ids if i != PAD_ID)
+    
+    @classmethod
+    def load(cls, path) -> 'TokenVocab':
+        with open(path, 'r', encoding='utf-8') as f:
+            tokens = json.load(f)
+        return cls(tokens[2:])
+    
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.tokens, f, ensure_ascii=False)
+
+
+def _bucket_of(num_turns: int, boundaries: Sequence[int]) -> int:
+    for k, boundary in enumerate(boundaries):
+        if num_turns <= boundary:
+            return k
+    return len(boundaries)
+
+
+def encode_state(vocab: Vocab, state: Dict, add: bool = True) -> List[Tuple[int, int]]:
+    """
+    Belief state -> [(slot_id, value_id), ...]. add=False: vocab cố định,
+    slot chưa có bị bỏ qua, value chưa có -> UNK_VALUE_ID
+    """
+    if add:
+        return vocab.encode_pairs(state, add=True)
+    pairs = []
+    for slot, value in state.items():
+        slot_id = vocab.slot_to_id.get(slot)
+        if slot_id is None:
+            continue
+        if value is None:
+            value_id = Vocab.NONE_ID
+        else:
+            value_id = vocab.value_to_id.get(value_key(value), UNK_VALUE_ID)
+        pairs.append((slot_id, value_id))
+    return pairs
+
+
+def build_tensors(data: Iterable[Dict], vocab: Vocab, token_vocab: TokenVocab,
+                  buckets: Sequence[int] = DEFAULT_BUCKETS, add_tokens: bool = True,
+                  max_tokens: Optional[int] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Encode và pad một split theo bucket
+    
+    Args:
+        vocab: Vocab slot/value (add_tokens=True: slot / value mới được thêm vào,
+               False: vocab cố định, xem encode_state)
+        token_vocab: Vocab token (add_tokens=False: token lạ -> <unk>, dùng cho val/test)
+        buckets: Cận trên số turns của từng bucket (dialogue dài hơn vào bucket cuối)
+        max_tokens: Cắt utterance dài hơn max_tokens token
+    
+    Returns:
+        {'b{k}': {tên mảng: mảng}}
+    """
+    encoded = {}
+    for position, dialogue in enumerate(data):
+        turns = dialogue['turns']
+        rows = []
+        for turn, state in zip(turns, iter_belief_states(turns)):
+            rows.append((
+                token_vocab.encode(turn.get('utterance', ''), add_tokens, max_tokens),
+                token_vocab.encode(turn.get('system_response', ''), add_tokens, max_tokens),
+                encode_state(vocab, state, add_tokens),
+                encode_state(vocab, turn.get('belief_state_delta', {}), add_tokens)
+            ))
+        encoded.setdefault(_bucket_of(len(rows), buckets), []).append((position, rows))
+    
+    num_slots = vocab.num_slots
+    tensors = {}
+    for k in sorted(encoded):
+        # Sort theo (số turns, utterance dài nhất): các batch cắt liên tiếp
+        # trong bucket có độ dài gần nhau, cắt bớt padding được
+        items = sorted(encoded[k], key=lambda item: (
+            len(item[1]), max([0] + [len(row[0]) for row in item[1]])))
+        n = len(items)
+        max_turns = max(1, max(len(rows) for _, rows in items))
+        max_user = max([1] + [len(row[0]) for _, rows in items for row in rows])
+        max_system = max([1] + [len(row[1]) for _, rows in items for row in rows])
+        
+        arrays = {
+            'dialogue_index': np.array([position for position, _ in items], dtype=np.int32),
+            'turn_mask': np.zeros((n, max_turns), dtype=bool),
+            'user_tokens': np.full((n, max_turns, max_user), PAD_ID, dtype=np.int32),
+            'system_tokens': np.full((n, max_turns, max_system), PAD_ID, dtype=np.int32),
+            'state': np.full((n, max_turns, num_slots), Vocab.NONE_ID, dtype=np.int32),
+            'delta': np.full((n, max_turns, num_slots), Vocab.NONE_ID, dtype=np.int32),
+        }
+        for i, (_, rows) in enumerate(items):
+            arrays['turn_mask'][i, :len(rows)] = True
+            for t, (user, system, state, delta) in enumerate(rows):
+                arrays['user_tokens'][i, t, :len(user)] = user
+                arrays['system_tokens'][i, t, :len(system)] = system
+                for slot_id, value_id in state:
+                    arrays['state'][i, t, slot_id] = value_id
+                for slot_id, value_id in delta:
+                    arrays['delta'][i, t, slot_id] = value_id
+        tensors[f"b{k}"] = arrays
+    return tensors
+
+
+def save_tensors(tensors: Dict[str, Dict[str, np.ndarray]], path, vocab: Vocab,
+                 token_vocab: TokenVocab, buckets: Sequence[int], format: str = 'npz') -> Path:
+    """Ghi tensors ra .npz hoặc thư mục .npy, kèm meta/tokens/vocab. Trả về path đã ghi"""
+    if format not in TENSOR_FORMATS:
+        raise ValueError(f"Unknown tensor format: {format}")
+    
+    path = Path(path)
+    if format == 'npz':
+        path = path.with_suffix('.npz')
+        meta_dir = path.parent
+        prefix = path.stem + '.'
+    else:
+        meta_dir = path
+        prefix = ''
+    meta_dir.mkdir(parents=True, exist_ok=True)
+    
+    if format == 'npz':
+        np.savez(path, **{
+            f"{bucket}/{name}": array
+            for bucket, arrays in tensors.items() for name, array in arrays.items()
+        })
+    else:
+        for bucket, arrays in tensors.items():
+            for name, array in arrays.items():
+                np.save(path / f"{bucket}.{name}.npy", array)
+    
+    meta = {
+        'format': format,
+        'buckets': list(buckets),
+        'bucket_names': list(tensors),
+        'num_slots': vocab.num_slots,
+        'num_tokens': len(token_vocab),
+        'num_dialogues': sum(len(arrays['dialogue_index']) for arrays in tensors.values()),
+        'pad_id': PAD_ID,
+        'unk_id': UNK_ID,
+        'unk_value_id': UNK_VALUE_ID
+    }
+    with open(meta_dir / f"{prefix}meta.json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    token_vocab.save(meta_dir / f"{prefix}tokens.json")
+    vocab.save(meta_dir / f"{prefix}vocab.json")
+    return path
+
+
+def load_tensors(path, mmap: bool = True) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Đọc lại tensors. Với format npy các mảng được mở bằng mmap (mmap=True),
+    với npz các mảng được đọc khi truy cập.
+    """
+    path = Path(path)
+    if path.is_dir():
+        with open(path / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        tensors = {bucket: {} for bucket in meta['bucket_names']}
+        for file in path.glob("b*.*.npy"):
+            bucket, name = file.name[:-len('.npy')].split('.', 1)
+            tensors[bucket][name] = np.load(file, mmap_mode=mmap_mode)
+        return tensors
+    
+    npz = np.load(path.with_suffix('.npz'))
+    tensors = {}
+    for key in npz.files:
+        bucket, name = key.split('/', 1)
+        tensors.setdefault(bucket, {})[name] = npz[key]
+    return tensors
@@ -4,15 +4,52 @@ Utility functions cho MultiWOZ 2.4 dataset
 
 import json
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from collections import Counter
+from typing import Dict, List, Any, Optional, Iterable, Iterator
+import numpy as np
+
+from src.belief_state import REMOVED_KEY, RESTORED_KEY, BeliefStates, iter_belief_states
+from src.records import Dialogue
+from src.split_arrays import SplitArrays
 
 
 class DataLoader:
     """Load và truy xuất dữ liệu MultiWOZ"""
     
-    def __init__(self, data_dir: str = "data/processed"):
+    # json: <split>.json, columnar: <split>.columnar/ (mmap, decode lazy),
+    # jsonl: <split>.shards/ (sharded JSON Lines, đọc theo index)
+    BACKENDS = ['json', 'columnar', 'jsonl']
+    
+    # Các key chứa belief state (có thể được lưu dạng [[slot_id, value_id], ...])
+    STATE_KEYS = ['belief_state', 'belief_state_delta', RESTORED_KEY]
+    
+    def __init__(self, data_dir: str = "data/processed", backend: str = 'json',
+                 ids: bool = False, records: bool = False):
+        """
+        Args:
+            data_dir: Thư mục dữ liệu đã xử lý
+            backend: Format lưu trữ (json/columnar/jsonl)
+            ids: True thì belief state trả về dạng {slot_id: value_id} theo
+                 self.vocab, False (mặc định) thì dạng {slot: value}
+            records: True thì trả về Dialogue/Turn (src.records, dùng __slots__,
+                     belief state bất biến) thay cho dict, vẫn truy cập như dict
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if ids and backend == 'columnar':
+            raise ValueError("ids=True is not supported with the columnar backend")
+        if records and backend == 'columnar':
+            raise ValueError("records=True is not supported with the columnar backend")
+        
         self.data_dir = Path(data_dir)
+        self.backend = backend
+        self.ids = ids
+        self.records = records
+        self._vocab = None
+        # split -> (data đã index, số dialogues lúc index, {dialogue_id: position}), dựng lazy
+        self._indexes = {}
+        self._inverted_indexes = {}
+        self._ontology_index = None
+        self._split_arrays = {}
         self.train_data = None
         self.val_data = None
         self.test_data = None
@@ -21,6 +58,15 @@ class DataLoader:
     
     def load_split(self, split: str) -> List[Dict]:
         """Load một split cụ thể"""
+        if self.backend == 'columnar':
+            from src.storage.columnar import ColumnarSplit
+            return ColumnarSplit.open(self.data_dir / f"{split}.columnar")
+        
+        if self.backend == 'jsonl':
+            from src.storage.jsonl import ShardedJsonlSplit
+            return ShardedJsonlSplit(self.data_dir / f"{split}.shards",
+                                     transform=self.prepare_dialogue)
+        
         filepath = self.data_dir / f"{split}.json"
         
         if not filepath.exists():
@@ -29,146 +75,404 @@ class DataLoader:
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        return data
+        return [self.prepare_dialogue(dialogue) for dialogue in data]
+    
+    @property
+    def vocab(self):
+        """Vocab của dữ liệu (vocab.json nếu có, ngược lại tạo từ ontology)"""
+        if self._vocab is None:
+            from src.vocab import Vocab
+            
+            vocab_file = self.data_dir / "vocab.json"
+            ontology_file = self.data_dir / "ontology.json"
+            if vocab_file.exists():
+                self._vocab = Vocab.load(vocab_file)
+            elif ontology_file.exists():
+                with open(ontology_file, 'r', encoding='utf-8') as f:
+                    self._vocab = Vocab.from_ontology(json.load(f))
+            else:
+                self._vocab = Vocab()
+        return self._vocab
+    
+    def prepare_dialogue(self, dialogue: Dict) -> Dict:
+        """Dialogue vừa parse -> dạng trả về của loader (theo ids/records)"""
+        dialogue = self.convert_dialogue(dialogue)
+        if self.records:
+            return Dialogue.from_dict(dialogue)
+        return dialogue
+    
+    def convert_dialogue(self, dialogue: Dict) -> Dict:
+        """
+        Chuyển belief state của dialogue về dạng mong muốn: {slot: value}
+        hoặc {slot_id: value_id} (khi ids=True). Dữ liệu lưu bằng --vocab
+        có dạng [[slot_id, value_id], ...].
+        """
+        for turn in dialogue['turns']:
+            for key in self.STATE_KEYS:
+                state = turn.get(key)
+                if state is None:
+                    continue
+                if isinstance(state, list):
+                    if self.ids:
+                        turn[key] = {slot_id: value_id for slot_id, value_id in state}
+                    else:
+                        turn[key] = self.vocab.decode_state(state)
+                elif self.ids:
+                    turn[key] = self.vocab.encode_state(state, add=True)
+            
+            # Dữ liệu delta-only: danh sách slot bị xóa
+            removed = turn.get(REMOVED_KEY)
+            if removed:
+                if self.ids and not isinstance(removed[0], int):
+                    turn[REMOVED_KEY] = [self.vocab.slot_id(slot, add=True) for slot in removed]
+                elif not self.ids and isinstance(removed[0], int):
+                    turn[REMOVED_KEY] = [self.vocab.slot(slot_id) for slot_id in removed]
+        return dialogue
+    
+    @staticmethod
+    def belief_states(dialogue: Dict, checkpoint_every: int = 8) -> BeliefStates:
+        """
+        Belief state tích lũy của từng turn (dựng lại lazy nếu dữ liệu được
+        lưu dạng delta-only, xem --delta-only)
+        """
+        return BeliefStates(dialogue['turns'], checkpoint_every)
     
-    def load_all(self):
-        """Load tất cả splits"""
+    # Snapshot của load_all (backend json), nằm cạnh dữ liệu đã xử lý
+    SNAPSHOT_FILE = Path(".cache") / "snapshot.pkl"
+    
+    def snapshot_sources(self) -> List[Path]:
+        """Các file nguồn mà snapshot phụ thuộc vào"""
+        names = ['train.json', 'val.json', 'test.json',
+                 'ontology.json', 'dataset_stats.json', 'vocab.json']
+        return [self.data_dir / name for name in names]
+    
+    def load_all(self, use_snapshot: bool = True):
+        """
+        Load tất cả splits
+        
+        Args:
+            use_snapshot: Với backend json, đọc từ snapshot nhị phân
+                          (data_dir/.cache/snapshot.pkl) nếu các file nguồn
+                          không đổi, ngược lại parse JSON rồi ghi snapshot mới
+        """
+        from src.storage.snapshot import load_snapshot, save_snapshot, source_signatures
+        
         print("Loading data...")
-        self.train_data = self.load_split('train')
-        self.val_data = self.load_split('val')
-        self.test_data = self.load_split('test')
+        # Split đã load trước đó (backend jsonl) có thể còn giữ file handle
+        self.close()
+        use_snapshot = use_snapshot and self.backend == 'json'
+        snapshot_path = self.data_dir / self.SNAPSHOT_FILE
+        options = {'ids': self.ids, 'records': self.records}
+        
+        snapshot = None
+        if use_snapshot:
+            snapshot = load_snapshot(snapshot_path, self.snapshot_sources(), options)
+        
+        if snapshot is not None:
+            (self.train_data, self.val_data, self.test_data,
+             self.ontology, self.stats, self._vocab) = snapshot
+            print(f"✓ Loaded snapshot {snapshot_path}")
+        else:
+            signatures = source_signatures(self.snapshot_sources()) if use_snapshot else None
+            self.train_data = self.load_split('train')
+            self.val_data = self.load_split('val')
+            self.test_data = self.load_split('test')
+            
+            # Load ontology
+            ontology_file = self.data_dir / "ontology.json"
+            if ontology_file.exists():
+                with open(ontology_file, 'r', encoding='utf-8') as f:
+                    self.ontology = json.load(f)
+            
+            # Load stats
+            stats_file = self.data_dir / "dataset_stats.json"
+            if stats_file.exists():
+                with open(stats_file, 'r', encoding='utf-8') as f:
+                    self.stats = json.load(f)
+            
+            if use_snapshot:
+                payload = (self.train_data, self.val_data, self.test_data,
+                           self.ontology, self.stats, self._vocab)
+                try:
+                    save_snapshot(snapshot_path, signatures, options, payload)
+                except OSError as e:
+                    print(f"✗ Could not save snapshot: {e}")
         
         print(f"✓ Train: {len(self.train_data)} dialogues")
         print(f"✓ Val: {len(self.val_data)} dialogues")
         print(f"✓ Test: {len(self.test_data)} dialogues")
-        
-        # Load ontology
-        ontology_file = self.data_dir / "ontology.json"
-        if ontology_file.exists():
-            with open(ontology_file, 'r', encoding='utf-8') as f:
-                self.ontology = json.load(f)
+        if self.ontology is not None:
             print(f"✓ Ontology loaded")
-        
-        # Load stats
-        stats_file = self.data_dir / "dataset_stats.json"
-        if stats_file.exists():
-            with open(stats_file, 'r', encoding='utf-8') as f:
-                self.stats = json.load(f)
+        if self.stats is not None:
             print(f"✓ Statistics loaded")
     
-    def get_dialogue(self, dialogue_id: str, split: str = None) -> Optional[Dict]:
-        """Lấy một dialogue theo ID"""
-        if split:
-            data = getattr(self, f"{split}_data")
-            if data:
-                for dialogue in data:
-                    if dialogue['dialogue_id'] == dialogue_id:
-                        return dialogue
+    def iter_split(self, split: str) -> Iterator[Dict]:
+        """
+        Duyệt các dialogue của một split mà không giữ cả split trong memory
+        (với backend jsonl: stream các shard theo thứ tự gốc; split đã load thì duyệt trực tiếp)
+        """
+        data = getattr(self, f"{split}_data")
+        if data is not None:
+            yield from data
+            return
+        
+        data = self.load_split(split)
+        try:
+            yield from data
+        finally:
+            _close_split(data)
+    
+    def iter_batches(self, split: str, batch_size: int = 32, by: str = 'turn',
+                     bucket_by_length: bool = True, shuffle_seed: Optional[int] = None,
+                     prefetch: int = 2) -> Iterator[Dict[str, list]]:
+        """
+        Duyệt split theo batch (xem src.batching.iter_batches)
+        
+        Args:
+            by: 'turn' hoặc 'dialogue'
+            bucket_by_length: Gom các phần tử có độ dài gần nhau vào cùng batch
+            shuffle_seed: Seed để shuffle (None: không shuffle)
+            prefetch: Số batch được dựng trước ở thread nền (0: tắt)
+        """
+        from src.batching import iter_batches
+        
+        data = getattr(self, f"{split}_data")
+        if data is not None:
+            return iter_batches(data, batch_size, by, bucket_by_length, shuffle_seed, prefetch)
+        
+        data = self.load_split(split)
+        return _closing(iter_batches(data, batch_size, by, bucket_by_length, shuffle_seed, prefetch), data)
+    
+    def share_split(self, split: str):
+        """
+        Publish split vào shared memory (src.storage.shared.SharedSplit) để
+        các worker process attach zero-copy bằng attach_split(shared.handle)
+        thay vì mỗi worker tự load một bản
+        """
+        from src.storage.shared import SharedSplit
+        
+        data = getattr(self, f"{split}_data")
+        if data is not None:
+            return SharedSplit.publish(data)
+        
+        data = self.load_split(split)
+        try:
+            return SharedSplit.publish(data)
+        finally:
+            _close_split(data)
+    
+    def close(self):
+        """Đóng file handle của các split đã load (backend jsonl)"""
+        for split in self.SPLITS:
+            _close_split(getattr(self, f"{split}_data"))
+    
+    def __enter__(self) -> 'DataLoader':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    SPLITS = ['train', 'val', 'test']
+    
+    def split_index(self, split: str) -> Dict[str, int]:
+        """
+        Index dialogue_id -> vị trí trong split (dựng lazy ở lần tra cứu đầu,
+        dựng lại nếu split được load lại hoặc số dialogues thay đổi, vd.
+        append / remove trên list). Thay dialogue tại chỗ mà không đổi số
+        dialogues thì không được phát hiện: gán lại <split>_data thay vì sửa list.
+        """
+        data = getattr(self, f"{split}_data")
+        if data is None:
+            return {}
+        
+        cached = self._indexes.get(split)
+        if cached is not None and cached[0] is data and cached[1] == len(data):
+            return cached[2]
+        
+        if hasattr(data, 'dialogue_ids'):
+            # Backend columnar/jsonl: chỉ đọc dialogue_id
+            dialogue_ids = data.dialogue_ids()
         else:
-            # Search all splits
-            for split in ['train', 'val', 'test']:
-                dialogue = self.get_dialogue(dialogue_id, split)
-                if dialogue:
-                    return dialogue
+            dialogue_ids = [dialogue['dialogue_id'] for dialogue in data]
         
+        index = {}
+        for position, dialogue_id in enumerate(dialogue_ids):
+            index.setdefault(dialogue_id, position)
+        self._indexes[split] = (data, len(data), index)
+        return index
+    
+    def dialogue_index(self) -> Dict[str, tuple]:
+        """Index dialogue_id -> (split, position) trên tất cả các split đã load"""
+        index = {}
+        for split in self.SPLITS:
+            for dialogue_id, position in self.split_index(split).items():
+                index.setdefault(dialogue_id, (split, position))
+        return index
+    
+    def locate(self, dialogue_id: str, split: str = None) -> Optional[tuple]:
+        """(split, position) của dialogue, None nếu không tìm thấy"""
+        for name in ([split] if split else self.SPLITS):
+            position = self.split_index(name).get(dialogue_id)
+            if position is not None:
+                return name, position
         return None
     
+    def get_dialogue(self, dialogue_id: str, split: str = None) -> Optional[Dict]:
+        """Lấy một dialogue theo ID (tra index, O(1))"""
+        location = self.locate(dialogue_id, split)
+        if location is None:
+            return None
+        
+        split, position = location
+        return getattr(self, f"{split}_data")[position]
+    
+    def get_dialogues(self, dialogue_ids: List[str], split: str = None) -> List[Optional[Dict]]:
+        """Lấy nhiều dialogues theo ID (giữ thứ tự, None nếu không tìm thấy)"""
+        return [self.get_dialogue(dialogue_id, split) for dialogue_id in dialogue_ids]
+    
+    def get_index(self, split: str = 'train'):
+        """
+        Inverted indexes (src.inverted_index.SplitIndex) của split: domain ->
+        dialogues, slot -> turns, (slot, value) -> turns. Dựng lazy ở lần gọi
+        đầu, dựng lại nếu split được load lại.
+        """
+        from src.inverted_index import SplitIndex
+        
+        data = getattr(self, f"{split}_data")
+        if data is None:
+            raise ValueError(f"Split not loaded: {split}")
+        
+        cached = self._inverted_indexes.get(split)
+        if cached is None or cached[0] is not data:
+            cached = (data, SplitIndex(data))
+            self._inverted_indexes[split] = cached
+        return cached[1]
+    
+    def get_arrays(self, split: str = 'train') -> SplitArrays:
+        """
+        SplitArrays (mảng NumPy cho DataAnalyzer) của split, dựng một lần
+        và dựng lại nếu split được load lại
+        """
+        data = getattr(self, f"{split}_data")
+        if data is None:
+            raise ValueError(f"Split not loaded: {split}")
+        
+        cached = self._split_arrays.get(split)
+        if cached is None or cached[0] is not data:
+            cached = (data, SplitArrays.build(data))
+            self._split_arrays[split] = cached
+        return cached[1]
+    
+    def get_turns(self, turns, split: str = 'train') -> List[tuple]:
+        """Turns toàn cục (kết quả query trên get_index) -> [(dialogue, turn), ...]"""
+        data = getattr(self, f"{split}_data")
+        index = self.get_index(split)
+        result = []
+        for turn in turns:
+            position, turn_index = index.turn_location(turn)
+            dialogue = data[position]
+            result.append((dialogue, dialogue['turns'][turn_index]))
+        return result
+    
     def get_dialogues_by_domain(self, domain: str, split: str = 'train') -> List[Dict]:
         """Lấy các dialogues theo domain"""
         data = getattr(self, f"{split}_data")
         if not data:
             return []
         
-        return [d for d in data if domain in d.get('domains', [])]
+        return [data[position] for position in self.get_index(split).dialogues_with_domain(domain)]
+    
+    @property
+    def ontology_index(self):
+        """
+        OntologyIndex (src.ontology) của ontology.json, cache tại
+        data_dir/.cache/ontology_index.pkl
+        """
+        if self._ontology_index is None:
+            from src.ontology import OntologyIndex
+            
+            ontology_file = self.data_dir / "ontology.json"
+            if ontology_file.exists():
+                self._ontology_index = OntologyIndex.load(ontology_file, self.data_dir / ".cache")
+            else:
+                self._ontology_index = OntologyIndex(self.ontology or {})
+        return self._ontology_index
     
     def get_slot_values(self, slot_name: str) -> List[str]:
         """Lấy tất cả các giá trị của một slot từ ontology"""
-        if not self.ontology:
-            return []
-        
-        # Parse slot name (format: domain-slot)
-        parts = slot_name.split('-')
-        if len(parts) != 2:
-            return []
-        
-        domain, slot = parts
-        
-        # Look in ontology
-        if domain in self.ontology:
-            domain_ontology = self.ontology[domain]
-            
-            # Check in semi slots
-            if 'semi' in domain_ontology and slot in domain_ontology['semi']:
-                return domain_ontology['semi'][slot]
-            
-            # Check in book slots
-            if 'book' in domain_ontology and slot in domain_ontology['book']:
-                return domain_ontology['book'][slot]
-        
-        return []
+        return list(self.ontology_index.get_slot_values(slot_name))
+
+
+def _close_split(data) -> None:
+    """Đóng split nếu split giữ file handle (ShardedJsonlSplit)"""
+    if hasattr(data, 'close'):
+        data.close()
+
 
+def _closing(iterator: Iterator, data) -> Iterator:
+    """Duyệt iterator rồi đóng split load tạm (kể cả khi dừng giữa chừng)"""
+    try:
+        yield from iterator
+    finally:
+        _close_split(data)
 
 class DataAnalyzer:
-    """Phân tích và thống kê dữ liệu"""
+    """
+    Phân tích và thống kê dữ liệu
+    
+    Các hàm analyze_* nhận list dialogues hoặc SplitArrays (src.split_arrays,
+    vd. DataLoader.get_arrays(split)); với SplitArrays dựng sẵn, mọi phân tích
+    chỉ là các phép reduce NumPy, không duyệt lại dialogues.
+    """
+    
+    @staticmethod
+    def get_arrays(data) -> SplitArrays:
+        """SplitArrays của data (dựng mới nếu data là list dialogues)"""
+        if isinstance(data, SplitArrays):
+            return data
+        return SplitArrays.build(data)
     
     @staticmethod
-    def analyze_dialogue_length(data: List[Dict]) -> Dict:
+    def analyze_dialogue_length(data) -> Dict:
         """Phân tích độ dài dialogues"""
-        lengths = [len(d['turns']) for d in data]
+        lengths = DataAnalyzer.get_arrays(data).turns_per_dialogue
+        total = int(lengths.sum())
         
         return {
-            'min': min(lengths) if lengths else 0,
-            'max': max(lengths) if lengths else 0,
-            'mean': sum(lengths) / len(lengths) if lengths else 0,
-            'total': sum(lengths)
+            'min': int(lengths.min()) if len(lengths) else 0,
+            'max': int(lengths.max()) if len(lengths) else 0,
+            'mean': total / len(lengths) if len(lengths) else 0,
+            'total': total
         }
     
     @staticmethod
-    def analyze_domain_distribution(data: List[Dict]) -> Dict:
+    def analyze_domain_distribution(data) -> Dict:
         """Phân tích phân bố domains"""
-        single_domain = 0
-        multi_domain = 0
-        domain_counter = Counter()
-        
-        for dialogue in data:
-            domains = dialogue.get('domains', [])
-            num_domains = len(domains)
-            
-            if num_domains == 1:
-                single_domain += 1
-            elif num_domains > 1:
-                multi_domain += 1
-            
-            domain_counter.update(domains)
+        arrays = DataAnalyzer.get_arrays(data)
+        num_domains = arrays.domains_per_dialogue()
         
         return {
-            'single_domain': single_domain,
-            'multi_domain': multi_domain,
-            'domain_counts': dict(domain_counter)
+            'single_domain': int(np.count_nonzero(num_domains == 1)),
+            'multi_domain': int(np.count_nonzero(num_domains > 1)),
+            'domain_counts': dict(arrays.domain_counts())
         }
     
     @staticmethod
-    def analyze_slot_distribution(data: List[Dict]) -> Dict:
+    def analyze_slot_distribution(data) -> Dict:
         """Phân tích phân bố slots"""
-        slot_counter = Counter()
-        turns_with_slots = 0
-        total_turns = 0
-        
-        for dialogue in data:
-            for turn in dialogue['turns']:
-                total_turns += 1
-                belief_state = turn.get('belief_state', {})
-                
-                if belief_state:
-                    turns_with_slots += 1
-                    slot_counter.update(belief_state.keys())
+        arrays = DataAnalyzer.get_arrays(data)
+        total_turns = arrays.num_turns
+        turns_with_slots = int(np.count_nonzero(arrays.slots_per_turn()))
+        
+        # Sort ổn định theo count giảm dần: thứ tự giống Counter.most_common
+        slot_counts = sorted(arrays.slot_counts(), key=lambda item: item[1], reverse=True)
         
         return {
             'total_turns': total_turns,
             'turns_with_slots': turns_with_slots,
             'turns_without_slots': total_turns - turns_with_slots,
             'slot_coverage': turns_with_slots / total_turns if total_turns > 0 else 0,
-            'most_common_slots': dict(slot_counter.most_common(10))
+            'most_common_slots': dict(slot_counts[:10])
         }
     
     @staticmethod
@@ -184,15 +488,15 @@ class DataAnalyzer:
         if max_turns:
             turns = turns[:max_turns]
         
-        for turn in turns:
+        for turn, belief_state in zip(turns, iter_belief_states(turns)):
             print(f"\n[Turn {turn['turn_id']}]")
             print(f"User: {turn['utterance']}")
             
-            if turn.get('belief_state'):
-                print(f"Belief State: {json.dumps(turn['belief_state'], indent=2)}")
+            if belief_state:
+                print(f"Belief State: {json.dumps(dict(belief_state), indent=2)}")
             
             if turn.get('belief_state_delta'):
-                print(f"Delta: {json.dumps(turn['belief_state_delta'], indent=2)}")
+                print(f"Delta: {json.dumps(dict(turn['belief_state_delta']), indent=2)}")
             
             if turn.get('system_response'):
                 print(f"System: {turn['system_response']}")
@@ -201,59 +505,89 @@ class DataAnalyzer:
 
 
 class DataExporter:
-    """Export dữ liệu sang các format khác"""
+    """
+    Export dữ liệu sang các format khác
+    
+    Các exporter nhận bất kỳ iterator dialogues nào (vd. DataLoader.iter_split)
+    và ghi theo từng chunk (xem src.export): compress='gzip'/'bz2'/'xz',
+    num_shards > 1 để chia file, workers > 1 để format/nén song song.
+    """
     
     @staticmethod
-    def to_csv(data: List[Dict], output_file: str):
-        """Export dữ liệu sang CSV format (flat structure)"""
-        import csv
+    def to_csv(data: Iterable[Dict], output_file: str, columns: List[str] = None,
+               delimiter: str = ',', compress: str = None, chunk_size: int = 256,
+               num_shards: int = 1, workers: int = 1):
+        """
+        Export dữ liệu sang CSV format (flat structure, mỗi turn một dòng)
         
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            # Header
-            writer.writerow([
-                'dialogue_id', 'turn_id', 'speaker', 'utterance',
-                'belief_state', 'system_response'
-            ])
-            
-            # Rows
-            for dialogue in data:
-                for turn in dialogue['turns']:
-                    writer.writerow([
-                        dialogue['dialogue_id'],
-                        turn['turn_id'],
-                        turn['speaker'],
-                        turn['utterance'],
-                        json.dumps(turn.get('belief_state', {})),
-                        turn.get('system_response', '')
-                    ])
-        
-        print(f"✓ Exported to {output_file}")
+        Args:
+            columns: Các cột cần xuất (mặc định tất cả, xem src.export.CSV_COLUMNS),
+                     vd. bỏ 'belief_state' để không phải dựng / encode belief state
+            delimiter: '\t' để xuất TSV
+        """
+        from src.export import CSV_COLUMNS, csv_header, export_stream
+        
+        columns = list(columns) if columns else list(CSV_COLUMNS)
+        unknown = [column for column in columns if column not in CSV_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        
+        paths = export_stream('csv', data, output_file, header=csv_header(columns, delimiter),
+                              columns=columns, delimiter=delimiter, compress=compress,
+                              chunk_size=chunk_size, num_shards=num_shards, workers=workers)
+        
+        print(f"✓ Exported to {output_file}" if len(paths) == 1
+              else f"✓ Exported to {len(paths)} shards: {paths[0]} ...")
     
     @staticmethod
-    def to_text(data: List[Dict], output_file: str):
+    def to_text(data: Iterable[Dict], output_file: str, compress: str = None,
+                chunk_size: int = 256, num_shards: int = 1, workers: int = 1):
         """Export dữ liệu sang text format (readable)"""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for dialogue in data:
-                f.write(f"=== {dialogue['dialogue_id']} ===\n")
-                f.write(f"Domains: {', '.join(dialogue.get('domains', []))}\n\n")
-                
-                for turn in dialogue['turns']:
-                    f.write(f"[Turn {turn['turn_id']}]\n")
-                    f.write(f"User: {turn['utterance']}\n")
-                    
-                    if turn.get('belief_state'):
-                        f.write(f"Belief: {turn['belief_state']}\n")
-                    
-                    if turn.get('system_response'):
-                        f.write(f"System: {turn['system_response']}\n")
-                    
-                    f.write("\n")
-                
-                f.write("\n" + "=" * 80 + "\n\n")
-        
-        print(f"✓ Exported to {output_file}")
+        from src.export import export_stream
+        
+        paths = export_stream('text', data, output_file, compress=compress,
+                              chunk_size=chunk_size, num_shards=num_shards, workers=workers)
+        
+        print(f"✓ Exported to {output_file}" if len(paths) == 1
+              else f"✓ Exported to {len(paths)} shards: {paths[0]} ...")
+    
+    @staticmethod
+    def to_tensors(data: Iterable[Dict], output_path: str, vocab=None, ontology: Dict = None,
+                   token_vocab=None, buckets=None, format: str = 'npz',
+                   max_tokens: int = None):
+        """
+        Export sang các mảng id đã pad, chia bucket theo số turns (xem src.tensor_export)
+        
+        Args:
+            vocab: Vocab slot/value (mặc định tạo từ ontology: mỗi slot ontology một cột)
+            token_vocab: TokenVocab của train; None thì tạo mới từ data.
+                         Với val/test truyền (vocab, token_vocab) trả về từ lần
+                         export train: cả hai được dùng cố định (không thêm slot /
+                         value / token mới) nên cột và id giống train
+            buckets: Cận trên số turns của các bucket (mặc định DEFAULT_BUCKETS)
+            format: 'npz' (một file) hoặc 'npy' (thư mục, đọc bằng mmap)
+        
+        Returns:
+            (Vocab, TokenVocab) đã dùng
+        """
+        from src.tensor_export import (DEFAULT_BUCKETS, TokenVocab, build_tensors,
+                                       save_tensors)
+        from src.vocab import Vocab
+        
+        add_tokens = token_vocab is None
+        if vocab is None:
+            if not add_tokens:
+                raise ValueError("Pass the vocab returned by the train export together with token_vocab")
+            vocab = Vocab.from_ontology(ontology) if ontology else Vocab()
+        if token_vocab is None:
+            token_vocab = TokenVocab()
+        buckets = tuple(buckets) if buckets else DEFAULT_BUCKETS
+        
+        tensors = build_tensors(data, vocab, token_vocab, buckets, add_tokens, max_tokens)
+        path = save_tensors(tensors, output_path, vocab, token_vocab, buckets, format)
+        
+        print(f"✓ Exported {len(tensors)} buckets to {path}")
+        return vocab, token_vocab
 
 
 def example_usage():
@@ -272,13 +606,16 @@ def example_usage():
     print("TRAIN DATA ANALYSIS")
     print("=" * 80)
     
-    length_stats = DataAnalyzer.analyze_dialogue_length(loader.train_data)
+    # Dựng mảng một lần, các phân tích dùng chung
+    train_arrays = loader.get_arrays('train')
+    
+    length_stats = DataAnalyzer.analyze_dialogue_length(train_arrays)
     print(f"\nDialogue length: {length_stats}")
     
-    domain_stats = DataAnalyzer.analyze_domain_distribution(loader.train_data)
+    domain_stats = DataAnalyzer.analyze_domain_distribution(train_arrays)
     print(f"\nDomain distribution: {domain_stats}")
     
-    slot_stats = DataAnalyzer.analyze_slot_distribution(loader.train_data)
+    slot_stats = DataAnalyzer.analyze_slot_distribution(train_arrays)
     print(f"\nSlot distribution: {slot_stats}")
 
 
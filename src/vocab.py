@@ -0,0 +1,160 @@
+"""
+Vocabulary dùng chung cho slot names và slot values
+
+Map slot/value sang integer id gọn để lưu trữ và so sánh nhanh.
+Value id 0 được dành cho "không có giá trị" (slot chưa được điền / padding).
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Union
+
+
+def value_key(value) -> Any:
+    """Key để intern một value (value có thể là list/dict, vd. slot "booked")"""
+    if isinstance(value, str):
+        return value
+    return ('json', json.dumps(value, sort_keys=True, ensure_ascii=False))
+
+
+def normalize_ontology_slot(slot_name: str) -> str:
+    """
+    Chuẩn hóa tên slot trong ontology.json về tên slot của dữ liệu đã xử lý
+    (vd. 'hotel-book day' -> 'hotel-day', 'train-arriveBy' -> 'train-arriveby')
+    """
+    domain, _, slot = slot_name.partition('-')
+    slot = slot.lower()
+    if slot.startswith('book '):
+        slot = slot[len('book '):]
+    return f"{domain}-{slot}".lower()
+
+
+class Vocab:
+    """Map slot <-> id và value <-> id (value id 0 = không có giá trị)"""
+    
+    NONE_ID = 0
+    
+    def __init__(self, slots: Iterable[str] = (), values: Iterable[Any] = ()):
+        self.slots: List[str] = []
+        self.values: List[Any] = [None]
+        self.slot_to_id: Dict[str, int] = {}
+        self.value_to_id: Dict[Any, int] = {}
+        
+        for slot in slots:
+            self.add_slot(slot)
+        for value in values:
+            if value is not None:
+                self.add_value(value)
+    
+    @classmethod
+    def from_ontology(cls, ontology: Dict) -> 'Vocab':
+        """
+        Tạo vocab từ ontology (flat: {'domain-slot': [values]} hoặc
+        nested: {domain: {'semi'/'book': {slot: [values]}}})
+        """
+        vocab = cls()
+        for slot, values in iter_ontology_slots(ontology):
+            vocab.add_slot(slot)
+            for value in values:
+                vocab.add_value(value)
+        return vocab
+    
+    @classmethod
+    def load(cls, path) -> 'Vocab':
+        """Load vocab từ file JSON"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['slots'], data['values'][1:])
+    
+    def save(self, path):
+        """Lưu vocab ra file JSON"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'slots': self.slots, 'values': self.values}, f, ensure_ascii=False)
+    
+    @property
+    def num_slots(self) -> int:
+        return len(self.slots)
+    
+    @property
+    def num_values(self) -> int:
+        return len(self.values)
+    
+    def add_slot(self, slot: str) -> int:
+        slot_id = self.slot_to_id.get(slot)
+        if slot_id is None:
+            slot_id = len(self.slots)
+            self.slot_to_id[slot] = slot_id
+            self.slots.append(slot)
+        return slot_id
+    
+    def add_value(self, value) -> int:
+        key = value_key(value)
+        value_id = self.value_to_id.get(key)
+        if value_id is None:
+            value_id = len(self.values)
+            self.value_to_id[key] = value_id
+            self.values.append(value)
+        return value_id
+    
+    def slot_id(self, slot: str, add: bool = False) -> int:
+        """Id của slot (add=True: thêm mới nếu chưa có, ngược lại KeyError)"""
+        if add:
+            return self.add_slot(slot)
+        return self.slot_to_id[slot]
+    
+    def value_id(self, value, add: bool = False) -> int:
+        """Id của value (add=True: thêm mới nếu chưa có, ngược lại KeyError)"""
+        if value is None:
+            return self.NONE_ID
+        if add:
+            return self.add_value(value)
+        return self.value_to_id[value_key(value)]
+    
+    def slot(self, slot_id: int) -> str:
+        return self.slots[slot_id]
+    
+    def value(self, value_id: int) -> Any:
+        return self.values[value_id]
+    
+    def observe(self, state: Dict[str, Any]):
+        """Thêm các slot/value của một belief state vào vocab"""
+        for slot, value in state.items():
+            self.add_slot(slot)
+            self.add_value(value)
+    
+    def encode_state(self, state: Dict[str, Any], add: bool = False) -> Dict[int, int]:
+        """Belief state {slot: value} -> {slot_id: value_id}"""
+        return {
+            self.slot_id(slot, add): self.value_id(value, add)
+            for slot, value in state.items()
+        }
+    
+    def encode_pairs(self, state: Dict[str, Any], add: bool = False) -> List[List[int]]:
+        """Belief state -> [[slot_id, value_id], ...] (dạng lưu được ra JSON)"""
+        return [
+            [self.slot_id(slot, add), self.value_id(value, add)]
+            for slot, value in state.items()
+        ]
+    
+    def decode_state(self, encoded: Union[Dict[int, int], List[List[int]]]) -> Dict[str, Any]:
+        """{slot_id: value_id} hoặc [[slot_id, value_id], ...] -> {slot: value}"""
+        pairs = encoded.items() if isinstance(encoded, dict) else encoded
+        return {self.slots[slot_id]: self.values[value_id] for slot_id, value_id in pairs}
+
+
+def iter_ontology_slots(ontology: Dict):
+    """Duyệt (slot_name đã chuẩn hóa, values) của ontology flat hoặc nested"""
+    for key, entry in ontology.items():
+        if isinstance(entry, list):
+            yield normalize_ontology_slot(key), entry
+        elif isinstance(entry, dict):
+            for slot_type in ['semi', 'book']:
+                for slot, values in entry.get(slot_type, {}).items():
+                    yield f"{key}-{slot}".lower(), values
+
+
+def pairs_to_ids(pairs: List[List[int]]) -> Dict[int, int]:
+    """[[slot_id, value_id], ...] (từ JSON) -> {slot_id: value_id}"""
+    return {slot_id: value_id for slot_id, value_id in pairs}
@@ -0,0 +1,129 @@
+"""
+Fixtures chung: dialogues đã xử lý sinh ngẫu nhiên (cùng format với
+scripts/preprocess_multiwoz24.py) và thư mục dữ liệu cho từng backend
+"""
+
+import json
+import random
+import sys
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.belief_state import iter_belief_states, to_delta_only
+from src.storage.columnar import ColumnarWriter
+from src.storage.jsonl import ShardedJsonlWriter
+
+
+ONTOLOGY = {
+    'hotel-area': ['centre', 'north', 'west'],
+    'hotel-book day': ['monday', 'friday'],
+    'hotel-book people': ['2', '3'],
+    'hotel-pricerange': ['cheap', 'moderate', 'expensive'],
+    'restaurant-food': ['italian', 'chinese'],
+    'restaurant-book time': ['17:15', '19:00'],
+    'train-day': ['monday', 'friday'],
+    'train-destination': ['cambridge', 'london'],
+    'taxi-leaveat': ['17:15', '19:00'],
+}
+
+SLOTS = [key.replace('book ', '') for key in ONTOLOGY]
+VALUES = sorted({value for values in ONTOLOGY.values() for value in values} | {'dontcare', 'none'})
+WORDS = 'i need a hotel in the centre please book it for two people on monday thanks'.split()
+
+
+def make_dialogues(num_dialogues: int, seed: int = 0, prefix: str = 'D'):
+    """Dialogues ngẫu nhiên có belief_state, belief_state_delta và slot bị xóa"""
+    rng = random.Random(seed)
+    dialogues = []
+    for k in range(num_dialogues):
+        domains = rng.sample(['hotel', 'restaurant', 'train', 'taxi'], rng.randint(1, 3))
+        slots = [slot for slot in SLOTS if slot.split('-')[0] in domains]
+        state = {}
+        turns = []
+        for turn_id in range(rng.randint(1, 12)):
+            previous = dict(state)
+            for _ in range(rng.randint(0, 3)):
+                state[rng.choice(slots)] = rng.choice(VALUES)
+            if state and rng.random() < 0.15:
+                del state[rng.choice(list(state))]
+            turns.append({
+                'turn_id': turn_id,
+                'speaker': 'user',
+                'utterance': ' '.join(rng.choices(WORDS, k=rng.randint(1, 15))),
+                'belief_state': dict(state),
+                'belief_state_delta': {
+                    slot: value for slot, value in state.items() if previous.get(slot) != value
+                },
+                'system_response': ' '.join(rng.choices(WORDS, k=rng.randint(1, 10)))
+            })
+        dialogues.append({'dialogue_id': f"{prefix}{k:04d}.json", 'domains': domains, 'turns': turns})
+    return dialogues
+
+
+def make_predictions(gold, seed: int = 0, drop: float = 0.3, wrong: float = 0.2):
+    """Predictions (belief_state đầy đủ) từ gold, có slot bị bỏ / sai value"""
+    rng = random.Random(seed)
+    predictions = []
+    for dialogue in gold:
+        turns = []
+        for state in iter_belief_states(dialogue['turns']):
+            state = dict(state)
+            if state and rng.random() < drop:
+                del state[rng.choice(list(state))]
+            if state and rng.random() < wrong:
+                state[rng.choice(list(state))] = 'wrong'
+            turns.append({'belief_state': state})
+        predictions.append({'dialogue_id': dialogue['dialogue_id'], 'turns': turns})
+    return predictions
+
+
+def plain(obj):
+    """View columnar / record -> dict / list thường để so sánh"""
+    if isinstance(obj, Mapping):
+        return {key: plain(value) for key, value in obj.items()}
+    if isinstance(obj, Sequence) and not isinstance(obj, str):
+        return [plain(item) for item in obj]
+    return obj
+
+
+def write_split(data_dir: Path, split: str, dialogues, backend: str = 'json',
+                delta_only: bool = False, num_shards: int = 3):
+    """Ghi một split theo backend (json / jsonl / columnar) như preprocessor"""
+    if delta_only:
+        dialogues = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in dialogues]
+    
+    if backend == 'columnar':
+        writer = ColumnarWriter(data_dir / f"{split}.columnar")
+    elif backend == 'jsonl':
+        writer = ShardedJsonlWriter(data_dir / f"{split}.shards", num_shards)
+    else:
+        with open(data_dir / f"{split}.json", 'w', encoding='utf-8') as f:
+            json.dump(dialogues, f)
+        return
+    
+    for dialogue in dialogues:
+        writer.write(dialogue)
+    writer.close()
+
+
+def write_dataset(data_dir: Path, backend: str = 'json', delta_only: bool = False):
+    """Thư mục dữ liệu đủ 3 split + ontology"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for seed, (split, size) in enumerate([('train', 40), ('val', 10), ('test', 20)]):
+        write_split(data_dir, split, make_dialogues(size, seed, prefix=split[:2].upper()),
+                    backend, delta_only)
+    with open(data_dir / 'ontology.json', 'w', encoding='utf-8') as f:
+        json.dump(ONTOLOGY, f)
+    return data_dir
+
+
+@pytest.fixture(scope='session')
+def dataset_dirs(tmp_path_factory):
+    """{backend: thư mục dữ liệu} với cùng nội dung cho mọi backend"""
+    root = tmp_path_factory.mktemp('processed')
+    return {backend: write_dataset(root / backend, backend) for backend in ['json', 'jsonl', 'columnar']}
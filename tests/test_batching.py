@@ -0,0 +1,82 @@
+import pytest
+
+import src.belief_state as belief_state
+from conftest import make_dialogues
+from src.batching import iter_batches
+from src.belief_state import iter_belief_states, to_delta_only
+from src.utils import DataLoader
+
+
+def all_turns(batches):
+    return [
+        (dialogue_id, turn_index, state)
+        for batch in batches
+        for dialogue_id, turn_index, state in zip(batch['dialogue_ids'], batch['turn_indices'],
+                                                  batch['belief_states'])
+    ]
+
+
+@pytest.mark.parametrize('backend', ['jsonl', 'columnar'])
+@pytest.mark.parametrize('options', [
+    {'bucket_by_length': False},
+    {'bucket_by_length': True},
+    {'bucket_by_length': True, 'shuffle_seed': 7},
+])
+def test_batches_match_json_backend(dataset_dirs, backend, options):
+    expected = DataLoader(dataset_dirs['json']).load_split('train')
+    data = DataLoader(dataset_dirs[backend], backend=backend).load_split('train')
+    
+    turns = all_turns(iter_batches(data, batch_size=8, **options))
+    assert [(dialogue_id, index) for dialogue_id, index, _ in turns] == [
+        (dialogue_id, index) for dialogue_id, index, _ in all_turns(iter_batches(expected, 8, **options))
+    ]
+    states = {dialogue['dialogue_id']: list(iter_belief_states(dialogue['turns'])) for dialogue in expected}
+    for dialogue_id, index, state in turns:
+        assert dict(state) == states[dialogue_id][index]
+
+
+def test_every_turn_appears_once():
+    data = make_dialogues(30, seed=2)
+    turns = all_turns(iter_batches(data, batch_size=5, shuffle_seed=3))
+    expected = [(d['dialogue_id'], i) for d in data for i in range(len(d['turns']))]
+    assert sorted((dialogue_id, index) for dialogue_id, index, _ in turns) == sorted(expected)
+
+
+def test_delta_only_states_reuse_checkpoints_across_batches(monkeypatch):
+    long_dialogue = make_dialogues(1, seed=5)[0]
+    turns = [dict(turn, turn_id=k) for k in range(5) for turn in long_dialogue['turns']]
+    dialogue = {'dialogue_id': 'L.json', 'domains': ['hotel'], 'turns': to_delta_only(turns)}
+    
+    calls = []
+    apply_turn = belief_state.apply_turn
+    monkeypatch.setattr(belief_state, 'apply_turn', lambda *args: calls.append(1) or apply_turn(*args))
+    
+    batches = list(iter_batches([dialogue], batch_size=1, bucket_by_length=False, prefetch_batches=0))
+    assert [batch['belief_states'][0] for batch in batches] == list(iter_belief_states(turns))
+    # Mỗi turn chỉ dựng lại từ checkpoint gần nhất (tối đa checkpoint_every delta)
+    assert len(calls) <= 8 * len(turns)
+
+
+@pytest.mark.parametrize('options', [{'bucket_by_length': False}, {'shuffle_seed': 4}])
+def test_belief_states_cache_evicts_finished_dialogues(monkeypatch, options):
+    import src.batching as batching
+    
+    data = make_dialogues(30, seed=6)
+    sizes = []
+    collate_turns = batching.collate_turns
+    
+    def recording_collate(data, batch, states=None, remaining=None):
+        result = collate_turns(data, batch, states, remaining)
+        sizes.append(len(states))
+        return result
+    
+    monkeypatch.setattr(batching, 'collate_turns', recording_collate)
+    turns = all_turns(iter_batches(data, batch_size=5, prefetch_batches=0, **options))
+    
+    states = {dialogue['dialogue_id']: list(iter_belief_states(dialogue['turns'])) for dialogue in data}
+    assert all(dict(state) == states[dialogue_id][index] for dialogue_id, index, state in turns)
+    # Hết kế hoạch thì không còn BeliefStates nào; giữ thứ tự gốc thì chỉ còn
+    # tối đa một dialogue đang dở giữa hai batch
+    assert sizes[-1] == 0
+    if not options.get('shuffle_seed'):
+        assert max(sizes) <= 1
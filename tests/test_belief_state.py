@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from conftest import make_dialogues
+from src.belief_state import (REMOVED_KEY, BeliefStates, apply_turn, iter_belief_states,
+                              to_delta_only, turn_changes)
+
+
+@pytest.fixture(scope='module')
+def dialogues():
+    return make_dialogues(40, seed=5)
+
+
+def test_delta_only_reconstructs_states(dialogues):
+    for dialogue in dialogues:
+        expected = [turn['belief_state'] for turn in dialogue['turns']]
+        delta_turns = to_delta_only(dialogue['turns'])
+        assert all('belief_state' not in turn for turn in delta_turns)
+        assert [turn['belief_state_delta'] for turn in delta_turns] == \
+            [turn['belief_state_delta'] for turn in dialogue['turns']]
+        assert list(iter_belief_states(delta_turns)) == expected
+    assert any(REMOVED_KEY in turn for dialogue in dialogues for turn in to_delta_only(dialogue['turns']))
+
+
+@pytest.mark.parametrize('checkpoint_every', [1, 3, 8])
+def test_belief_states_random_access(dialogues, checkpoint_every):
+    rng = random.Random(checkpoint_every)
+    for dialogue in dialogues:
+        expected = [turn['belief_state'] for turn in dialogue['turns']]
+        states = BeliefStates(to_delta_only(dialogue['turns']), checkpoint_every)
+        order = list(range(len(states)))
+        rng.shuffle(order)
+        assert [states[i] for i in order] == [expected[i] for i in order]
+        assert states[-1] == expected[-1]
+        assert list(states) == expected
+
+
+def test_turn_changes_apply_to_the_next_state(dialogues):
+    for dialogue in dialogues:
+        expected = [turn['belief_state'] for turn in dialogue['turns']]
+        for turns in [dialogue['turns'], to_delta_only(dialogue['turns'])]:
+            state = {}
+            for turn, expected_state in zip(turns, expected):
+                assert apply_turn(state, turn) == expected_state
+                updates, removed = turn_changes(state, turn)
+                state = {slot: value for slot, value in state.items() if slot not in removed}
+                state.update(updates)
+                assert state == expected_state
@@ -0,0 +1,53 @@
+from conftest import make_dialogues, plain, write_split
+from src.storage.columnar import ColumnarSplit, ColumnarWriter
+from src.vocab import Vocab
+
+
+def test_columnar_round_trip(tmp_path):
+    dialogues = make_dialogues(30, seed=2)
+    write_split(tmp_path, 'test', dialogues, 'columnar')
+    split = ColumnarSplit.open(tmp_path / 'test.columnar')
+    
+    assert len(split) == len(dialogues)
+    assert [plain(dialogue) for dialogue in split] == dialogues
+    assert plain(split[-1]) == dialogues[-1]
+    assert split.dialogue_ids() == [dialogue['dialogue_id'] for dialogue in dialogues]
+    assert plain(split.find(dialogues[17]['dialogue_id'])) == dialogues[17]
+    assert split.find('missing') is None
+
+
+def test_columnar_with_shared_vocab(tmp_path):
+    dialogues = make_dialogues(15, seed=3)
+    vocab = Vocab()
+    writer = ColumnarWriter(tmp_path / 'test.columnar', vocab)
+    for dialogue in dialogues:
+        writer.write(dialogue)
+    writer.close()
+    
+    split = ColumnarSplit.open(tmp_path / 'test.columnar')
+    assert [plain(dialogue) for dialogue in split] == dialogues
+
+
+def test_loader_columnar_backend_matches_json(dataset_dirs):
+    from src.utils import DataLoader
+    
+    for split in ['train', 'val', 'test']:
+        expected = DataLoader(dataset_dirs['json']).load_split(split)
+        columnar = DataLoader(dataset_dirs['columnar'], backend='columnar').load_split(split)
+        assert [plain(dialogue) for dialogue in columnar] == expected
+
+
+def test_flushed_writer_matches_in_memory(tmp_path):
+    dialogues = make_dialogues(20, seed=4)
+    for name, flush_bytes in [('memory', 64 << 20), ('flushed', 1)]:
+        writer = ColumnarWriter(tmp_path / name, Vocab(), flush_bytes=flush_bytes)
+        for dialogue in dialogues:
+            writer.write(dialogue)
+        writer.close()
+    
+    files = sorted(path.name for path in (tmp_path / 'memory').iterdir())
+    assert files == sorted(path.name for path in (tmp_path / 'flushed').iterdir())
+    assert not any(name.endswith('.part') for name in files)
+    for name in files:
+        assert (tmp_path / 'flushed' / name).read_bytes() == (tmp_path / 'memory' / name).read_bytes()
+    assert [plain(dialogue) for dialogue in ColumnarSplit.open(tmp_path / 'flushed')] == dialogues
@@ -0,0 +1,331 @@
+import pytest
+
+from conftest import make_dialogues, make_predictions
+from src.belief_state import REMOVED_KEY, iter_belief_states, to_delta_only, turn_changes
+from src.evaluation.metrics import DSTEvaluator, DSTMetrics
+
+
+def reference_metrics(predictions, gold, **kwargs) -> DSTMetrics:
+    """Metrics tính trực tiếp bằng update trên state đầy đủ"""
+    metrics = DSTMetrics(**kwargs)
+    gold_by_id = {dialogue['dialogue_id']: dialogue for dialogue in gold}
+    for prediction in predictions:
+        gold_turns = gold_by_id[prediction['dialogue_id']]['turns']
+        for pred_turn, true_state in zip(prediction['turns'], iter_belief_states(gold_turns)):
+            metrics.update(pred_turn.get('belief_state', {}), true_state)
+    return metrics
+
+
+@pytest.fixture(scope='module')
+def gold():
+    return make_dialogues(60, seed=1)
+
+
+def test_delta_only_gold_matches_full_gold(gold):
+    predictions = make_predictions(gold)
+    delta_gold = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in gold]
+    
+    full = DSTEvaluator().evaluate_dataset(predictions, gold)
+    assert DSTEvaluator().evaluate_dataset(predictions, delta_gold) == full
+    assert full == reference_metrics(predictions, gold).get_summary()
+
+
+def test_predictions_without_belief_state_are_scored_empty(gold):
+    # Prediction chỉ có delta không được cộng dồn thành state
+    predictions = [
+        {'dialogue_id': dialogue['dialogue_id'],
+         'turns': [{'belief_state_delta': turn['belief_state_delta']} for turn in dialogue['turns']]}
+        for dialogue in gold
+    ]
+    empty = [
+        {'dialogue_id': dialogue['dialogue_id'], 'turns': [{} for _ in dialogue['turns']]}
+        for dialogue in gold
+    ]
+    summary = DSTEvaluator().evaluate_dataset(predictions, gold)
+    assert summary == DSTEvaluator().evaluate_dataset(empty, gold)
+    assert summary['precision'] == 0.0
+
+
+@pytest.mark.parametrize('backend', ['json', 'jsonl', 'columnar'])
+def test_parallel_matches_serial_across_backends(dataset_dirs, backend):
+    from src.utils import DataLoader
+    
+    gold = DataLoader(dataset_dirs[backend], backend=backend).load_split('train')
+    # Predictions cũng là view của backend (turn columnar không pickle được)
+    predictions = [gold[i] for i in range(0, len(gold), 2)]
+    predictions += make_predictions([gold[i] for i in range(1, len(gold), 2)])
+    
+    serial = DSTEvaluator(record_outcomes=True)
+    expected = serial.evaluate_dataset(predictions, gold)
+    parallel = DSTEvaluator(record_outcomes=True)
+    assert parallel.evaluate_dataset(predictions, gold, workers=2, chunk_size=4) == expected
+    assert parallel.metrics.get_per_slot_accuracy() == serial.metrics.get_per_slot_accuracy()
+    assert (parallel.metrics.turn_outcomes()['joint'] == serial.metrics.turn_outcomes()['joint']).all()
+
+
+def test_parallel_matches_serial_with_records(dataset_dirs):
+    from src.utils import DataLoader
+    
+    gold = DataLoader(dataset_dirs['json'], records=True).load_split('test')
+    predictions = make_predictions(gold, seed=2)
+    expected = DSTEvaluator().evaluate_dataset(predictions, gold)
+    assert DSTEvaluator().evaluate_dataset(predictions, gold, workers=2, chunk_size=3) == expected
+
+
+def test_merge_rejects_different_settings():
+    with pytest.raises(ValueError):
+        DSTMetrics(record_outcomes=True).merge(DSTMetrics())
+    with pytest.raises(ValueError):
+        DSTMetrics().merge(DSTMetrics(breakdown=True))
+
+
+def test_merge_and_serialization_match_single_pass(gold):
+    predictions = make_predictions(gold, seed=4)
+    full = reference_metrics(predictions, gold, record_outcomes=True)
+    halves = [reference_metrics(predictions[:25], gold, record_outcomes=True),
+              reference_metrics(predictions[25:], gold, record_outcomes=True)]
+    
+    merged = sum(DSTMetrics.from_bytes(part.to_bytes()) for part in halves)
+    assert merged.get_summary() == full.get_summary()
+    assert list(merged.get_per_slot_accuracy().items()) == list(full.get_per_slot_accuracy().items())
+    assert merged.joint_outcomes == full.joint_outcomes
+
+
+def breakdown_report(evaluator):
+    return evaluator.metrics.breakdown.report()
+
+
+def test_breakdown_parallel_matches_serial_with_id_states(dataset_dirs):
+    from src.utils import DataLoader
+    
+    loader = DataLoader(dataset_dirs['json'], ids=True)
+    gold = loader.load_split('train')
+    predictions = make_predictions(gold, seed=6)
+    vocab = loader.vocab
+    
+    serial = DSTEvaluator(vocab, breakdown=True)
+    expected = serial.evaluate_dataset(predictions, gold)
+    parallel = DSTEvaluator(vocab, breakdown=True)
+    assert parallel.evaluate_dataset(predictions, gold, workers=2, chunk_size=5) == expected
+    assert breakdown_report(parallel) == breakdown_report(serial)
+    assert set(breakdown_report(serial)['slot_domain']) <= {'hotel', 'restaurant', 'train', 'taxi'}
+
+
+def test_breakdown_slices_match_filtered_evaluation(gold):
+    predictions = make_predictions(gold, seed=7)
+    evaluator = DSTEvaluator(breakdown=True)
+    summary = evaluator.evaluate_dataset(predictions, gold)
+    breakdown = evaluator.metrics.breakdown
+    
+    # Tổng theo turn_bucket / dialogue_type là toàn bộ các turn
+    for dimension in ['turn_bucket', 'dialogue_type']:
+        rows = breakdown.slice(dimension).values()
+        assert sum(row['turns'] for row in rows) == summary['total_turns']
+        joint = sum(row['joint_goal_accuracy'] * row['turns'] for row in rows) / summary['total_turns']
+        assert joint == pytest.approx(summary['joint_goal_accuracy'])
+    
+    # Lát cắt domain = evaluate trên các slot của domain (turn có slot của domain)
+    gold_by_id = {dialogue['dialogue_id']: dialogue for dialogue in gold}
+    for domain, row in breakdown.slice('slot_domain').items():
+        reference = DSTMetrics()
+        for prediction in predictions:
+            gold_states = iter_belief_states(gold_by_id[prediction['dialogue_id']]['turns'])
+            for pred_turn, true_state in zip(prediction['turns'], gold_states):
+                pred = {k: v for k, v in pred_turn['belief_state'].items() if k.startswith(domain + '-')}
+                true = {k: v for k, v in true_state.items() if k.startswith(domain + '-')}
+                if pred or true:
+                    reference.update(pred, true)
+        expected = reference.get_summary()
+        assert row['turns'] == expected['total_turns']
+        for key in ['joint_goal_accuracy', 'slot_accuracy', 'f1_score']:
+            assert row[key] == pytest.approx(expected[key])
+    
+    with pytest.raises(ValueError):
+        breakdown.slice('slot_domain', 'slot_family')
+    
+    # Lát cắt active_domain = evaluate trên các dialogue có domain đó trong `domains`
+    for domain, row in breakdown.slice('active_domain').items():
+        subset = [dialogue for dialogue in gold if domain in dialogue['domains']]
+        expected = DSTEvaluator().evaluate_dataset(predictions, subset)
+        assert row['turns'] == expected['total_turns']
+        assert row['joint_goal_accuracy'] == pytest.approx(expected['joint_goal_accuracy'])
+        assert row['f1_score'] == pytest.approx(expected['f1_score'])
+    assert set(breakdown.slice('active_domain')) == {domain for dialogue in gold for domain in dialogue['domains']}
+
+
+def test_breakdown_on_id_states_needs_vocab(dataset_dirs):
+    from src.utils import DataLoader
+    
+    gold = DataLoader(dataset_dirs['json'], ids=True).load_split('val')
+    with pytest.raises(ValueError, match='vocab'):
+        DSTEvaluator(breakdown=True).evaluate_dataset(make_predictions(gold, seed=6), gold)
+
+
+def delta_predictions(predictions):
+    """Predictions dạng delta (belief_state_delta + slot bị xóa), như output của model"""
+    result = []
+    for prediction in predictions:
+        state, turns = {}, []
+        for turn in prediction['turns']:
+            updates, removed = turn_changes(state, turn)
+            delta_turn = {'belief_state_delta': updates}
+            if removed:
+                delta_turn[REMOVED_KEY] = removed
+            turns.append(delta_turn)
+            state = turn['belief_state']
+        result.append({'dialogue_id': prediction['dialogue_id'], 'turns': turns})
+    return result
+
+
+def is_filled(value):
+    return isinstance(value, str) and value != 'none'
+
+
+def keep(state, gold_filter):
+    if gold_filter is None:
+        return state
+    return {slot: value for slot, value in state.items() if gold_filter(value)}
+
+
+@pytest.mark.parametrize('gold_filter', [None, is_filled])
+@pytest.mark.parametrize('delta_only', [False, True])
+def test_cumulative_matches_full_state_reference(gold, delta_only, gold_filter):
+    predictions = make_predictions(gold, seed=8)
+    filtered_gold = [
+        dict(dialogue, turns=[{'belief_state': keep(state, gold_filter)}
+                              for state in iter_belief_states(dialogue['turns'])])
+        for dialogue in gold
+    ]
+    # Chỉ gold bị lọc, prediction giữ nguyên
+    reference = reference_metrics(predictions, filtered_gold, record_outcomes=True)
+    
+    if delta_only:
+        gold = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in gold]
+    evaluator = DSTEvaluator(record_outcomes=True, cumulative=True, gold_filter=gold_filter)
+    summary = evaluator.evaluate_dataset(delta_predictions(predictions), gold)
+    
+    assert summary['cumulative'] == reference.get_summary()
+    assert evaluator.cumulative.get_per_slot_accuracy() == reference.get_per_slot_accuracy()
+    assert evaluator.cumulative.joint_outcomes == reference.joint_outcomes
+    # Delta metrics: so trực tiếp belief_state_delta từng turn
+    delta_reference = DSTMetrics()
+    gold_by_id = {dialogue['dialogue_id']: dialogue for dialogue in gold}
+    for prediction in delta_predictions(predictions):
+        gold_turns = gold_by_id[prediction['dialogue_id']]['turns']
+        for pred_turn, gold_turn in zip(prediction['turns'], gold_turns):
+            delta_reference.update(pred_turn['belief_state_delta'],
+                                   keep(gold_turn['belief_state_delta'], gold_filter))
+    assert {key: value for key, value in summary.items() if key != 'cumulative'} == delta_reference.get_summary()
+
+
+def test_cumulative_parallel_and_stream_match_serial(gold):
+    predictions = delta_predictions(make_predictions(gold, seed=9))
+    delta_gold = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in gold]
+    
+    serial = DSTEvaluator(record_outcomes=True, cumulative=True, gold_filter=is_filled)
+    expected = serial.evaluate_dataset(predictions, delta_gold)
+    parallel = DSTEvaluator(record_outcomes=True, cumulative=True, gold_filter=is_filled)
+    assert parallel.evaluate_dataset(predictions, delta_gold, workers=2, chunk_size=7) == expected
+    assert parallel.cumulative.get_per_slot_accuracy() == serial.cumulative.get_per_slot_accuracy()
+    assert parallel.cumulative.joint_outcomes == serial.cumulative.joint_outcomes
+    stream = DSTEvaluator(record_outcomes=True, cumulative=True, gold_filter=is_filled)
+    assert stream.evaluate_stream(iter(predictions), delta_gold) == expected
+
+
+def test_parallel_rejects_unpicklable_options(gold):
+    predictions = make_predictions(gold, seed=9)
+    evaluator = DSTEvaluator(gold_filter=lambda value: value != 'none')
+    with pytest.raises(ValueError, match='gold_filter'):
+        evaluator.evaluate_dataset(predictions, gold, workers=2)
+    # Tuần tự thì không cần pickle
+    assert evaluator.evaluate_dataset(predictions, gold) == \
+        DSTEvaluator(gold_filter=is_filled).evaluate_dataset(predictions, gold)
+
+
+def test_gold_filter_in_evaluate_many(gold):
+    predictions = make_predictions(gold, seed=10)
+    evaluator = DSTEvaluator(gold_filter=is_filled)
+    expected = evaluator.evaluate_dataset(predictions, gold)
+    assert evaluator.evaluate_many({'a': predictions}, gold)['a'] == expected
+
+
+@pytest.mark.parametrize('source', ['loader', 'jsonl_split', 'columnar_split', 'dict', 'list',
+                                    'shards_path', 'callable'])
+def test_stream_matches_dataset(dataset_dirs, tmp_path, source):
+    import gzip
+    import json
+    
+    from src.utils import DataLoader
+    
+    gold = DataLoader(dataset_dirs['json']).load_split('test')
+    predictions = make_predictions(gold, seed=11)[::-1] + [{'dialogue_id': 'missing', 'turns': []}]
+    expected = DSTEvaluator(record_outcomes=True).evaluate_dataset(predictions, gold)
+    
+    if source == 'loader':
+        gold_source = DataLoader(dataset_dirs['jsonl'], backend='jsonl')
+        gold_source.load_all()
+    elif source == 'jsonl_split':
+        gold_source = DataLoader(dataset_dirs['jsonl'], backend='jsonl').load_split('test')
+    elif source == 'columnar_split':
+        gold_source = DataLoader(dataset_dirs['columnar'], backend='columnar').load_split('test')
+    elif source == 'dict':
+        gold_source = {dialogue['dialogue_id']: dialogue for dialogue in gold}
+    elif source == 'shards_path':
+        gold_source = str(dataset_dirs['jsonl'] / 'test.shards')
+    elif source == 'callable':
+        gold_source = {dialogue['dialogue_id']: dialogue for dialogue in gold}.get
+    else:
+        gold_source = gold
+    
+    evaluator = DSTEvaluator(record_outcomes=True)
+    assert evaluator.evaluate_stream(iter(predictions), gold_source) == expected
+    
+    # Predictions đọc từ file .jsonl.gz
+    path = tmp_path / 'predictions.jsonl.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for prediction in predictions:
+            f.write(json.dumps(prediction) + '\n')
+    assert DSTEvaluator(record_outcomes=True).evaluate_stream(path, gold_source) == expected
+
+
+def test_stream_rejects_empty_gold_source(dataset_dirs):
+    from src.utils import DataLoader
+    
+    loader = DataLoader(dataset_dirs['json'])
+    predictions = make_predictions(loader.load_split('test'), seed=11)
+    # load_split không gán test_data: loader chưa có split nào để tra
+    with pytest.raises(ValueError, match='load_all'):
+        DSTEvaluator().evaluate_stream(iter(predictions), loader)
+    
+    loader.load_all()
+    with pytest.raises(ValueError, match='None of the'):
+        DSTEvaluator().evaluate_stream(iter(make_predictions(make_dialogues(3, prefix='X'))), loader)
+    assert DSTEvaluator().evaluate_stream(iter([]), loader)['total_turns'] == 0
+
+
+def test_evaluate_many_matches_separate_runs(gold):
+    systems = {
+        'full': make_predictions(gold, seed=12),
+        'noisy': make_predictions(gold, seed=13, drop=0.6, wrong=0.4),
+        # Chỉ có prediction cho một phần dialogues, thứ tự khác gold
+        'partial': make_predictions(gold[::3], seed=14)[::-1],
+    }
+    evaluator = DSTEvaluator(record_outcomes=True)
+    summaries = evaluator.evaluate_many(systems, iter(gold))
+    
+    for name, predictions in systems.items():
+        single = DSTEvaluator(record_outcomes=True)
+        assert summaries[name] == single.evaluate_dataset(predictions, gold)
+        assert evaluator.systems[name].get_per_slot_accuracy() == single.metrics.get_per_slot_accuracy()
+        assert evaluator.systems[name].joint_outcomes == single.metrics.joint_outcomes
+    
+    table = evaluator.comparison_table()
+    assert table['summary'] == summaries
+    with pytest.raises(ValueError):
+        DSTEvaluator(cumulative=True).evaluate_many(systems, gold)
+    
+    # dialogue_id trùng (gold hoặc predictions của một hệ thống) bị từ chối
+    with pytest.raises(ValueError, match='ground truth'):
+        evaluator.evaluate_many(systems, gold + gold[:1])
+    with pytest.raises(ValueError, match='partial'):
+        evaluator.evaluate_many(dict(systems, partial=systems['partial'] * 2), gold)
@@ -0,0 +1,120 @@
+import bz2
+import csv
+import gzip
+import json
+import lzma
+
+import pytest
+
+from conftest import make_dialogues
+from src.belief_state import to_delta_only
+from src.export import shard_path
+from src.utils import DataExporter, DataLoader
+
+
+def reference_csv(data, output_file):
+    """DataExporter.to_csv trước khi export theo chunk"""
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['dialogue_id', 'turn_id', 'speaker', 'utterance', 'belief_state', 'system_response'])
+        for dialogue in data:
+            for turn in dialogue['turns']:
+                writer.writerow([dialogue['dialogue_id'], turn['turn_id'], turn['speaker'], turn['utterance'],
+                                 json.dumps(turn.get('belief_state', {})), turn.get('system_response', '')])
+
+
+def reference_text(data, output_file):
+    """DataExporter.to_text trước khi export theo chunk"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for dialogue in data:
+            f.write(f"=== {dialogue['dialogue_id']} ===\n")
+            f.write(f"Domains: {', '.join(dialogue.get('domains', []))}\n\n")
+            for turn in dialogue['turns']:
+                f.write(f"[Turn {turn['turn_id']}]\n")
+                f.write(f"User: {turn['utterance']}\n")
+                if turn.get('belief_state'):
+                    f.write(f"Belief: {turn['belief_state']}\n")
+                if turn.get('system_response'):
+                    f.write(f"System: {turn['system_response']}\n")
+                f.write("\n")
+            f.write("\n" + "=" * 80 + "\n\n")
+
+
+@pytest.fixture(scope='module')
+def expected(dataset_dirs, tmp_path_factory):
+    root = tmp_path_factory.mktemp('reference')
+    dialogues = DataLoader(dataset_dirs['json']).load_split('train')
+    reference_csv(dialogues, root / 'train.csv')
+    reference_text(dialogues, root / 'train.txt')
+    return {'csv': (root / 'train.csv').read_bytes(), 'text': (root / 'train.txt').read_bytes()}
+
+
+def sources(dataset_dirs):
+    dialogues = DataLoader(dataset_dirs['json']).load_split('train')
+    return {
+        'dict': dialogues,
+        'records': DataLoader(dataset_dirs['json'], records=True).load_split('train'),
+        'columnar': DataLoader(dataset_dirs['columnar'], backend='columnar').load_split('train'),
+        'jsonl': iter(DataLoader(dataset_dirs['jsonl'], backend='jsonl').load_split('train')),
+        'delta_only': (dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in dialogues),
+    }
+
+
+def export(kind, data, path, **options):
+    if kind == 'csv':
+        DataExporter.to_csv(data, path, **options)
+    else:
+        DataExporter.to_text(data, path, **options)
+    return path
+
+
+@pytest.mark.parametrize('kind', ['csv', 'text'])
+@pytest.mark.parametrize('source', ['dict', 'records', 'columnar', 'jsonl', 'delta_only'])
+def test_default_output_matches_previous_exporter(dataset_dirs, expected, tmp_path, kind, source):
+    data = sources(dataset_dirs)[source]
+    assert export(kind, data, tmp_path / 'out', chunk_size=7).read_bytes() == expected[kind]
+
+
+@pytest.mark.parametrize('kind', ['csv', 'text'])
+def test_workers_and_compression(dataset_dirs, expected, tmp_path, kind):
+    dialogues = sources(dataset_dirs)['dict']
+    assert export(kind, dialogues, tmp_path / 'out', chunk_size=3, workers=2).read_bytes() == expected[kind]
+    for compress, opener in [('gzip', gzip.open), ('bz2', bz2.open), ('xz', lzma.open)]:
+        path = export(kind, dialogues, tmp_path / f'out.{compress}', chunk_size=5, compress=compress,
+                      workers=2 if compress == 'xz' else 1)
+        with opener(path, 'rb') as f:
+            assert f.read() == expected[kind]
+
+
+def test_shards_split_chunks_round_robin(dataset_dirs, expected, tmp_path):
+    dialogues = sources(dataset_dirs)['dict']
+    export('csv', dialogues, tmp_path / 'out.csv', chunk_size=4, num_shards=3)
+    header, _, _ = expected['csv'].partition(b'\r\n')
+    
+    rows = []
+    for shard in range(3):
+        lines = shard_path(tmp_path / 'out.csv', shard).read_bytes().split(b'\r\n')
+        assert lines[0] == header
+        rows.append(lines[1:-1])
+    assert sorted(sum(rows, [])) == sorted(expected['csv'].split(b'\r\n')[1:-1])
+    
+    # Chunk i (4 dialogues) vào shard i % 3
+    first = {row.split(b',')[0] for row in rows[1]}
+    assert first == {dialogue['dialogue_id'].encode() for dialogue in dialogues[4:8] + dialogues[16:20]
+                     + dialogues[28:32]}
+
+
+def test_column_projection(tmp_path):
+    dialogues = make_dialogues(10)
+    export('csv', dialogues, tmp_path / 'full.csv')
+    export('csv', dialogues, tmp_path / 'some.tsv', columns=['utterance', 'dialogue_id'], delimiter='\t')
+    
+    with open(tmp_path / 'full.csv', newline='', encoding='utf-8') as f:
+        full = list(csv.DictReader(f))
+    with open(tmp_path / 'some.tsv', newline='', encoding='utf-8') as f:
+        some = list(csv.DictReader(f, delimiter='\t'))
+    assert some == [{'utterance': row['utterance'], 'dialogue_id': row['dialogue_id']} for row in full]
+    assert list(some[0]) == ['utterance', 'dialogue_id']
+    
+    with pytest.raises(ValueError):
+        export('csv', dialogues, tmp_path / 'bad.csv', columns=['belief'])
@@ -0,0 +1,85 @@
+import pytest
+
+from conftest import SLOTS, make_dialogues
+from src.belief_state import to_delta_only
+from src.inverted_index import SplitIndex, difference, intersect, union
+from src.utils import DataLoader
+
+
+@pytest.fixture(scope='module')
+def loaders(dataset_dirs):
+    result = {}
+    for backend in ['json', 'jsonl']:
+        loader = DataLoader(dataset_dirs[backend], backend=backend)
+        loader.load_all(use_snapshot=False)
+        result[backend] = loader
+    return result
+
+
+@pytest.mark.parametrize('domain', ['hotel', 'restaurant', 'train', 'taxi'])
+def test_dialogues_by_domain_match_across_backends(loaders, domain):
+    results = {
+        backend: [dialogue['dialogue_id'] for dialogue in loader.get_dialogues_by_domain(domain)]
+        for backend, loader in loaders.items()
+    }
+    assert results['json'] == results['jsonl']
+    assert results['json']
+    for dialogue in loaders['jsonl'].get_dialogues_by_domain(domain):
+        assert domain in dialogue['domains']
+
+
+def test_get_turns_match_across_backends(loaders):
+    results = {}
+    for backend, loader in loaders.items():
+        turns = loader.get_index('train').turns_with_slot('hotel-area', cumulative=True)
+        results[backend] = [
+            (dialogue['dialogue_id'], turn['turn_id']) for dialogue, turn in loader.get_turns(turns)
+        ]
+        for dialogue, turn in loader.get_turns(turns):
+            assert 'hotel-area' in loader.belief_states(dialogue)[turn['turn_id']]
+    assert results['json'] == results['jsonl']
+    assert results['json']
+
+
+def brute_force(dialogues, key, matches):
+    """Turns (đánh số toàn cục) có turn[key] thỏa matches, duyệt trực tiếp"""
+    turns, number = [], 0
+    for dialogue in dialogues:
+        for turn in dialogue['turns']:
+            if matches(turn[key]):
+                turns.append(number)
+            number += 1
+    return turns
+
+
+@pytest.mark.parametrize('delta_only', [False, True])
+def test_postings_match_brute_force(delta_only):
+    dialogues = make_dialogues(50, seed=11)
+    data = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in dialogues] \
+        if delta_only else dialogues
+    index = SplitIndex(data)
+    
+    for slot in SLOTS:
+        for key, cumulative in [('belief_state_delta', False), ('belief_state', True)]:
+            assert index.turns_with_slot(slot, cumulative).tolist() == \
+                brute_force(dialogues, key, lambda state: slot in state)
+            assert index.turns_with_value(slot, 'dontcare', cumulative).tolist() == \
+                brute_force(dialogues, key, lambda state: state.get(slot) == 'dontcare')
+            assert index.turns_where(slot, lambda value: ':' in value, cumulative).tolist() == \
+                brute_force(dialogues, key, lambda state: ':' in state.get(slot, ''))
+    
+    area = index.turns_with_slot('hotel-area', cumulative=True)
+    day = index.turns_with_slot('hotel-day', cumulative=True)
+    assert intersect(area, day).tolist() == sorted(set(area.tolist()) & set(day.tolist()))
+    assert union(area, day).tolist() == sorted(set(area.tolist()) | set(day.tolist()))
+    assert difference(area, day).tolist() == sorted(set(area.tolist()) - set(day.tolist()))
+    
+    hotel = index.dialogues_with_domain('hotel')
+    assert hotel.tolist() == [i for i, dialogue in enumerate(dialogues) if 'hotel' in dialogue['domains']]
+    hotel_turns = index.dialogue_turns(hotel)
+    assert index.turns_to_dialogues(hotel_turns).tolist() == hotel.tolist()
+    for turn in hotel_turns.tolist():
+        position, turn_index = index.turn_location(turn)
+        assert position in hotel
+        assert turn_index < len(dialogues[position]['turns'])
+    assert len(hotel_turns) == sum(len(dialogues[i]['turns']) for i in hotel.tolist())
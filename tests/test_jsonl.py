@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import make_dialogues, write_split
+from src.storage.jsonl import ShardedJsonlSplit
+
+
+def test_iteration_follows_index_order(tmp_path):
+    dialogues = make_dialogues(25)
+    write_split(tmp_path, 'test', dialogues, 'jsonl', num_shards=4)
+    split = ShardedJsonlSplit(tmp_path / 'test.shards')
+    
+    expected = [dialogue['dialogue_id'] for dialogue in dialogues]
+    assert [dialogue['dialogue_id'] for dialogue in split] == expected
+    assert [split[i]['dialogue_id'] for i in range(len(split))] == expected
+    assert list(split) == dialogues
+
+
+def test_iter_shards_streams_every_dialogue(tmp_path):
+    dialogues = make_dialogues(10)
+    write_split(tmp_path, 'test', dialogues, 'jsonl', num_shards=3)
+    split = ShardedJsonlSplit(tmp_path / 'test.shards')
+    
+    ids = [dialogue['dialogue_id'] for dialogue in split.iter_shards()]
+    assert sorted(ids) == sorted(dialogue['dialogue_id'] for dialogue in dialogues)
+    assert ids[:4] == [dialogues[i]['dialogue_id'] for i in (0, 3, 6, 9)]
+
+
+def test_find_reads_one_dialogue(tmp_path):
+    dialogues = make_dialogues(7)
+    write_split(tmp_path, 'test', dialogues, 'jsonl', num_shards=2)
+    split = ShardedJsonlSplit(tmp_path / 'test.shards')
+    
+    assert split.find(dialogues[5]['dialogue_id']) == dialogues[5]
+    assert split.find('missing') is None
+
+
+def test_handles_closed_by_context_manager(tmp_path, dataset_dirs):
+    from src.utils import DataLoader
+    
+    dialogues = make_dialogues(7)
+    write_split(tmp_path, 'test', dialogues, 'jsonl', num_shards=2)
+    with ShardedJsonlSplit(tmp_path / 'test.shards') as split:
+        assert split[3] == dialogues[3]
+        handles = list(split._handles.values())
+    assert handles and all(handle.closed for handle in handles)
+    assert split._handles == {}
+    
+    with DataLoader(dataset_dirs['jsonl'], backend='jsonl') as loader:
+        loader.load_all()
+        assert loader.get_dialogue('TE0001.json') is not None
+        handles = list(loader.test_data._handles.values())
+    assert handles and all(handle.closed for handle in handles)
+
+
+def test_writer_rejects_duplicate_dialogue_ids(tmp_path):
+    dialogues = make_dialogues(3)
+    with pytest.raises(ValueError, match='Duplicate dialogue_id'):
+        write_split(tmp_path, 'test', dialogues + [dialogues[1]], 'jsonl')
@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import make_dialogues
+from src.utils import DataLoader
+
+
+def scan(loader, dialogue_id, split=None):
+    """(split, position) tra cứu tuyến tính (cách cũ) để so sánh"""
+    for name in ([split] if split else DataLoader.SPLITS):
+        for position, dialogue in enumerate(getattr(loader, f"{name}_data")):
+            if dialogue['dialogue_id'] == dialogue_id:
+                return name, position
+    return None
+
+
+def found(loader, dialogue):
+    """(split, position) của dialogue trả về (view columnar tạo mới mỗi lần truy cập)"""
+    return None if dialogue is None else scan(loader, dialogue['dialogue_id'])
+
+
+@pytest.mark.parametrize('backend', ['json', 'jsonl', 'columnar'])
+def test_get_dialogue_matches_linear_scan(dataset_dirs, backend):
+    loader = DataLoader(dataset_dirs[backend], backend=backend)
+    loader.load_all(use_snapshot=False)
+    
+    for split in DataLoader.SPLITS:
+        for position, dialogue in enumerate(getattr(loader, f"{split}_data")):
+            dialogue_id = dialogue['dialogue_id']
+            assert loader.locate(dialogue_id) == (split, position)
+            assert found(loader, loader.get_dialogue(dialogue_id)) == scan(loader, dialogue_id)
+            assert found(loader, loader.get_dialogue(dialogue_id, split)) == (split, position)
+    
+    ids = ['TE0003.json', 'missing', 'TR0001.json']
+    assert [found(loader, dialogue) for dialogue in loader.get_dialogues(ids)] == \
+        [scan(loader, dialogue_id) for dialogue_id in ids]
+    assert loader.get_dialogue('TR0001.json', 'test') is None
+    assert len(loader.dialogue_index()) == 70
+
+
+def test_index_rebuilt_after_reload(dataset_dirs):
+    loader = DataLoader(dataset_dirs['json'])
+    loader.load_all(use_snapshot=False)
+    assert loader.get_dialogue('TE0000.json') is not None
+    
+    loader.test_data = make_dialogues(3, prefix='X')
+    assert loader.get_dialogue('TE0000.json') is None
+    assert loader.get_dialogue('X0002.json') == loader.test_data[2]
+    
+    # Sửa list tại chỗ (append / remove) cũng làm index được dựng lại
+    extra = make_dialogues(1, prefix='Y')[0]
+    loader.test_data.append(extra)
+    assert loader.locate('Y0000.json') == ('test', 3)
+    loader.test_data.pop(0)
+    assert loader.get_dialogue('X0000.json') is None
+    assert loader.locate('Y0000.json') == ('test', 2)
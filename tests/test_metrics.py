@@ -0,0 +1,89 @@
+import random
+
+import numpy as np
+import pytest
+
+from src.evaluation.metrics import DSTMetrics, encode_state_matrices
+from src.vocab import Vocab
+
+
+SLOTS = ['hotel-area', 'hotel-day', 'train-day', 'taxi-leaveat', 'restaurant-food']
+VALUES = ['centre', 'north', 'monday', 'friday', '17:15', None]
+
+
+def random_state(rng):
+    return {slot: rng.choice(VALUES) for slot in rng.sample(SLOTS, rng.randint(0, 4))}
+
+
+def random_pairs(num_turns, seed=0):
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(num_turns):
+        gold = random_state(rng)
+        predicted = dict(gold) if rng.random() < 0.4 else random_state(rng)
+        pairs.append((predicted, gold))
+    return pairs
+
+
+def comparable(metrics: DSTMetrics):
+    outcomes = {name: values.tolist() for name, values in metrics.turn_outcomes().items()}
+    return metrics.get_summary(), metrics.get_per_slot_accuracy(), outcomes
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_update_batch_matches_update(seed):
+    pairs = random_pairs(300, seed)
+    scalar = DSTMetrics(record_outcomes=True)
+    for predicted, gold in pairs:
+        scalar.update(predicted, gold)
+    
+    vocab = Vocab()
+    batched = DSTMetrics(record_outcomes=True)
+    for start in range(0, len(pairs), 64):
+        chunk = pairs[start:start + 64]
+        matrices = encode_state_matrices(vocab, [p for p, _ in chunk], [g for _, g in chunk])
+        batched.update_batch(*matrices, slots=[vocab.slot(i) for i in range(vocab.num_slots)])
+    assert comparable(batched) == comparable(scalar)
+
+
+def test_update_batch_with_mask_and_3d_input():
+    pairs = random_pairs(12, seed=9)
+    vocab = Vocab()
+    predicted, gold = encode_state_matrices(vocab, [p for p, _ in pairs], [g for _, g in pairs])
+    mask = np.array([True] * 10 + [False] * 2)
+    
+    batched = DSTMetrics(vocab)
+    batched.update_batch(predicted.reshape(3, 4, -1), gold.reshape(3, 4, -1), mask.reshape(3, 4))
+    scalar = DSTMetrics()
+    for p, g in pairs[:10]:
+        scalar.update(p, g)
+    assert batched.get_summary() == scalar.get_summary()
+    # Cột -> slot id -> tên slot qua vocab
+    assert batched.get_per_slot_accuracy() == scalar.get_per_slot_accuracy()
+
+
+def test_update_batch_needs_slot_names():
+    pairs = random_pairs(20, seed=3)
+    vocab = Vocab()
+    predicted, gold = encode_state_matrices(vocab, [p for p, _ in pairs], [g for _, g in pairs])
+    
+    metrics = DSTMetrics()
+    with pytest.raises(ValueError, match='slot names'):
+        metrics.update_batch(predicted, gold)
+    assert metrics.total_turns == 0
+    with pytest.raises(ValueError):
+        metrics.update_batch(predicted, gold, slots=['hotel-area'])
+    metrics.update_batch(predicted, gold, slots=[vocab.slot(i) for i in range(vocab.num_slots)])
+    assert set(metrics.get_per_slot_accuracy()) <= set(SLOTS)
+
+
+def test_update_batch_with_empty_vocab():
+    vocab = Vocab()
+    metrics = DSTMetrics(vocab, record_outcomes=True)
+    metrics.update_batch(*encode_state_matrices(vocab, [{}, {}], [{}, {}]))
+    
+    scalar = DSTMetrics(record_outcomes=True)
+    scalar.update({}, {})
+    scalar.update({}, {})
+    assert comparable(metrics) == comparable(scalar)
+    assert metrics.get_joint_goal_accuracy() == 1.0
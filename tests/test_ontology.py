@@ -0,0 +1,63 @@
+import json
+
+from src.ontology import OntologyIndex
+from src.utils import DataLoader
+
+
+FLAT = {
+    'hotel-area': ['centre', 'north', 'centre|west'],
+    'hotel-book day': ['monday', 'friday'],
+    'hotel-pricerange': ['cheap', 'cheap>moderate', 'Expensive '],
+    'train-arriveBy': ['17:15', '19:00'],
+}
+NESTED = {
+    'hotel': {'semi': {'area': ['centre', 'north', 'centre|west'],
+                       'pricerange': ['cheap', 'cheap>moderate', 'Expensive ']},
+              'book': {'day': ['monday', 'friday']}},
+    'train': {'semi': {'arriveby': ['17:15', '19:00']}},
+}
+
+
+def test_flat_ontology_lookups():
+    index = OntologyIndex(FLAT)
+    assert index.get_slot_values('hotel-day') == ('monday', 'friday')
+    assert index.get_slot_values('hotel-book day') == ('monday', 'friday')
+    assert index.get_slot_values('train-arriveby') == ('17:15', '19:00')
+    assert index.get_slot_values('taxi-leaveat') == ()
+    
+    assert index.compounds == {'centre|west': ('any', ('centre', 'west')),
+                               'cheap>moderate': ('changed', ('cheap', 'moderate'))}
+    assert index.slots_for_value('west') == {'hotel-area'}
+    assert index.slots_for_value('cheap') == {'hotel-pricerange'}
+    assert index.normalize('hotel-pricerange', 'expensive') == 'Expensive '
+    assert index.normalize('hotel-pricerange', ' CHEAP') == 'cheap'
+    assert index.is_valid('hotel-area', 'north|west')
+    assert not index.is_valid('hotel-area', 'south')
+    assert index.slot_family('hotel-day') == 'book'
+    assert index.slot_family('hotel-area') == 'semi'
+    assert index.slot_family('hotel-booked') == 'book'
+
+
+def test_nested_ontology_compiles_like_flat():
+    flat, nested = OntologyIndex(FLAT), OntologyIndex(NESTED)
+    assert set(nested.slots) == set(flat.slots)
+    for slot in flat.slots:
+        assert nested.get_slot_values(slot) == flat.get_slot_values(slot)
+        assert nested.slot_family(slot) == flat.slot_family(slot)
+    assert nested.value_slots == flat.value_slots
+    assert nested.normalized == flat.normalized
+
+
+def test_cached_index_and_loader(tmp_path):
+    with open(tmp_path / 'ontology.json', 'w', encoding='utf-8') as f:
+        json.dump(FLAT, f)
+    
+    compiled = OntologyIndex.load(tmp_path / 'ontology.json', tmp_path / '.cache')
+    cached = OntologyIndex.load(tmp_path / 'ontology.json', tmp_path / '.cache')
+    assert (tmp_path / '.cache' / 'ontology_index.pkl').exists()
+    assert cached.values == compiled.values
+    assert cached.value_slots == compiled.value_slots
+    
+    loader = DataLoader(tmp_path)
+    assert loader.get_slot_values('hotel-book day') == ['monday', 'friday']
+    assert loader.get_slot_values('restaurant-food') == []
@@ -0,0 +1,145 @@
+import json
+import random
+import sys
+
+import pytest
+
+from conftest import ONTOLOGY, WORDS, project_root
+
+sys.path.insert(0, str(project_root / 'scripts'))
+from preprocess_multiwoz24 import MultiWOZ24Preprocessor
+
+
+RAW_SLOTS = {
+    'hotel': {'book': ['day', 'people'], 'semi': ['area', 'pricerange']},
+    'restaurant': {'book': ['time'], 'semi': ['food']},
+    'train': {'book': [], 'semi': ['day', 'destination']},
+    'taxi': {'book': [], 'semi': ['leaveAt']},
+}
+RAW_VALUES = ['cheap', 'centre', 'monday', '17:15', 'cambridge', 'italian', 'dontcare', '',
+              'not mentioned', 'none']
+
+
+def make_raw_dialogue(rng: random.Random):
+    """Một dialogue dạng data.json gốc (log user / system, metadata ở turn system)"""
+    active = rng.sample(list(RAW_SLOTS), rng.randint(1, 3))
+    goal = {domain: ({'info': {'x': 'y'}, 'reqt': []} if domain in active else {}) for domain in RAW_SLOTS}
+    goal['message'] = []
+    state = {
+        domain: {'book': {slot: '' for slot in slots['book']} | {'booked': []},
+                 'semi': {slot: 'not mentioned' for slot in slots['semi']}}
+        for domain, slots in RAW_SLOTS.items()
+    }
+    log = []
+    for _ in range(rng.randint(1, 8)):
+        log.append({'text': ' '.join(rng.choices(WORDS, k=rng.randint(1, 12))) + ' ', 'metadata': {}})
+        for _ in range(rng.randint(0, 3)):
+            domain = rng.choice(active)
+            slot_type = rng.choice(['book', 'semi'])
+            if RAW_SLOTS[domain][slot_type]:
+                state[domain][slot_type][rng.choice(RAW_SLOTS[domain][slot_type])] = rng.choice(RAW_VALUES)
+        if rng.random() < 0.2:
+            state[active[0]]['book']['booked'] = [{'name': 'x'}]
+        log.append({'text': ' '.join(rng.choices(WORDS, k=rng.randint(1, 12))),
+                    'metadata': json.loads(json.dumps(state))})
+    return {'goal': goal, 'log': log}
+
+
+def write_raw(raw_dir, num_dialogues: int = 60, seed: int = 0):
+    """Thư mục dữ liệu gốc: data.json, ontology.json, valListFile.json, testListFile.json"""
+    rng = random.Random(seed)
+    data = {f"SNG{k:04d}.json": make_raw_dialogue(rng) for k in range(num_dialogues)}
+    ids = list(data)
+    rng.shuffle(ids)
+    
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    with open(raw_dir / 'data.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    with open(raw_dir / 'ontology.json', 'w', encoding='utf-8') as f:
+        json.dump(ONTOLOGY, f)
+    (raw_dir / 'valListFile.json').write_text('\n'.join(ids[:6]) + '\n')
+    (raw_dir / 'testListFile.json').write_text('\n'.join(ids[6:12]) + '\n')
+    return data
+
+
+def run(raw_dir, output_dir, stream=False, workers=1, incremental=False, **options):
+    MultiWOZ24Preprocessor(raw_dir, output_dir, **options).process_all(
+        stream=stream, workers=workers, incremental=incremental)
+    return output_dir
+
+
+def read_outputs(output_dir):
+    """{path tương đối: bytes} của mọi file output (trừ cache)"""
+    return {
+        str(path.relative_to(output_dir)): path.read_bytes()
+        for path in sorted(output_dir.rglob('*'))
+        if path.is_file() and '.cache' not in path.parts
+    }
+
+
+OPTIONS = [
+    {},
+    {'output_format': 'jsonl', 'num_shards': 3, 'compress': True},
+    {'output_format': 'columnar', 'use_vocab': True},
+    {'use_vocab': True, 'delta_only': True},
+]
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+@pytest.mark.parametrize('stream, workers', [(True, 1), (False, 2), (True, 2)])
+def test_stream_and_workers_match_in_memory(tmp_path, options, stream, workers):
+    write_raw(tmp_path / 'raw')
+    expected = read_outputs(run(tmp_path / 'raw', tmp_path / 'serial', **options))
+    assert read_outputs(run(tmp_path / 'raw', tmp_path / 'out', stream, workers, **options)) == expected
+
+
+def test_incremental_rewrites_only_changed_splits(tmp_path):
+    data = write_raw(tmp_path / 'raw')
+    output_dir = run(tmp_path / 'raw', tmp_path / 'out', incremental=True)
+    assert read_outputs(output_dir) == read_outputs(run(tmp_path / 'raw', tmp_path / 'full'))
+    
+    # Đổi một dialogue của val: chỉ val.json / val_stats.json được ghi lại
+    val_ids = (tmp_path / 'raw' / 'valListFile.json').read_text().split()
+    data[val_ids[0]]['log'][0]['text'] = 'changed utterance'
+    with open(tmp_path / 'raw' / 'data.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    
+    mtimes = {path.name: path.stat().st_mtime_ns for path in output_dir.glob('*.json')}
+    run(tmp_path / 'raw', output_dir, workers=2, incremental=True)
+    changed = {path.name for path in output_dir.glob('*.json') if path.stat().st_mtime_ns != mtimes[path.name]}
+    
+    assert {'train.json', 'test.json', 'train_stats.json', 'test_stats.json'}.isdisjoint(changed)
+    assert {'val.json', 'val_stats.json'} <= changed
+    assert read_outputs(output_dir) == read_outputs(run(tmp_path / 'raw', tmp_path / 'fresh'))
+
+
+def test_vocab_output_decodes_to_plain_output(tmp_path):
+    from src.utils import DataLoader
+    
+    write_raw(tmp_path / 'raw')
+    plain_loader = DataLoader(run(tmp_path / 'raw', tmp_path / 'plain'))
+    vocab_dir = run(tmp_path / 'raw', tmp_path / 'vocab', use_vocab=True)
+    id_loader = DataLoader(vocab_dir, ids=True)
+    
+    for split in ['train', 'val', 'test']:
+        expected = plain_loader.load_split(split)
+        assert DataLoader(vocab_dir).load_split(split) == expected
+        decoded = [
+            [id_loader.vocab.decode_state(turn['belief_state']) for turn in dialogue['turns']]
+            for dialogue in id_loader.load_split(split)
+        ]
+        assert decoded == [[turn['belief_state'] for turn in dialogue['turns']] for dialogue in expected]
+
+
+def test_delta_only_output_reconstructs_full_states(tmp_path):
+    from src.belief_state import iter_belief_states
+    from src.utils import DataLoader
+    
+    write_raw(tmp_path / 'raw')
+    full = DataLoader(run(tmp_path / 'raw', tmp_path / 'full'))
+    delta_only = DataLoader(run(tmp_path / 'raw', tmp_path / 'delta', delta_only=True))
+    
+    for split in ['train', 'val', 'test']:
+        for expected, dialogue in zip(full.load_split(split), delta_only.load_split(split)):
+            assert list(iter_belief_states(dialogue['turns'])) == \
+                [turn['belief_state'] for turn in expected['turns']]
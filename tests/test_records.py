@@ -0,0 +1,58 @@
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+from src.records import Dialogue, FrozenState
+
+
+def test_pickled_state_rehashes_in_new_process():
+    state = FrozenState.from_dict({'hotel-area': 'centre', 'hotel-day': 'monday'})
+    hash(state)
+    payload = pickle.dumps(state)
+    
+    project_root = Path(__file__).parent.parent
+    script = (
+        "import pickle, sys\n"
+        f"sys.path.insert(0, {str(project_root)!r})\n"
+        "from src.records import FrozenState\n"
+        "loaded = pickle.loads(sys.stdin.buffer.read())\n"
+        "fresh = FrozenState.from_dict({'hotel-area': 'centre', 'hotel-day': 'monday'})\n"
+        "assert loaded == fresh\n"
+        "assert loaded in {fresh} and fresh in {loaded}\n"
+        "assert loaded._keys is fresh._keys\n"
+    )
+    # PYTHONHASHSEED khác để hash của str chắc chắn khác process hiện tại
+    env = {'PYTHONHASHSEED': '12345'}
+    subprocess.run([sys.executable, '-c', script], input=payload, env=env, check=True)
+
+
+def test_unpickled_state_shares_keys():
+    state = FrozenState.from_dict({'train-day': 'friday'})
+    loaded = pickle.loads(pickle.dumps(state))
+    assert loaded == state
+    assert loaded._keys is state._keys
+    assert hash(loaded) == hash(state)
+
+
+def test_dialogue_record_roundtrip():
+    dialogue = {
+        'dialogue_id': 'D0.json',
+        'domains': ['hotel'],
+        'turns': [{'turn_id': 0, 'speaker': 'user', 'utterance': 'hi',
+                   'belief_state': {'hotel-area': 'north'},
+                   'belief_state_delta': {'hotel-area': 'north'}, 'system_response': ''}]
+    }
+    record = pickle.loads(pickle.dumps(Dialogue.from_dict(dialogue)))
+    assert record['turns'][0]['belief_state'] == {'hotel-area': 'north'}
+    assert record['turns'][0]['belief_state'] in {FrozenState.from_dict({'hotel-area': 'north'})}
+
+
+def test_loaded_records_equal_plain_dialogues(dataset_dirs):
+    from src.utils import DataLoader
+    
+    expected = DataLoader(dataset_dirs['json']).load_split('train')
+    for backend in ['json', 'jsonl']:
+        records = DataLoader(dataset_dirs[backend], backend=backend, records=True).load_split('train')
+        assert list(records) == expected
+        assert all(isinstance(dialogue, Dialogue) for dialogue in records)
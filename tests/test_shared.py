@@ -0,0 +1,53 @@
+from multiprocessing import Pool
+
+import pytest
+
+from conftest import make_dialogues, plain
+from src.belief_state import to_delta_only
+from src.storage.shared import SharedSplit, attach_split
+from src.utils import DataLoader
+
+
+# Split attach trong worker process (qua initializer)
+_split = None
+
+
+def _init_worker(handle):
+    global _split
+    _split = attach_split(handle)
+
+
+def _read_dialogue(position):
+    return plain(_split[position])
+
+
+def test_published_split_matches_source():
+    dialogues = make_dialogues(20, seed=16)
+    with SharedSplit.publish(dialogues) as shared:
+        assert [plain(dialogue) for dialogue in shared.split] == dialogues
+        assert plain(attach_split(shared.handle)[7]) == dialogues[7]
+        assert shared.handle['arena'][0] % 64 == 0
+        assert all(offset % 64 == 0 for offset, _ in shared.handle['arrays'].values())
+
+
+def test_delta_only_split_is_published_with_full_states():
+    dialogues = make_dialogues(15, seed=17)
+    delta_only = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in dialogues]
+    with SharedSplit.publish(delta_only) as shared:
+        assert [plain(dialogue) for dialogue in shared.split] == dialogues
+
+
+def test_workers_read_shared_split(dataset_dirs):
+    loader = DataLoader(dataset_dirs['columnar'], backend='columnar')
+    loader.load_all()
+    expected = DataLoader(dataset_dirs['json']).load_split('test')
+    
+    with loader.share_split('test') as shared:
+        with Pool(2, initializer=_init_worker, initargs=(shared.handle,)) as pool:
+            assert pool.map(_read_dialogue, range(len(expected))) == expected
+        # Worker thoát không unlink khối shared memory
+        assert plain(attach_split(shared.handle)[0]) == expected[0]
+        handle = shared.handle
+    
+    with pytest.raises(FileNotFoundError):
+        attach_split(handle)
@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+import pytest
+
+from conftest import make_dialogues, make_predictions
+from src.evaluation.metrics import DSTEvaluator
+from src.evaluation.significance import (bootstrap_accuracy, bootstrap_ratio, compare,
+                                         confidence_intervals, paired_bootstrap,
+                                         permutation_test, sign_test)
+
+
+RESAMPLES = 4000
+
+
+@pytest.fixture(scope='module')
+def outcomes():
+    rng = np.random.default_rng(0)
+    n = 600
+    hits_a = rng.random(n) < 0.62
+    # b đồng thuận với a phần lớn các turn
+    hits_b = np.where(rng.random(n) < 0.8, hits_a, rng.random(n) < 0.55)
+    totals = rng.integers(0, 8, n)
+    correct = rng.binomial(totals, 0.9)
+    return hits_a, hits_b, correct, totals
+
+
+def naive_interval(statistic, n, seed=1):
+    """Bootstrap percentile bằng resample chỉ số từng turn"""
+    rng = np.random.default_rng(seed)
+    samples = [statistic(rng.integers(0, n, n)) for _ in range(RESAMPLES)]
+    return np.quantile(samples, [0.025, 0.975])
+
+
+def assert_close(interval, naive, tolerance=0.012):
+    assert interval['lower'] == pytest.approx(naive[0], abs=tolerance)
+    assert interval['upper'] == pytest.approx(naive[1], abs=tolerance)
+
+
+def test_bootstrap_intervals_match_naive_resampling(outcomes):
+    hits_a, hits_b, correct, totals = outcomes
+    n = len(hits_a)
+    
+    interval = bootstrap_accuracy(hits_a, RESAMPLES, seed=0)
+    assert interval['estimate'] == hits_a.mean()
+    assert_close(interval, naive_interval(lambda idx: hits_a[idx].mean(), n))
+    
+    interval = bootstrap_ratio(correct, totals, RESAMPLES, seed=0)
+    assert interval['estimate'] == correct.sum() / totals.sum()
+    assert_close(interval, naive_interval(lambda idx: correct[idx].sum() / totals[idx].sum(), n))
+    
+    interval = paired_bootstrap(hits_a, hits_b, RESAMPLES, seed=0)
+    assert interval['estimate'] == pytest.approx(hits_a.mean() - hits_b.mean())
+    assert_close(interval, naive_interval(lambda idx: hits_a[idx].mean() - hits_b[idx].mean(), n))
+
+
+def test_permutation_test_matches_naive_swaps(outcomes):
+    hits_a, hits_b, _, _ = outcomes
+    rng = np.random.default_rng(2)
+    observed = abs(hits_a.sum() - hits_b.sum())
+    extreme = 0
+    for _ in range(RESAMPLES):
+        swap = rng.random(len(hits_a)) < 0.5
+        a = np.where(swap, hits_b, hits_a)
+        b = np.where(swap, hits_a, hits_b)
+        extreme += abs(int(a.sum()) - int(b.sum())) >= observed
+    naive = (extreme + 1) / (RESAMPLES + 1)
+    assert permutation_test(hits_a, hits_b, RESAMPLES, seed=0) == pytest.approx(naive, abs=0.02)
+    assert permutation_test(hits_a, hits_a) == 1.0
+
+
+def test_sign_test_is_exact(outcomes):
+    hits_a, hits_b, _, _ = outcomes
+    only_a = int((hits_a & ~hits_b).sum())
+    only_b = int((~hits_a & hits_b).sum())
+    d = only_a + only_b
+    tail = sum(math.comb(d, k) for k in range(min(only_a, only_b) + 1)) / 2 ** d
+    assert sign_test(hits_a, hits_b) == pytest.approx(min(1.0, 2 * tail), rel=1e-9)
+    assert sign_test([True, False], [False, True]) == 1.0
+    with pytest.raises(ValueError):
+        sign_test([True], [True, False])
+
+
+def test_recorded_outcomes_feed_the_statistics():
+    gold = make_dialogues(40, seed=18)
+    evaluator = DSTEvaluator(record_outcomes=True)
+    systems = {'a': make_predictions(gold, seed=1), 'b': make_predictions(gold, seed=2, drop=0.5)}
+    summaries = evaluator.evaluate_many(systems, gold)
+    a, b = evaluator.systems['a'], evaluator.systems['b']
+    
+    intervals = confidence_intervals(a, RESAMPLES, seed=0)
+    assert intervals['joint_goal_accuracy']['estimate'] == pytest.approx(summaries['a']['joint_goal_accuracy'])
+    assert intervals['slot_accuracy']['estimate'] == pytest.approx(summaries['a']['slot_accuracy'])
+    
+    result = compare(a, b, RESAMPLES, seed=0)
+    assert result['num_turns'] == summaries['a']['total_turns']
+    assert result['difference']['estimate'] == pytest.approx(
+        summaries['a']['joint_goal_accuracy'] - summaries['b']['joint_goal_accuracy'])
+    with pytest.raises(ValueError):
+        confidence_intervals(DSTEvaluator().metrics)
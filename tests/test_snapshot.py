@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from conftest import make_dialogues, write_dataset
+from src.utils import DataLoader
+
+
+def load(data_dir, **options):
+    loader = DataLoader(data_dir, **options)
+    loader.load_all()
+    return loader
+
+
+def splits(loader):
+    return loader.train_data, loader.val_data, loader.test_data
+
+
+def no_parse(monkeypatch):
+    """Snapshot phải được dùng: parse JSON là lỗi"""
+    def fail(self, split):
+        raise AssertionError(f"parsed {split}")
+    monkeypatch.setattr(DataLoader, 'load_split', fail)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return write_dataset(tmp_path / 'processed')
+
+
+def test_snapshot_matches_fresh_parse(data_dir, monkeypatch):
+    fresh = load(data_dir)
+    expected = splits(fresh)
+    assert (data_dir / DataLoader.SNAPSHOT_FILE).exists()
+    
+    with monkeypatch.context() as patch:
+        no_parse(patch)
+        loader = load(data_dir)
+    assert splits(loader) == expected
+    assert loader.ontology == fresh.ontology
+    assert loader.vocab.slots == fresh.vocab.slots
+    
+    # Chỉ đổi mtime: sha1 giống nên snapshot vẫn được dùng
+    os.utime(data_dir / 'train.json', ns=(0, 0))
+    with monkeypatch.context() as patch:
+        no_parse(patch)
+        assert splits(load(data_dir)) == expected
+
+
+def test_snapshot_invalidated_by_changes(data_dir):
+    load(data_dir)
+    changed = make_dialogues(5, seed=42, prefix='NEW')
+    with open(data_dir / 'test.json', 'w', encoding='utf-8') as f:
+        json.dump(changed, f)
+    assert load(data_dir).test_data == changed
+
+
+def test_snapshot_keyed_on_loader_options(data_dir):
+    load(data_dir)
+    loader = load(data_dir, ids=True)
+    assert all(isinstance(slot, int) for dialogue in loader.train_data
+               for turn in dialogue['turns'] for slot in turn['belief_state'])
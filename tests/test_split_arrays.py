@@ -0,0 +1,84 @@
+from collections import Counter
+
+import pytest
+
+from conftest import make_dialogues
+from src.belief_state import iter_belief_states, to_delta_only
+from src.split_arrays import SplitArrays
+from src.utils import DataAnalyzer, DataLoader
+
+
+def reference_domains(data):
+    """analyze_domain_distribution trước khi có SplitArrays (Counter)"""
+    counter = Counter()
+    single = multi = 0
+    for dialogue in data:
+        domains = dialogue.get('domains', [])
+        single += len(domains) == 1
+        multi += len(domains) > 1
+        counter.update(domains)
+    return {'single_domain': single, 'multi_domain': multi, 'domain_counts': dict(counter)}
+
+
+def reference_slots(data):
+    """analyze_slot_distribution trước khi có SplitArrays (Counter)"""
+    counter = Counter()
+    total = with_slots = 0
+    for dialogue in data:
+        for state in iter_belief_states(dialogue['turns']):
+            total += 1
+            if state:
+                with_slots += 1
+                counter.update(state.keys())
+    return {
+        'total_turns': total,
+        'turns_with_slots': with_slots,
+        'turns_without_slots': total - with_slots,
+        'slot_coverage': with_slots / total if total > 0 else 0,
+        'most_common_slots': dict(counter.most_common(10))
+    }
+
+
+def reference_lengths(data):
+    lengths = [len(dialogue['turns']) for dialogue in data]
+    return {'min': min(lengths) if lengths else 0, 'max': max(lengths) if lengths else 0,
+            'mean': sum(lengths) / len(lengths) if lengths else 0, 'total': sum(lengths)}
+
+
+def items(result):
+    """So sánh cả thứ tự key (kể cả dict lồng nhau)"""
+    return [(key, items(value) if isinstance(value, dict) else value) for key, value in result.items()]
+
+
+@pytest.mark.parametrize('source', ['list', 'delta_only', 'arrays', 'columnar', 'empty'])
+def test_analyses_match_counter_passes(dataset_dirs, source):
+    dialogues = DataLoader(dataset_dirs['json']).load_split('train')
+    if source == 'delta_only':
+        data = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in dialogues]
+    elif source == 'arrays':
+        data = SplitArrays.build(dialogues)
+    elif source == 'columnar':
+        loader = DataLoader(dataset_dirs['columnar'], backend='columnar')
+        loader.load_all()
+        data = loader.get_arrays('train')
+    elif source == 'empty':
+        data = dialogues = []
+    else:
+        data = dialogues
+    
+    assert items(DataAnalyzer.analyze_dialogue_length(data)) == items(reference_lengths(dialogues))
+    assert items(DataAnalyzer.analyze_domain_distribution(data)) == items(reference_domains(dialogues))
+    assert items(DataAnalyzer.analyze_slot_distribution(data)) == items(reference_slots(dialogues))
+
+
+def test_has_all_queries_match_brute_force():
+    dialogues = make_dialogues(40, seed=12)
+    arrays = SplitArrays.build(dialogues)
+    states = [turn['belief_state'] for dialogue in dialogues for turn in dialogue['turns']]
+    
+    for wanted in [['hotel-area'], ['hotel-area', 'hotel-day'], ['train-day', 'taxi-leaveat'], ['missing']]:
+        expected = [i for i, state in enumerate(states) if all(slot in state for slot in wanted)]
+        assert arrays.turns_with_all_slots(wanted).tolist() == expected
+    for wanted in [['hotel'], ['hotel', 'train'], []]:
+        expected = [i for i, dialogue in enumerate(dialogues) if set(wanted) <= set(dialogue['domains'])]
+        assert arrays.dialogues_with_all_domains(wanted).tolist() == expected
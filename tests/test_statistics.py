@@ -0,0 +1,50 @@
+import json
+import math
+
+from conftest import make_dialogues
+from src.belief_state import to_delta_only
+from src.statistics import QuantileSketch, SplitStatistics
+
+
+def collect(dialogues, split='train') -> SplitStatistics:
+    stats = SplitStatistics(split)
+    for dialogue in dialogues:
+        stats.update(dialogue)
+    return stats
+
+
+def test_merged_chunks_equal_serial_pass():
+    dialogues = make_dialogues(50, seed=3)
+    serial = collect(dialogues).to_dict()
+    
+    merged = SplitStatistics('train')
+    for start in range(0, len(dialogues), 7):
+        merged.merge(collect(dialogues[start:start + 7]))
+    # So theo JSON: giống hệt cả thứ tự key của *_stats.json
+    assert json.dumps(merged.to_dict()) == json.dumps(serial)
+    assert json.dumps((collect(dialogues[:20]) + collect(dialogues[20:])).to_dict()) == json.dumps(serial)
+
+
+def test_delta_only_dialogues_give_same_statistics():
+    dialogues = make_dialogues(30, seed=4)
+    delta_only = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in dialogues]
+    assert collect(delta_only).to_dict() == collect(dialogues).to_dict()
+
+
+def test_quantile_sketch_exact_for_small_integers():
+    values = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    ordered = sorted(values)
+    for q in [0.1, 0.5, 0.9, 1.0]:
+        assert sketch.quantile(q) == ordered[max(1, math.ceil(q * len(values))) - 1]
+
+
+def test_quantile_sketch_relative_error():
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    values = [1.5 * 1.01 ** k for k in range(500)]
+    for value in values:
+        sketch.add(value)
+    median = sorted(values)[249]
+    assert abs(sketch.quantile(0.5) - median) <= 0.01 * median
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from conftest import ONTOLOGY, make_dialogues
+from src.belief_state import to_delta_only
+from src.tensor_export import UNK_ID, UNK_VALUE_ID, TokenVocab, load_tensors
+from src.utils import DataExporter
+from src.vocab import Vocab
+
+
+def decode_state(vocab, row):
+    return {vocab.slot(slot_id): vocab.value(int(row[slot_id])) for slot_id in np.flatnonzero(row)}
+
+
+@pytest.mark.parametrize('format', ['npz', 'npy'])
+@pytest.mark.parametrize('delta_only', [False, True])
+def test_tensors_decode_to_dialogues(tmp_path, format, delta_only):
+    dialogues = make_dialogues(30, seed=13)
+    data = [dict(dialogue, turns=to_delta_only(dialogue['turns'])) for dialogue in dialogues] \
+        if delta_only else dialogues
+    vocab = Vocab.from_ontology(ONTOLOGY)
+    _, token_vocab = DataExporter.to_tensors(data, tmp_path / 'train', vocab, buckets=[3, 6], format=format)
+    tensors = load_tensors(tmp_path / 'train')
+    
+    assert sorted(tensors) == ['b0', 'b1', 'b2']
+    seen = []
+    for arrays in tensors.values():
+        lengths = arrays['turn_mask'].sum(axis=1)
+        assert list(lengths) == sorted(lengths)
+        for i, position in enumerate(arrays['dialogue_index']):
+            turns = dialogues[position]['turns']
+            seen.append(int(position))
+            assert lengths[i] == len(turns)
+            for t, turn in enumerate(turns):
+                assert token_vocab.decode(arrays['user_tokens'][i, t]) == ' '.join(turn['utterance'].split())
+                assert token_vocab.decode(arrays['system_tokens'][i, t]) == turn['system_response']
+                assert decode_state(vocab, arrays['state'][i, t]) == turn['belief_state']
+                assert decode_state(vocab, arrays['delta'][i, t]) == turn['belief_state_delta']
+            assert not arrays['state'][i, len(turns):].any()
+    assert sorted(seen) == list(range(len(dialogues)))
+    # Cột slot: slot ontology trước
+    assert vocab.slots[:len(ONTOLOGY)] == Vocab.from_ontology(ONTOLOGY).slots
+
+
+def with_booked(dialogues, domain):
+    """Thêm slot ngoài ontology (<domain>-booked) vào turn cuối của dialogue đầu"""
+    dialogues = [dict(dialogue) for dialogue in dialogues]
+    turns = [dict(turn) for turn in dialogues[0]['turns']]
+    booked = {f"{domain}-booked": [{'name': 'x'}]}
+    turns[-1]['belief_state'] = {**turns[-1]['belief_state'], **booked}
+    turns[-1]['belief_state_delta'] = {**turns[-1]['belief_state_delta'], **booked}
+    dialogues[0] = dict(dialogues[0], turns=turns)
+    return dialogues
+
+
+def rows_by_position(tensors):
+    """dialogue position -> (state, delta) của dialogue (chỉ các turn có thật)"""
+    rows = {}
+    for arrays in tensors.values():
+        for i, position in enumerate(arrays['dialogue_index']):
+            length = int(arrays['turn_mask'][i].sum())
+            rows[int(position)] = (arrays['state'][i, :length], arrays['delta'][i, :length])
+    return rows
+
+
+def test_later_splits_reuse_train_columns_and_ids(tmp_path):
+    train = with_booked(make_dialogues(10, seed=14), 'restaurant')
+    vocab, token_vocab = DataExporter.to_tensors(train, tmp_path / 'train', ontology=ONTOLOGY)
+    num_slots, num_values, num_tokens = vocab.num_slots, vocab.num_values, len(token_vocab)
+    
+    # Val có slot ngoài ontology của cả train (restaurant-booked) lẫn slot train chưa gặp
+    val = with_booked(with_booked(make_dialogues(6, seed=15), 'restaurant'), 'taxi')
+    turns = [dict(turn) for turn in val[1]['turns']]
+    turns[0] = dict(turns[0], utterance='unseenword please',
+                    belief_state={**turns[0]['belief_state'], 'hotel-area': 'unseen value'})
+    val[1] = dict(val[1], turns=turns)
+    assert DataExporter.to_tensors(val, tmp_path / 'val', vocab, token_vocab=token_vocab) == (vocab, token_vocab)
+    assert (vocab.num_slots, vocab.num_values, len(token_vocab)) == (num_slots, num_values, num_tokens)
+    
+    train_rows = rows_by_position(load_tensors(tmp_path / 'train.npz'))
+    val_tensors = load_tensors(tmp_path / 'val.npz')
+    val_rows = rows_by_position(val_tensors)
+    assert all(arrays['state'].shape[2] == num_slots for arrays in val_tensors.values())
+    
+    booked = vocab.slot_id('restaurant-booked')
+    assert train_rows[0][0][-1, booked] == val_rows[0][0][-1, booked] == vocab.value_id([{'name': 'x'}])
+    area = vocab.slot_id('hotel-area')
+    assert val_rows[1][0][0, area] == UNK_VALUE_ID
+    for position, dialogue in enumerate(val):
+        for t, turn in enumerate(dialogue['turns']):
+            for slot, value in turn['belief_state'].items():
+                if slot == 'taxi-booked' or value == 'unseen value':
+                    continue
+                assert val_rows[position][0][t, vocab.slot_id(slot)] == vocab.value_id(value)
+    
+    for arrays in val_tensors.values():
+        for i, position in enumerate(arrays['dialogue_index']):
+            if position == 1:
+                assert list(arrays['user_tokens'][i, 0, :2]) == [UNK_ID, token_vocab.token_to_id['please']]
+    assert TokenVocab.load(tmp_path / 'train.tokens.json').tokens == token_vocab.tokens
+    
+    with pytest.raises(ValueError):
+        DataExporter.to_tensors(val, tmp_path / 'bad', ontology=ONTOLOGY, token_vocab=token_vocab)
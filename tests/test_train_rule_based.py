@@ -0,0 +1,72 @@
+import random
+import sys
+
+import pytest
+
+from conftest import VALUES, make_dialogues, project_root
+from src.evaluation.metrics import DSTMetrics
+
+sys.path.insert(0, str(project_root / 'scripts'))
+from train_rule_based import evaluate_model
+
+
+class ReplayModel:
+    """Model giả: trả lần lượt các delta dự đoán cho sẵn (theo thứ tự turn user)"""
+    
+    def __init__(self, deltas):
+        self.deltas = iter(deltas)
+    
+    def predict(self, utterances):
+        return next(self.deltas)
+
+
+def make_test_data(seed: int = 0):
+    """Dialogues có thêm turn system và delta dự đoán (có 'none' / slot thừa / sai value)"""
+    rng = random.Random(seed)
+    test_data = make_dialogues(25, seed=seed)
+    deltas = []
+    for dialogue in test_data:
+        turns = []
+        for turn in dialogue['turns']:
+            turns.append(turn)
+            delta = dict(turn['belief_state_delta'])
+            if delta and rng.random() < 0.3:
+                del delta[rng.choice(list(delta))]
+            if rng.random() < 0.3:
+                delta[rng.choice(list(turn['belief_state']) or ['hotel-area'])] = rng.choice(VALUES)
+            deltas.append(delta)
+            if rng.random() < 0.3:
+                turns.append({'turn_id': turn['turn_id'], 'speaker': 'system',
+                              'utterance': 'ok', 'belief_state_delta': {'hotel-area': 'north'}})
+        dialogue['turns'] = turns
+    return test_data, deltas
+
+
+def baseline_delta_metrics(deltas, test_data):
+    """Vòng lặp evaluate_model trước cumulative mode: chỉ turn user, chỉ lọc gold"""
+    metrics = DSTMetrics()
+    deltas = iter(deltas)
+    for dialogue in test_data:
+        for turn in dialogue['turns']:
+            if turn.get('speaker') != 'user':
+                continue
+            true_belief = {
+                slot: value for slot, value in turn.get('belief_state_delta', {}).items()
+                if isinstance(value, str) and value != 'none'
+            }
+            metrics.update(next(deltas), true_belief)
+    return metrics
+
+
+def test_delta_metrics_match_baseline():
+    test_data, deltas = make_test_data()
+    metrics, cumulative, predictions = evaluate_model(ReplayModel(deltas), test_data)
+    expected = baseline_delta_metrics(deltas, test_data)
+    
+    assert metrics.get_summary() == expected.get_summary()
+    assert metrics.get_per_slot_accuracy() == expected.get_per_slot_accuracy()
+    assert len(predictions) == metrics.total_turns == cumulative.total_turns
+    # Số liệu cố định của delta metrics (bắt thay đổi ngầm cách tính)
+    summary = metrics.get_summary()
+    assert (summary['total_turns'], summary['perfect_turns']) == (173, 95)
+    assert summary['slot_accuracy'] == pytest.approx(0.57)
@@ -0,0 +1,26 @@
+from conftest import ONTOLOGY, make_dialogues
+from src.vocab import Vocab
+
+
+def test_encode_decode_round_trip(tmp_path):
+    vocab = Vocab.from_ontology(ONTOLOGY)
+    states = [turn['belief_state'] for dialogue in make_dialogues(20) for turn in dialogue['turns']]
+    # Value không phải chuỗi (slot "booked") cũng được intern
+    states.append({'hotel-booked': [{'name': 'x', 'reference': '00000001'}], 'hotel-area': 'centre'})
+    
+    for state in states:
+        assert vocab.decode_state(vocab.encode_state(state, add=True)) == state
+        assert vocab.decode_state(vocab.encode_pairs(state)) == state
+    
+    vocab.save(tmp_path / 'vocab.json')
+    loaded = Vocab.load(tmp_path / 'vocab.json')
+    assert loaded.slots == vocab.slots
+    for state in states:
+        assert loaded.encode_state(state) == vocab.encode_state(state)
+
+
+def test_ontology_slots_come_first():
+    vocab = Vocab.from_ontology(ONTOLOGY)
+    assert vocab.slots[:3] == ['hotel-area', 'hotel-day', 'hotel-people']
+    assert vocab.value(Vocab.NONE_ID) is None
+    assert vocab.value_id('cheap') != Vocab.NONE_ID